@@ -0,0 +1,521 @@
+"""
+Batch contact extraction
+Instead of one chat-completions request per call, transcripts are collected
+into an OpenAI Batch API job (JSONL, one request per call, custom_id = call ID).
+Parked post-call jobs are resumed with the parsed results once the batch
+completes; anything the batch could not answer falls back to online extraction.
+
+Submission is crash-safe: the transcripts of a batch are first reserved under
+a submission ID, which is also sent as batch metadata. The batch row and the
+items' batch ID are then recorded in one transaction. Reservations left behind
+by a crash or a failed request are reconciled at startup and on every poll:
+they are matched to the batch OpenAI created for them, or queued again if no
+batch exists.
+
+Usage (reprocess historical calls through the batch path):
+    python batch_extraction.py reprocess <call_id> [<call_id> ...]
+    python batch_extraction.py status
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from dotenv import load_dotenv
+from openai import APIStatusError
+
+from extraction import (
+    build_extraction_request,
+    parse_extraction_response,
+    openai_client,
+    extraction_cache,
+    EXTRACTION_MODEL,
+)
+from transcript_compaction import prepare_transcript
+from fast_extraction import FIELDS
+from model_router import schema_errors
+from job_queue import JOB_QUEUE_DB, PENDING, RUNNING
+
+load_dotenv()
+
+# online: one request per call; batch: always batch; auto: batch when the extract backlog is deep
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "online").lower()
+EXTRACTION_BATCH_MIN_BACKLOG = int(os.getenv("EXTRACTION_BATCH_MIN_BACKLOG", "50"))
+# A batch is submitted when this many transcripts are queued or the oldest has waited this long
+EXTRACTION_BATCH_MAX_SIZE = int(os.getenv("EXTRACTION_BATCH_MAX_SIZE", "500"))
+EXTRACTION_BATCH_MAX_WAIT = float(os.getenv("EXTRACTION_BATCH_MAX_WAIT", "300"))
+EXTRACTION_BATCH_POLL_INTERVAL = float(os.getenv("EXTRACTION_BATCH_POLL_INTERVAL", "60"))
+EXTRACTION_BATCH_WINDOW = os.getenv("EXTRACTION_BATCH_WINDOW", "24h")
+# A reservation with no batch on OpenAI after this long is queued again
+EXTRACTION_BATCH_SUBMIT_TIMEOUT = float(os.getenv("EXTRACTION_BATCH_SUBMIT_TIMEOUT", "300"))
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+OPEN_BATCH_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+# Item statuses
+QUEUED = "queued"
+SUBMITTING = "submitting"  # reserved for a batch being uploaded/created
+SUBMITTED = "submitted"
+DONE = "done"
+FALLBACK = "fallback"  # returned to the online extractor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extraction_batches (
+    batch_id TEXT PRIMARY KEY,
+    input_file_id TEXT NOT NULL,
+    output_file_id TEXT,
+    error_file_id TEXT,
+    status TEXT NOT NULL,
+    request_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extraction_batch_items (
+    call_id TEXT PRIMARY KEY,
+    transcript TEXT NOT NULL,
+    batch_id TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    submission_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_batch_items_status ON extraction_batch_items (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_batch_items_batch ON extraction_batch_items (batch_id);
+CREATE INDEX IF NOT EXISTS idx_batch_items_submission ON extraction_batch_items (submission_id);
+"""
+
+# Item columns added after the first release, with their definitions
+ADDED_COLUMNS = {
+    "submission_id": "TEXT",
+}
+
+
+class BatchExtractor:
+    """Collects transcripts, submits them as Batch API jobs and fans results back to the queue"""
+
+    def __init__(self, queue, client=openai_client, db_path=JOB_QUEUE_DB, mode=EXTRACTION_MODE,
+                 max_size=EXTRACTION_BATCH_MAX_SIZE, max_wait=EXTRACTION_BATCH_MAX_WAIT,
+                 poll_interval=EXTRACTION_BATCH_POLL_INTERVAL):
+        """
+        Args:
+            queue (PostCallQueue): Queue holding the parked post-call jobs
+            client (AsyncOpenAI): Client used for the Files and Batches APIs
+            db_path (str): SQLite database for batch tracking (shared with the job queue)
+            mode (str): "online", "batch" or "auto"
+            max_size (int): Transcripts per batch
+            max_wait (float): Longest a transcript waits before a partial batch is sent
+            poll_interval (float): Seconds between batch status checks
+        """
+        self.queue = queue
+        self.client = client
+        self.mode = mode
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Several processes may share the database
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        self._conn.executescript(SCHEMA)
+        self._last_poll = 0.0
+        self.submitted_batches = 0
+        self.completed_items = 0
+        self.fallback_items = 0
+        self.reconciled_batches = 0
+        self.released_submissions = 0
+
+    def _migrate(self):
+        """Add columns missing from a database created by an older version"""
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(extraction_batch_items)")}
+        if not existing:
+            return  # fresh database, SCHEMA creates everything
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE extraction_batch_items ADD COLUMN {name} {definition}")
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, statements):
+        """Run (sql, params) statements in one write transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # --- routing --------------------------------------------------------
+
+    def _extract_backlog(self):
+        return self._fetchall(
+            "SELECT COUNT(*) AS n FROM jobs WHERE stage = ? AND status IN (?, ?)", ("extract", PENDING, RUNNING)
+        )[0]["n"]
+
+    async def should_batch(self, job):
+        """Decide whether this job's extraction goes through the batch path"""
+        payload = job["payload"]
+        if payload.get("batch_fallback"):
+            return False
+        if payload.get("batch") or self.mode == "batch":
+            return True
+        if self.mode == "auto":
+            return await self._run(self._extract_backlog) >= EXTRACTION_BATCH_MIN_BACKLOG
+        return False
+
+    def _submit(self, call_id, transcript):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO extraction_batch_items (call_id, transcript, batch_id, status, error, "
+            "created_at, updated_at, submission_id) VALUES (?, ?, NULL, ?, NULL, ?, ?, NULL)",
+            (call_id, transcript, QUEUED, now, now),
+        )
+
+    async def submit(self, job):
+        """Queue the job's transcript for the next batch"""
+        await self._run(self._submit, job["call_id"], job["payload"]["transcript"])
+
+    # --- submission -----------------------------------------------------
+
+    def _reserve(self, force, submission_id):
+        """Move due queued items to SUBMITTING under `submission_id` (one transaction, so no two flushes share one)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT call_id, transcript, created_at FROM extraction_batch_items WHERE status = ? "
+                    "ORDER BY created_at LIMIT ?",
+                    (QUEUED, self.max_size),
+                ).fetchall()
+                due = bool(rows) and (
+                    force or len(rows) >= self.max_size or now - rows[0]["created_at"] >= self.max_wait
+                )
+                if due:
+                    self._conn.executemany(
+                        "UPDATE extraction_batch_items SET status = ?, submission_id = ?, updated_at = ? "
+                        "WHERE call_id = ? AND status = ?",
+                        [(SUBMITTING, submission_id, now, row["call_id"], QUEUED) for row in rows],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [dict(row) for row in rows] if due else []
+
+    def _release(self, submission_id):
+        """Put a reservation that never became a batch back in the queue"""
+        return self._execute(
+            "UPDATE extraction_batch_items SET status = ?, submission_id = NULL, updated_at = ? "
+            "WHERE submission_id = ? AND status = ?",
+            (QUEUED, time.time(), submission_id, SUBMITTING),
+        )
+
+    @staticmethod
+    def build_jsonl(items):
+        """One Batch API request line per transcript"""
+        lines = [
+            json.dumps({
+                "custom_id": item["call_id"],
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": build_extraction_request(prepare_transcript(item["transcript"])),
+            })
+            for item in items
+        ]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _record_batch(self, batch, submission_id, request_count):
+        """The batch row and its items' batch ID, in one transaction"""
+        now = time.time()
+        self._transaction([
+            ("INSERT OR IGNORE INTO extraction_batches (batch_id, input_file_id, status, request_count, "
+             "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+             (batch.id, batch.input_file_id, batch.status, request_count, now, now)),
+            ("UPDATE extraction_batch_items SET batch_id = ?, status = ?, updated_at = ? "
+             "WHERE submission_id = ? AND status = ?",
+             (batch.id, SUBMITTED, now, submission_id, SUBMITTING)),
+        ])
+
+    async def flush(self, force=False):
+        """
+        Submit queued transcripts once the batch is full or the oldest is due
+
+        Returns:
+            str: Batch ID, None if nothing was submitted
+        """
+        submission_id = uuid.uuid4().hex
+        items = await self._run(self._reserve, force, submission_id)
+        if not items:
+            return None
+
+        try:
+            input_file = await self.client.files.create(
+                file=("extraction_batch.jsonl", io.BytesIO(self.build_jsonl(items))),
+                purpose="batch",
+            )
+        except Exception:
+            # No batch can exist without the input file
+            await self._run(self._release, submission_id)
+            raise
+        try:
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=EXTRACTION_BATCH_WINDOW,
+                metadata={"source": "inbound_calling_extraction", "submission_id": submission_id},
+            )
+        except APIStatusError as e:
+            if e.status_code < 500:
+                # Rejected: no batch was created
+                await self._run(self._release, submission_id)
+            raise  # otherwise the batch may exist; reconcile() finds out
+        await self._run(self._record_batch, batch, submission_id, len(items))
+        self.submitted_batches += 1
+        print(f"📦 Submitted extraction batch {batch.id} with {len(items)} transcripts")
+        return batch.id
+
+    def _reservations(self):
+        return self._fetchall(
+            "SELECT submission_id, COUNT(*) AS n, MIN(updated_at) AS reserved_at FROM extraction_batch_items "
+            "WHERE status = ? GROUP BY submission_id",
+            (SUBMITTING,),
+        )
+
+    async def reconcile(self):
+        """
+        Settle reservations whose flush did not record its batch (crash, timeout)
+
+        Each is matched to the batch created with its submission_id metadata;
+        one that has no batch after EXTRACTION_BATCH_SUBMIT_TIMEOUT is queued again.
+
+        Returns:
+            int: Reservations settled
+        """
+        reservations = {row["submission_id"]: row for row in await self._run(self._reservations)}
+        if not reservations:
+            return 0
+        # Batches are listed newest first; nothing older than the oldest reservation can match
+        oldest = min(row["reserved_at"] for row in reservations.values()) - 60
+        settled = 0
+        async for batch in self.client.batches.list(limit=100):
+            submission_id = (batch.metadata or {}).get("submission_id")
+            if submission_id in reservations:
+                row = reservations.pop(submission_id)
+                await self._run(self._record_batch, batch, submission_id, row["n"])
+                self.reconciled_batches += 1
+                settled += 1
+                print(f"📦 Recovered extraction batch {batch.id} ({row['n']} transcripts) after an unrecorded submit")
+            if not reservations or batch.created_at < oldest:
+                break
+        for submission_id, row in reservations.items():
+            if time.time() - row["reserved_at"] < EXTRACTION_BATCH_SUBMIT_TIMEOUT:
+                continue  # possibly still being uploaded by another process
+            await self._run(self._release, submission_id)
+            self.released_submissions += 1
+            settled += 1
+            print(f"♻️ No batch was created for {row['n']} reserved transcripts - queued again")
+        return settled
+
+    # --- results --------------------------------------------------------
+
+    def _open_batches(self):
+        placeholders = ", ".join("?" for _ in OPEN_BATCH_STATUSES)
+        return [
+            row["batch_id"] for row in self._fetchall(
+                f"SELECT batch_id FROM extraction_batches WHERE status IN ({placeholders})", OPEN_BATCH_STATUSES
+            )
+        ]
+
+    def _update_batch(self, batch):
+        self._execute(
+            "UPDATE extraction_batches SET status = ?, output_file_id = ?, error_file_id = ?, updated_at = ? "
+            "WHERE batch_id = ?",
+            (batch.status, batch.output_file_id, batch.error_file_id, time.time(), batch.id),
+        )
+
+    def _batch_items(self, batch_id):
+        rows = self._fetchall(
+            "SELECT call_id, transcript FROM extraction_batch_items WHERE batch_id = ? AND status = ?",
+            (batch_id, SUBMITTED),
+        )
+        return {row["call_id"]: row["transcript"] for row in rows}
+
+    def _finish_item(self, call_id, status, error=None):
+        self._execute(
+            "UPDATE extraction_batch_items SET status = ?, error = ?, updated_at = ? WHERE call_id = ?",
+            (status, error, time.time(), call_id),
+        )
+
+    async def _read_file_lines(self, file_id):
+        if not file_id:
+            return []
+        content = await self.client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    async def _fall_back(self, call_id, error):
+        """Let the online extractor handle this call instead"""
+        await self._run(self._finish_item, call_id, FALLBACK, error)
+        await self.queue.release_parked(call_id, {"batch_fallback": True})
+        self.fallback_items += 1
+        print(f"⚠️ Batch extraction for call {call_id} fell back to online extraction: {error}")
+
+    async def _apply_results(self, batch):
+        pending = await self._run(self._batch_items, batch.id)
+
+        for line in await self._read_file_lines(batch.output_file_id):
+            call_id = line.get("custom_id")
+            transcript = pending.pop(call_id, None)
+            if transcript is None:
+                continue
+            response = line.get("response") or {}
+            try:
+                if response.get("status_code") != 200:
+                    raise ValueError(f"status {response.get('status_code')}: {line.get('error')}")
+                content = response["body"]["choices"][0]["message"]["content"]
+                contact_info = parse_extraction_response(content, transcript)
+                errors = schema_errors(contact_info, FIELDS)
+                if errors:
+                    raise ValueError(f"schema: {'; '.join(errors)}")
+            except Exception as e:
+                await self._fall_back(call_id, str(e))
+                continue
+            await self._run(self._finish_item, call_id, DONE)
+            await extraction_cache.put(transcript, EXTRACTION_MODEL, contact_info)
+            await self.queue.complete_parked(call_id, {"contact_info": contact_info})
+            self.completed_items += 1
+
+        for line in await self._read_file_lines(batch.error_file_id):
+            call_id = line.get("custom_id")
+            if pending.pop(call_id, None) is not None:
+                await self._fall_back(call_id, json.dumps(line.get("error") or line.get("response")))
+
+        # Requests the batch never answered (expired, cancelled or failed batch)
+        for call_id in pending:
+            await self._fall_back(call_id, f"batch {batch.id} ended as {batch.status}")
+
+    async def poll(self):
+        """Check open batches and fan out the results of finished ones"""
+        self._last_poll = time.time()
+        await self.reconcile()
+        for batch_id in await self._run(self._open_batches):
+            batch = await self.client.batches.retrieve(batch_id)
+            await self._run(self._update_batch, batch)
+            if batch.status in OPEN_BATCH_STATUSES:
+                continue
+            print(f"📦 Extraction batch {batch_id} is {batch.status}")
+            await self._apply_results(batch)
+
+    async def run(self, check_interval=5.0):
+        """Background loop: submit due batches and poll open ones (reconciling first, at startup)"""
+        try:
+            await self.reconcile()
+        except Exception as e:
+            print(f"❌ Batch extraction reconcile error: {e}")
+        while True:
+            try:
+                await self.flush()
+                if time.time() - self._last_poll >= self.poll_interval:
+                    await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Batch extraction error: {e}")
+            await asyncio.sleep(check_interval)
+
+    # --- reprocessing / metrics -----------------------------------------
+
+    async def reprocess(self, call_ids):
+        """Send historical calls back through extraction via the batch path (stored transcripts are reused)"""
+        requeued = []
+        for call_id in call_ids:
+            if await self.queue.requeue(call_id, "transcript", {"batch": True, "batch_fallback": False, "reprocess": True}):
+                requeued.append(call_id)
+        return requeued
+
+    def _snapshot(self):
+        items = {
+            row["status"]: row["n"] for row in self._fetchall(
+                "SELECT status, COUNT(*) AS n FROM extraction_batch_items GROUP BY status"
+            )
+        }
+        return {
+            "mode": self.mode,
+            "items_by_status": items,
+            "open_batches": len(self._open_batches()),
+            "submitted_batches_since_start": self.submitted_batches,
+            "completed_items_since_start": self.completed_items,
+            "fallback_items_since_start": self.fallback_items,
+            "reconciled_batches_since_start": self.reconciled_batches,
+            "released_submissions_since_start": self.released_submissions,
+        }
+
+    async def snapshot(self):
+        return await self._run(self._snapshot)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Process-wide extractor installed by the FastAPI lifespan in main.py
+_batch_extractor = None
+
+
+def set_batch_extractor(extractor):
+    """Install (or clear with None) the shared extractor"""
+    global _batch_extractor
+    _batch_extractor = extractor
+
+
+def get_batch_extractor():
+    return _batch_extractor
+
+
+async def _cli(argv):
+    from job_queue import PostCallQueue
+    from functions import POST_CALL_STAGES
+
+    if not argv or argv[0] not in ("reprocess", "status"):
+        print(__doc__)
+        return 2
+
+    queue = PostCallQueue(POST_CALL_STAGES)
+    extractor = BatchExtractor(queue)
+    try:
+        if argv[0] == "reprocess":
+            requeued = await extractor.reprocess(argv[1:])
+            missing = sorted(set(argv[1:]) - set(requeued))
+            print(f"♻️ Requeued {len(requeued)} calls for batch extraction")
+            if missing:
+                print(f"⚠️ No post-call job found (or still running) for: {', '.join(missing)}")
+        else:
+            print(json.dumps(await extractor.snapshot(), indent=2))
+    finally:
+        extractor.close()
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
@@ -0,0 +1,181 @@
+"""
+Ultravox call-completion events
+Webhook verification plus a tracker that wakes the post-call pipeline as soon
+as a call.ended event arrives. Missed events are caught by poll_scheduler.py.
+"""
+
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ULTRAVOX_WEBHOOK_SECRET = os.getenv("ULTRAVOX_WEBHOOK_SECRET")
+# Accept unsigned deliveries when no secret is set (local development only)
+ULTRAVOX_WEBHOOK_ALLOW_UNSIGNED = os.getenv("ULTRAVOX_WEBHOOK_ALLOW_UNSIGNED", "false").lower() == "true"
+# Reject webhook deliveries whose timestamp is older than this (seconds)
+ULTRAVOX_WEBHOOK_TOLERANCE = int(os.getenv("ULTRAVOX_WEBHOOK_TOLERANCE", "300"))
+# How often a call is polled for a missed call.ended event (seconds)
+ULTRAVOX_SWEEP_INTERVAL = float(os.getenv("ULTRAVOX_SWEEP_INTERVAL", "60"))
+
+
+def verify_ultravox_signature(body, timestamp, signature_header, secret=None, allow_unsigned=None):
+    """
+    Verify an Ultravox webhook delivery
+
+    Args:
+        body (bytes): Raw request body
+        timestamp (str): X-Ultravox-Webhook-Timestamp header
+        signature_header (str): X-Ultravox-Webhook-Signature header (may hold
+            several comma-separated signatures during secret rotation)
+        secret (str): Webhook secret, defaults to ULTRAVOX_WEBHOOK_SECRET
+        allow_unsigned (bool): Accept every delivery when no secret is set,
+            defaults to ULTRAVOX_WEBHOOK_ALLOW_UNSIGNED
+
+    Returns:
+        bool: True if the delivery is authentic and fresh
+    """
+    secret = secret or ULTRAVOX_WEBHOOK_SECRET
+    if not secret:
+        # Without a secret nothing can be verified; only an explicit opt-in accepts the delivery
+        return ULTRAVOX_WEBHOOK_ALLOW_UNSIGNED if allow_unsigned is None else allow_unsigned
+    if not timestamp or not signature_header:
+        return False
+
+    try:
+        sent_at = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if sent_at.tzinfo is None:
+        sent_at = sent_at.replace(tzinfo=timezone.utc)
+    if abs(time.time() - sent_at.timestamp()) > ULTRAVOX_WEBHOOK_TOLERANCE:
+        return False
+
+    expected = hmac.new(secret.encode(), body + timestamp.encode(), hashlib.sha256).hexdigest()
+    return any(hmac.compare_digest(expected, sig.strip()) for sig in signature_header.split(","))
+
+
+def webhook_verification_warning():
+    """Startup warning when webhook deliveries cannot be verified, None when they can"""
+    if ULTRAVOX_WEBHOOK_SECRET:
+        return None
+    if ULTRAVOX_WEBHOOK_ALLOW_UNSIGNED:
+        return ("⚠️ ULTRAVOX_WEBHOOK_SECRET is not set and ULTRAVOX_WEBHOOK_ALLOW_UNSIGNED=true - "
+                "accepting unsigned Ultravox webhooks (local development only)")
+    return ("⚠️ ULTRAVOX_WEBHOOK_SECRET is not set - Ultravox webhooks will be rejected "
+            "(calls are still picked up by polling)")
+
+
+class CallUnavailable(Exception):
+    """The call's end can never be observed (unknown or deleted call ID)"""
+
+
+class CallCompletionTracker:
+    """Keeps one awaitable per live call, resolved when the call ends"""
+
+    def __init__(self):
+        self._calls = {}  # Ultravox call ID -> {"future"}
+        self.events_received = 0
+        self.ended_by_webhook = 0
+        self.ended_by_poller = 0
+        self.lost = 0
+        self.unknown_events = 0
+
+    def register(self, call_id):
+        """Start tracking a call; returns the future resolved on call end"""
+        entry = self._calls.get(call_id)
+        if entry is None:
+            entry = {"future": asyncio.get_running_loop().create_future()}
+            self._calls[call_id] = entry
+        return entry["future"]
+
+    def mark_ended(self, call_id, source="webhook", call_data=None):
+        """
+        Resolve the call's future
+
+        Returns:
+            bool: True if a tracked call was woken up by this notification
+        """
+        entry = self._calls.get(call_id)
+        if entry is None:
+            if source == "webhook":
+                self.unknown_events += 1
+            return False
+        if entry["future"].done():
+            return False
+
+        entry["future"].set_result(call_data or {})
+        if source == "webhook":
+            self.ended_by_webhook += 1
+        else:
+            self.ended_by_poller += 1
+        print(f"🏁 Call {call_id} ended (detected by {source})")
+        return True
+
+    def mark_lost(self, call_id, reason):
+        """
+        Give up on a call whose status can no longer be fetched
+
+        wait_for_end raises CallUnavailable for it.
+
+        Returns:
+            bool: True if a tracked call was waiting
+        """
+        entry = self._calls.get(call_id)
+        if entry is None or entry["future"].done():
+            return False
+        entry["future"].set_exception(CallUnavailable(reason))
+        # Retrieved here so an unawaited future does not log "exception was never retrieved"
+        entry["future"].exception()
+        self.lost += 1
+        print(f"🚫 Giving up on call {call_id}: {reason}")
+        return True
+
+    async def wait_for_end(self, call_id):
+        """Wait until the call ends, then stop tracking it"""
+        future = self.register(call_id)
+        try:
+            return await future
+        finally:
+            self._calls.pop(call_id, None)
+
+    def snapshot(self):
+        return {
+            "tracked_calls": len(self._calls),
+            "events_received": self.events_received,
+            "ended_by_webhook": self.ended_by_webhook,
+            "ended_by_poller": self.ended_by_poller,
+            "lost": self.lost,
+            "unknown_events": self.unknown_events,
+        }
+
+
+# Process-wide tracker shared by main.py and functions.py
+call_tracker = CallCompletionTracker()
+
+
+def handle_ultravox_event(payload):
+    """
+    Dispatch a verified Ultravox webhook payload
+
+    Args:
+        payload (dict): Decoded JSON object of the delivery
+
+    Returns:
+        bool: True if the event woke up a waiting call
+    """
+    call_tracker.events_received += 1
+    event = payload.get("event")
+    call = payload.get("call")
+    if not isinstance(call, dict):
+        call = {}
+    call_id = call.get("callId")
+    print(f"📨 Ultravox event {event} for call {call_id}")
+
+    if event == "call.ended" and call_id:
+        return call_tracker.mark_ended(call_id, source="webhook", call_data=call)
+    return False
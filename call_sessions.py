@@ -0,0 +1,167 @@
+"""
+Call session registry
+Per-call state indexed by both the Ultravox call ID and the Twilio Call SID,
+with TTL eviction after a call completes and an LRU cap on total sessions.
+"""
+
+import os
+import sys
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How long a completed call's session is kept for late lookups (seconds)
+CALL_SESSION_TTL = float(os.getenv("CALL_SESSION_TTL", "900"))
+# Hard cap on sessions held in memory; least recently used are evicted first
+CALL_SESSION_MAX = int(os.getenv("CALL_SESSION_MAX", "5000"))
+
+
+class CallSession:
+    """State for one inbound call"""
+
+    __slots__ = ("call_id", "call_sid", "caller_phone", "transfer_status",
+                 "created_at", "updated_at", "ended_at")
+
+    def __init__(self, call_id, call_sid, caller_phone):
+        self.call_id = call_id
+        self.call_sid = call_sid
+        self.caller_phone = caller_phone
+        self.transfer_status = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.ended_at = None
+
+    @property
+    def active(self):
+        return self.ended_at is None
+
+    def size_bytes(self):
+        """Approximate memory held by this session"""
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(getattr(self, name)) for name in self.__slots__
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CallSessionRegistry:
+    """O(1) session lookups by Ultravox call ID or Twilio Call SID"""
+
+    def __init__(self, ttl=CALL_SESSION_TTL, max_sessions=CALL_SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._by_call_id = OrderedDict()  # least recently used first
+        self._by_call_sid = {}
+        self._ended = OrderedDict()  # call_id -> ended_at, oldest first
+        self._last_active = None
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._by_call_id)
+
+    def add(self, call_id, call_sid, caller_phone):
+        """Register a new call and return its session"""
+        session = CallSession(call_id, call_sid, caller_phone)
+        self._by_call_id[call_id] = session
+        if call_sid:
+            self._by_call_sid[call_sid] = session
+        self._last_active = session
+        self.evict()
+        return session
+
+    def _touch(self, session):
+        if session is not None:
+            session.updated_at = time.time()
+            self._by_call_id.move_to_end(session.call_id)
+        return session
+
+    def get(self, call_id):
+        return self._touch(self._by_call_id.get(call_id))
+
+    def get_by_call_sid(self, call_sid):
+        return self._touch(self._by_call_sid.get(call_sid))
+
+    def latest_active(self):
+        """Most recently started call that has not ended yet"""
+        session = self._last_active
+        if session is not None and session.active and session.call_id in self._by_call_id:
+            return session
+        # The dict is in LRU-touch order, so compare start times
+        return max(
+            (session for session in self._by_call_id.values() if session.active),
+            key=lambda session: session.created_at,
+            default=None,
+        )
+
+    def active_count(self):
+        return len(self._by_call_id) - len(self._ended)
+
+    def set_transfer_status(self, call_sid, status):
+        session = self.get_by_call_sid(call_sid)
+        if session is None:
+            return False
+        session.transfer_status = status
+        return True
+
+    def get_transfer_status(self, call_sid):
+        session = self.get_by_call_sid(call_sid)
+        return session.transfer_status if session else None
+
+    def mark_ended(self, call_id):
+        """Start the TTL clock for a completed call"""
+        session = self._by_call_id.get(call_id)
+        if session is None or not session.active:
+            return
+        session.ended_at = time.time()
+        self._ended[call_id] = session.ended_at
+        self.evict()
+
+    def _remove(self, call_id):
+        session = self._by_call_id.pop(call_id, None)
+        if session is None:
+            return
+        self._ended.pop(call_id, None)
+        if self._by_call_sid.get(session.call_sid) is session:
+            del self._by_call_sid[session.call_sid]
+        if self._last_active is session:
+            self._last_active = None
+        self.evicted += 1
+
+    def evict(self):
+        """Drop expired completed sessions, then enforce the size cap"""
+        cutoff = time.time() - self.ttl
+        while self._ended:
+            call_id, ended_at = next(iter(self._ended.items()))
+            if ended_at > cutoff:
+                break
+            self._remove(call_id)
+
+        while len(self._by_call_id) > self.max_sessions:
+            # Prefer completed calls; fall back to the least recently used session
+            call_id = next(iter(self._ended)) if self._ended else next(iter(self._by_call_id))
+            self._remove(call_id)
+
+    def memory_bytes(self):
+        """Approximate memory used by the registry and its indexes"""
+        return (
+            sum(session.size_bytes() for session in self._by_call_id.values())
+            + sys.getsizeof(self._by_call_id)
+            + sys.getsizeof(self._by_call_sid)
+            + sys.getsizeof(self._ended)
+        )
+
+    def snapshot(self):
+        self.evict()
+        return {
+            "sessions": len(self._by_call_id),
+            "active_sessions": self.active_count(),
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+# Process-wide registry shared by main.py and functions.py
+call_sessions = CallSessionRegistry()
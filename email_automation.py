@@ -2,13 +2,13 @@ import os
 import json
 import base64
 from email.mime.text import MIMEText
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 
+from google_credentials import credential_manager
+
 load_dotenv()
 
 # Gmail API scope for sending emails
@@ -24,38 +24,30 @@ class FaithAgencyEmailSender:
     
     def authenticate(self):
         """Authenticate and build Gmail service"""
-        creds = None
-        
-        # Check if token.json exists (stored credentials)
-        if os.path.exists(self.token_file):
-            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+        # Shared credentials: token.json is loaded once and refreshed in the background
+        try:
+            creds = credential_manager.get(self.token_file, SCOPES)
+        except Exception as e:
+            print(f"Error refreshing token: {e}")
+            # Delete the token file and re-authenticate
+            credential_manager.invalidate(self.token_file)
+            if os.path.exists(self.token_file):
+                os.remove(self.token_file)
+            creds = None
         
         # If there are no valid credentials, request authorization
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                except Exception as e:
-                    print(f"Error refreshing token: {e}")
-                    # Delete the token file and re-authenticate
-                    if os.path.exists(self.token_file):
-                        os.remove(self.token_file)
-                    creds = None
-            
-            if not creds:
-                if not os.path.exists(self.credentials_file):
-                    print(f"❌ Credentials file not found: {self.credentials_file}")
-                    print("Please ensure you have downloaded the credentials.json file from Google Cloud Console")
-                    return False
-                    
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, SCOPES)
-                creds = flow.run_local_server(port=0)
+        if not creds:
+            if not os.path.exists(self.credentials_file):
+                print(f"❌ Credentials file not found: {self.credentials_file}")
+                print("Please ensure you have downloaded the credentials.json file from Google Cloud Console")
+                return False
+                
+            flow = InstalledAppFlow.from_client_secrets_file(
+                self.credentials_file, SCOPES)
+            creds = flow.run_local_server(port=0)
             
             # Save the credentials for the next run
-            os.makedirs(os.path.dirname(self.token_file), exist_ok=True)
-            with open(self.token_file, 'w') as token:
-                token.write(creds.to_json())
+            credential_manager.store(self.token_file, creds, SCOPES)
         
         try:
             self.service = build('gmail', 'v1', credentials=creds)
@@ -1,3 +1,11 @@
+"""
+Gmail follow-up sender (standalone test script)
+Shares google_credentials.py with the app, so the repository root has to be
+on the import path. From this folder (credentials.json and token.json live
+here):
+    PYTHONPATH=.. python gmail_sender.py
+"""
+
 import os
 import json
 import base64
@@ -5,12 +13,12 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from google_credentials import credential_manager
+
 # Gmail API scope for sending emails
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
@@ -23,36 +31,28 @@ class FaithAgencyEmailer:
     
     def authenticate(self):
         """Authenticate and build Gmail service"""
-        creds = None
-        
-        # Check if token.json exists (stored credentials)
-        if os.path.exists(self.token_file):
-            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+        # Shared credentials: token.json is loaded once and refreshed before it expires
+        try:
+            creds = credential_manager.get(self.token_file, SCOPES)
+        except Exception as e:
+            print(f"⚠️ Error refreshing token: {e}")
+            # Delete the token file and re-authenticate
+            credential_manager.invalidate(self.token_file)
+            if os.path.exists(self.token_file):
+                os.remove(self.token_file)
+            creds = None
         
         # If there are no valid credentials, request authorization
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                    print("🔄 Refreshed existing credentials")
-                except Exception as e:
-                    print(f"⚠️ Error refreshing token: {e}")
-                    # Delete the token file and re-authenticate
-                    if os.path.exists(self.token_file):
-                        os.remove(self.token_file)
-                    creds = None
-            
-            if not creds:
-                print("🔐 Starting new authentication...")
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, SCOPES)
-                creds = flow.run_local_server(port=8080)
+        if not creds:
+            print("🔐 Starting new authentication...")
+            flow = InstalledAppFlow.from_client_secrets_file(
+                self.credentials_file, SCOPES)
+            creds = flow.run_local_server(port=8080)
 
-                print("✅ Authentication completed!")
+            print("✅ Authentication completed!")
             
             # Save the credentials for the next run
-            with open(self.token_file, 'w') as token:
-                token.write(creds.to_json())
+            credential_manager.store(self.token_file, creds, SCOPES)
         
         try:
             self.service = build('gmail', 'v1', credentials=creds)
@@ -0,0 +1,333 @@
+"""
+Contact extraction from call transcripts
+Holds the extraction prompt shared by the online (per-call) path and the batch
+path in batch_extraction.py, plus the pooled AsyncOpenAI client.
+"""
+
+import os
+import json
+import time
+import asyncio
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from extraction_cache import ExtractionCache, prompt_version
+from fast_extraction import (
+    EXTRACTION_FAST_PATH,
+    FIELDS,
+    fast_extract,
+    fields_for_llm,
+    fast_path_metrics,
+    scan_spelled_email,
+    split_turns,
+)
+from transcript_compaction import (
+    EXTRACTION_COMPACTION,
+    EXTRACTION_TOKEN_BUDGET,
+    EXTRACTION_SUMMARY_WINDOW,
+    prepare_transcript,
+    count_tokens,
+)
+from model_router import (
+    EXTRACTION_MODEL,
+    EXTRACTION_ESCALATION_CONFIDENCE,
+    EXTRACTION_STRUCTURED_OUTPUTS,
+    MODEL_TIERS,
+    extraction_response_format,
+    schema_errors,
+    answer_confidence,
+    starting_tier,
+    last_tier,
+    request_cost,
+    router_metrics,
+)
+from openai_scheduler import openai_scheduler
+from department_classifier import (
+    DEPARTMENT_CLASSIFIER_ENABLED,
+    DEPARTMENT_CLASSIFIER_THRESHOLD,
+    get_department_classifier,
+)
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+# Completion tokens budgeted per request by the rate-limit scheduler (settled against actual usage)
+EXTRACTION_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("EXTRACTION_COMPLETION_TOKEN_ESTIMATE", "300"))
+
+# Shared pooled OpenAI client (OPENAI_BASE_URL may point it at a local fake server).
+# The SDK retries 408/409/429/5xx and connection errors with exponential backoff.
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+# Caps concurrent extraction requests across all post-call workers
+openai_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+EXTRACTION_SYSTEM_PROMPT = "You are a precise data extraction assistant. Extract only confirmed information. Purpose and summary must follow the rules."
+
+EXTRACTION_PROMPT_TEMPLATE = """
+You are a strict data extraction assistant. Use only confirmed information.
+
+RULES:
+1. NAME → The name the agent repeats AND caller confirms.
+2. EMAIL → Only the version spelled by the agent after the phrase 
+   "Let me spell it back slowly to confirm". 
+   - Accept it ONLY if the caller then confirms (yes, ok, perfect, correcto, etc.).
+   - Convert "at" → "@" and "dot" → "."
+   - Remove spaces/commas.
+   - Ignore all earlier user-provided emails.
+3. DEPARTMENT → The department the user was routed to (viva, casting, press, support, sales, management, voicemail).
+4. ORGANIZATION → Only if explicitly mentioned, else empty.
+5. PURPOSE → The purpose of the call, as stated or confirmed by the user. Use the agent's paraphrase if confirmed, or the user's own words if not.
+6. SUMMARY → Write a short (1-2 lines) summary of the call, focusing on any details, requests, or context NOT already present in the other columns (name, phone, email, organization, purpose, department). Do NOT repeat info from those columns. Instead, mention any extra details, context, or special requests the user made, e.g. "User asked for a press kit and mentioned working with XYZ client." If nothing extra, say "No additional details provided."
+7. DELIVERY_PREFERENCE → Analyze the transcript to determine how the user wants to receive information (SMS, Email, or Both). Look for questions like "Would you like the link by SMS or email?" and the user's response. Return one of: ["Sms"], ["Email"], or ["Both"]. Classify the text message response as SMS.
+
+Return JSON only:
+{{
+  "name": "...",
+  "email": "...",
+  "organization": "...",
+  "department": "...",
+  "purpose": "...",
+  "summary": "...",
+  "delivery_preference": ["Sms"] or ["Email"] or ["Both"]
+}}
+
+Examples for delivery preference:
+- User says "SMS please" → ["Sms"]
+- User says "Email is better" → ["Email"] 
+- User says "Both please" or "You can send it to my email and also text me" → ["Both"]
+- User says "Just text me" → ["Sms"]
+- User says "Send it to my email" → ["Email"]
+- If no preference mentioned → ["Both"]
+
+TRANSCRIPT:
+{transcript}
+"""
+
+# Appended when the fast path already settled some fields
+PARTIAL_FIELDS_TEMPLATE = """
+ONLY these fields are still needed: {fields}.
+Return JSON with exactly these keys and nothing else.
+"""
+
+# Bumps automatically whenever the prompt text changes, invalidating cached results
+# (compaction settings and model tiers change the answer, so they are part of the version too)
+PROMPT_VERSION = prompt_version(
+    EXTRACTION_SYSTEM_PROMPT,
+    EXTRACTION_PROMPT_TEMPLATE,
+    PARTIAL_FIELDS_TEMPLATE,
+    f"compaction={EXTRACTION_COMPACTION}:{EXTRACTION_TOKEN_BUDGET}:{EXTRACTION_SUMMARY_WINDOW}",
+    f"tiers={','.join(MODEL_TIERS)}:structured={EXTRACTION_STRUCTURED_OUTPUTS}",
+)
+extraction_cache = ExtractionCache(PROMPT_VERSION)
+
+# Empty contact info (what a call with nothing extracted looks like)
+DEFAULT_CONTACT_INFO = {
+    "name": "",
+    "email": "",
+    "organization": "",
+    "department": "voicemail",
+    "purpose": "",
+    "summary": "",
+    "delivery_preference": ["Both"]
+}
+
+
+def build_extraction_messages(transcript, fields=None):
+    """
+    Chat messages for one transcript (shared by the online and batch paths)
+
+    Args:
+        fields (list): Restrict the answer to these fields; None asks for all of them
+    """
+    prompt = EXTRACTION_PROMPT_TEMPLATE.format(transcript=transcript)
+    if fields is not None and list(fields) != FIELDS:
+        prompt += PARTIAL_FIELDS_TEMPLATE.format(fields=", ".join(fields))
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_extraction_request(transcript, model=EXTRACTION_MODEL, fields=None):
+    """Chat-completions request body for one transcript (JSON-schema constrained when structured outputs are on)"""
+    request = {
+        "model": model,
+        "messages": build_extraction_messages(transcript, fields),
+        "temperature": 0.0,
+    }
+    response_format = extraction_response_format(fields)
+    if response_format is not None:
+        request["response_format"] = response_format
+    return request
+
+
+def parse_extraction_response(content, transcript):
+    """
+    Turn the model's JSON answer into contact info
+
+    Raises:
+        ValueError: If the model did not return valid JSON
+    """
+    result = content.strip()
+    print(f"🔎 Raw OpenAI response: {result}")
+    contact_info = json.loads(result)
+
+    # --- Safeguard: the last email the caller confirmed after "spell it back" ---
+    email, confirmed = scan_spelled_email(split_turns(transcript))
+    if confirmed:
+        contact_info["email"] = email
+
+    return contact_info
+
+
+async def send_extraction_request(client, request):
+    """
+    Send one chat-completions request once the rate-limit scheduler admits it
+
+    Returns:
+        tuple: (response, seconds the request took, not counting time queued)
+    """
+    started = []
+
+    async def send():
+        async with openai_semaphore:
+            started.append(time.perf_counter())
+            return await client.chat.completions.with_raw_response.create(**request)
+
+    estimated_tokens = sum(count_tokens(message["content"]) for message in request["messages"])
+    response = await openai_scheduler.run(
+        request["model"], estimated_tokens + EXTRACTION_COMPLETION_TOKEN_ESTIMATE, send
+    )
+    return response, time.perf_counter() - started[-1]
+
+
+async def run_extraction(transcript, client=None, fast_path=EXTRACTION_FAST_PATH,
+                         compaction=EXTRACTION_COMPACTION, models=None):
+    """
+    One uncached extraction: fast-path rules, then OpenAI for the remaining fields
+
+    The request starts on the tier picked by starting_tier() and moves to the
+    next tier when the answer is not valid JSON for the schema, scores below
+    EXTRACTION_ESCALATION_CONFIDENCE, or the request fails, at most
+    EXTRACTION_MAX_ESCALATIONS tiers up. On the last tier the best valid
+    answer so far is used.
+
+    Args:
+        models (list): Model tiers, cheapest first (defaults to MODEL_TIERS)
+
+    Returns:
+        tuple: (contact_info, usage) where usage holds prompt_tokens,
+        completion_tokens, cost_usd, the llm_fields that were requested
+        and the models that answered
+
+    Raises:
+        Exception: When no tier produced a valid answer (callers decide on the fallback)
+    """
+    rules, rule_confidence = fast_extract(transcript)
+    # Local classifier: settles the department when no opening line confirmed it, and checks the LLM's label
+    department = None
+    if DEPARTMENT_CLASSIFIER_ENABLED:
+        department = get_department_classifier().apply(transcript, rules, rule_confidence)
+    llm_fields = FIELDS
+    contact_info = {}
+    if fast_path:
+        contact_info = dict(rules)
+        llm_fields = fields_for_llm(rule_confidence)
+        fast_path_metrics.record(llm_fields)
+        print(f"⚡ Fast-path confidence: {rule_confidence} (LLM fields: {llm_fields or 'none'})")
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "llm_fields": llm_fields, "models": []}
+    if not llm_fields:
+        return contact_info, usage
+
+    client = client or openai_client
+    tiers = list(models or MODEL_TIERS)
+    prompt_transcript = prepare_transcript(transcript, compaction)
+    first = starting_tier(count_tokens(prompt_transcript), llm_fields, tiers)
+    router_metrics.started(tiers[first])
+
+    best, best_score, last_error = None, -1.0, None
+    last = last_tier(first, tiers)
+    for index in range(first, last):
+        model = tiers[index]
+        can_escalate = index + 1 < last
+        start = time.perf_counter()
+        try:
+            response, seconds = await send_extraction_request(
+                client, build_extraction_request(prompt_transcript, model=model, fields=llm_fields)
+            )
+        except Exception as e:
+            router_metrics.record_request(model, time.perf_counter() - start)
+            router_metrics.record_outcome(model, "error", can_escalate)
+            print(f"⚠️ Extraction request on {model} failed: {e}")
+            last_error = e
+            continue
+
+        prompt_tokens = response.usage.prompt_tokens if response.usage is not None else 0
+        completion_tokens = response.usage.completion_tokens if response.usage is not None else 0
+        router_metrics.record_request(model, seconds, prompt_tokens, completion_tokens)
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+        usage["cost_usd"] += request_cost(model, prompt_tokens, completion_tokens)
+        usage["models"].append(model)
+
+        try:
+            llm_info = parse_extraction_response(response.choices[0].message.content or "", transcript)
+            errors = schema_errors(llm_info, llm_fields)
+        except ValueError as e:
+            errors = [f"invalid JSON: {e}"]
+        if errors:
+            router_metrics.record_outcome(model, "schema", can_escalate)
+            print(f"⚠️ {model} answer failed the schema: {'; '.join(errors)}")
+            last_error = ValueError(f"{model}: {'; '.join(errors)}")
+            continue
+
+        score = answer_confidence(llm_info, llm_fields, rules, rule_confidence)
+        if score > best_score:
+            best, best_score = llm_info, score
+        if score >= EXTRACTION_ESCALATION_CONFIDENCE:
+            router_metrics.record_outcome(model, "accepted", False)
+            break
+        router_metrics.record_outcome(model, "low_confidence", can_escalate)
+        if can_escalate:
+            print(f"⬆️ {model} answer confidence {score} - escalating to {tiers[index + 1]}")
+
+    if best is None:
+        raise last_error or ValueError("no extraction model answered")
+    if department is not None and department[1] >= DEPARTMENT_CLASSIFIER_THRESHOLD and "department" in best:
+        get_department_classifier().check(department[0], best["department"])
+    if not fast_path:
+        contact_info = best
+    for field in llm_fields:
+        if field in best:
+            contact_info[field] = best[field]
+    return contact_info, usage
+
+
+async def extract_contact_from_transcript(transcript: str):
+    """
+    Extract final confirmed contact info from transcript.
+    Email is ONLY valid if:
+      - It appears after "Let me spell it back slowly to confirm"
+      - AND the user confirms it (yes/ok/perfect/correct/etc.)
+    Results are served from the extraction cache when this transcript was seen before.
+    """
+    try:
+        cached = await extraction_cache.get(transcript, EXTRACTION_MODEL)
+        if cached is not None:
+            print(f"✅ Extracted contact info (cached): {cached}")
+            return cached
+
+        contact_info, _ = await run_extraction(transcript)
+        print(f"✅ Extracted contact info: {contact_info}")
+        await extraction_cache.put(transcript, EXTRACTION_MODEL, contact_info)
+        return contact_info
+
+    except Exception as e:
+        # Keep whatever the script's confirmations show rather than an empty voicemail record
+        contact_info, _ = fast_extract(transcript)
+        router_metrics.rules_fallbacks += 1
+        print(f"❌ Extraction error: {e} - using rule-based fields: {contact_info}")
+        return contact_info
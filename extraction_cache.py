@@ -0,0 +1,196 @@
+"""
+Content-addressed extraction cache
+Extraction results are stored in SQLite under a hash of the normalized
+transcript, the extraction prompt version and the model name, so stage
+retries and reprocessed calls never pay for the same OpenAI request twice.
+Changing the prompt text changes the version, which invalidates old entries.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXTRACTION_CACHE_DB = os.getenv("EXTRACTION_CACHE_DB", "extraction_cache.db")
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "20000"))
+# Recent entries also kept in memory so same-process retries skip the disk entirely
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "1000"))
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    key TEXT PRIMARY KEY,
+    prompt_version TEXT NOT NULL,
+    model TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_lru ON extraction_cache (last_used_at);
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(transcript):
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return _WHITESPACE.sub(" ", transcript).strip()
+
+
+def prompt_version(*prompt_parts):
+    """Short hash of the prompt text; any edit to the prompt yields a new version"""
+    digest = hashlib.sha256()
+    for part in prompt_parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class ExtractionCache:
+    """Persistent LRU cache of extraction results"""
+
+    def __init__(self, prompt_version, db_path=EXTRACTION_CACHE_DB, max_entries=EXTRACTION_CACHE_MAX_ENTRIES,
+                 memory_entries=EXTRACTION_CACHE_MEMORY_ENTRIES, enabled=EXTRACTION_CACHE_ENABLED):
+        """
+        Args:
+            prompt_version (str): Version of the extraction prompt currently in use
+            db_path (str): SQLite database file (opened on first use)
+            max_entries (int): Least recently used entries beyond this are evicted
+            memory_entries (int): Size of the in-process LRU in front of SQLite
+            enabled (bool): False turns every lookup into a miss and skips writes
+        """
+        self.prompt_version = prompt_version
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.invalidated = 0
+        self.lookup_seconds = 0.0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            # Entries written under an older prompt can never be hit again
+            cursor = self._conn.execute(
+                "DELETE FROM extraction_cache WHERE prompt_version != ?", (self.prompt_version,)
+            )
+            self.invalidated += cursor.rowcount
+        return self._conn
+
+    def key(self, transcript, model):
+        """Content address for one transcript under the current prompt and model"""
+        material = f"{self.prompt_version}\0{model}\0{normalize_transcript(transcript)}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get(self, key):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT result FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE extraction_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?",
+                    (time.time(), key),
+                )
+        return json.loads(row[0]) if row is not None else None
+
+    async def get(self, transcript, model):
+        """
+        Cached extraction result for this transcript
+
+        Returns:
+            dict: Contact info, None on a miss
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        key = self.key(transcript, model)
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        else:
+            result = await asyncio.to_thread(self._get, key)
+            if result is not None:
+                self._remember(key, result)
+        self.lookup_seconds += time.perf_counter() - start
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(result)
+
+    def _put(self, key, model, result):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, prompt_version, model, result, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.prompt_version, model, json.dumps(result), now, now),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+            if count > self.max_entries:
+                cursor = conn.execute(
+                    "DELETE FROM extraction_cache WHERE key IN "
+                    "(SELECT key FROM extraction_cache ORDER BY last_used_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self.evicted += cursor.rowcount
+
+    async def put(self, transcript, model, result):
+        """Store a successful extraction"""
+        if not self.enabled:
+            return
+        key = self.key(transcript, model)
+        self._remember(key, dict(result))
+        await asyncio.to_thread(self._put, key, model, result)
+
+    def _size(self):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+
+    async def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "prompt_version": self.prompt_version,
+            "entries": await asyncio.to_thread(self._size) if self.enabled else 0,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "avg_lookup_us": round(self.lookup_seconds / lookups * 1e6, 1) if lookups else 0.0,
+            "evicted": self.evicted,
+            "invalidated": self.invalidated,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
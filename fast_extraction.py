@@ -0,0 +1,295 @@
+"""
+Rule-based fast-path extraction
+The agent script in ultravox_prompt.py confirms every detail with fixed
+phrases (name read back, email spelled back, department opening line,
+delivery preference question). This module reads those confirmations straight
+from the formatted transcript and gives each field a confidence score, so the
+LLM is only asked for the fields the rules could not settle.
+"""
+
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXTRACTION_FAST_PATH = os.getenv("EXTRACTION_FAST_PATH", "true").lower() == "true"
+# Fields below this confidence are sent to the LLM
+EXTRACTION_FAST_PATH_THRESHOLD = float(os.getenv("EXTRACTION_FAST_PATH_THRESHOLD", "0.8"))
+# When false, a call whose structured fields are all confident skips the LLM entirely (empty summary)
+EXTRACTION_SUMMARY_REQUIRED = os.getenv("EXTRACTION_SUMMARY_REQUIRED", "true").lower() == "true"
+
+FIELDS = ["name", "email", "organization", "department", "purpose", "summary", "delivery_preference"]
+# Free-text fields the rules never produce with confidence
+LLM_ONLY_FIELDS = ["summary"]
+
+_TURN = re.compile(r"^(Agent|User|Unknown) \((Voice|Text)\): ?")
+
+AFFIRMATIVE = re.compile(
+    r"\b(yes|yeah|yep|yup|ok|okay|perfect|correct|right|sure|exactly|that's right|si|sí|correcto|claro|exacto)\b",
+    re.IGNORECASE,
+)
+NEGATIVE = re.compile(r"\b(no|nope|not (?:quite|right|correct)|wrong|incorrect|incorrecto)\b", re.IGNORECASE)
+
+# Agent confirmations from the PROGRESSIVE CAPTURE script
+NAME_CONFIRM = re.compile(r"I heard ([^.?!]+?)[.?!]?\s*Did I get that right", re.IGNORECASE)
+SPELL_BACK = re.compile(r"spell it back", re.IGNORECASE)
+SPELL_CHECK = re.compile(r"Did I spell that correctly", re.IGNORECASE)
+ORG_CONFIRM = re.compile(r"I recorded ([^.?!]+)", re.IGNORECASE)
+ORG_INDEPENDENT = re.compile(r"independent press noted", re.IGNORECASE)
+ORG_QUESTION = re.compile(r"organization|company|agency|outlet", re.IGNORECASE)
+PURPOSE_CONFIRM = re.compile(r"you(?:'|’)re calling about ([^.?!]+?)[.?!]?\s*Did I get that right", re.IGNORECASE)
+DELIVERY_QUESTION = re.compile(r"text message or (?:by )?email", re.IGNORECASE)
+DELIVERY_CONFIRM = re.compile(r"get it via ([^.?!]+)", re.IGNORECASE)
+
+# Department opening lines (DEPARTMENT FLOWS in ultravox_prompt.py); the last one heard wins
+DEPARTMENT_OPENINGS = [
+    ("viva", re.compile(r"reached the ¡?VIVA!? Audio Bible team", re.IGNORECASE)),
+    ("casting", re.compile(r"interest in joining ¡?VIVA!? or other Faith Agency productions", re.IGNORECASE)),
+    ("press", re.compile(r"reached Faith Agency(?:'|’)s press desk", re.IGNORECASE)),
+    ("support", re.compile(r"reached technical support", re.IGNORECASE)),
+    ("sales", re.compile(r"Thanks for calling sales and partnerships", re.IGNORECASE)),
+    ("management", re.compile(r"reached Faith Agency management", re.IGNORECASE)),
+    ("voicemail", re.compile(r"share your name, email, and purpose after the tone", re.IGNORECASE)),
+]
+
+SPOKEN_SYMBOLS = {"at": "@", "dot": ".", "underscore": "_", "dash": "-", "hyphen": "-", "arroba": "@", "punto": "."}
+
+
+def iter_turns_with_medium(transcript):
+    """
+    Yield (role, medium, text) turns from a format_chat transcript in one pass
+
+    medium is "Voice" or "Text"; lines without a role prefix belong to the
+    previous turn.
+    """
+    role, medium, parts = None, None, []
+    for line in transcript.splitlines():
+        match = _TURN.match(line)
+        if match:
+            if role is not None:
+                yield role, medium, "\n".join(parts).strip()
+            role, medium, parts = match.group(1), match.group(2), [line[match.end():]]
+        elif role is not None:
+            parts.append(line)
+    if role is not None:
+        yield role, medium, "\n".join(parts).strip()
+
+
+def iter_turns(transcript):
+    """Yield (role, text) turns from a format_chat transcript in one pass"""
+    for role, _, text in iter_turns_with_medium(transcript):
+        yield role, text
+
+
+def split_turns(transcript):
+    return list(iter_turns(transcript))
+
+
+def _next_user_replies(turns):
+    """For each turn, the text of the next caller turn after it (None if the caller never spoke again)"""
+    replies = [None] * len(turns)
+    reply = None
+    for index in range(len(turns) - 1, -1, -1):
+        replies[index] = reply
+        if turns[index][0] == "User":
+            reply = turns[index][1]
+    return replies
+
+
+def _confirmed(reply):
+    """True/False if the caller's reply confirms/denies what the agent said, None if unclear"""
+    if reply is None:
+        return None
+    negative = NEGATIVE.search(reply)
+    affirmative = AFFIRMATIVE.search(reply)
+    # Whichever comes first decides: "No, that's not right" rejects, "Yes, no problem" confirms
+    if negative and (affirmative is None or negative.start() < affirmative.start()):
+        return False
+    if affirmative:
+        return True
+    return None
+
+
+def spelled_email(text):
+    """Rebuild an email from an agent spell-back ("m, s, at, g, m, a, i, l, dot, com")"""
+    spelled = SPELL_BACK.split(text, 1)[-1]
+    if ":" in spelled:
+        spelled = spelled.split(":", 1)[1]
+    spelled = SPELL_CHECK.split(spelled, 1)[0]
+    tokens = re.findall(r"[a-z0-9@._+-]+", spelled.lower())
+    # Drop lead-in words such as "to confirm" / "slowly"
+    start = 0
+    while start < len(tokens) and len(tokens[start]) > 1 and tokens[start] not in SPOKEN_SYMBOLS and "@" not in tokens[start]:
+        start += 1
+    email = "".join(SPOKEN_SYMBOLS.get(token, token) for token in tokens[start:]).strip(".")
+    return email if re.fullmatch(r"[^@\s]+@[^@\s]+\.[a-z]{2,}", email) else ""
+
+
+def scan_spelled_email(turns):
+    """
+    Find the agent's email spell-back in a single pass over the turns
+
+    The spelling runs from the agent turn containing "spell it back" up to the
+    caller's next turn, which confirms or rejects it. Each turn is looked at
+    once, so runtime stays linear however long or repetitive the call is.
+
+    Args:
+        turns: (role, text) pairs from iter_turns/split_turns
+
+    Returns:
+        tuple: (email, True) for the last confirmed spelling, else (email, None) for the
+        last spelling without a clear answer, else ("", None)
+    """
+    confirmed = ""
+    unclear = ""
+    pending = None  # agent text since the latest spell-back
+    for role, text in turns:
+        if role == "Agent":
+            if SPELL_BACK.search(text):
+                pending = [text]
+            elif pending is not None:
+                pending.append(text)
+        elif role == "User" and pending is not None:
+            email = spelled_email(" ".join(pending))
+            pending = None
+            verdict = _confirmed(text)
+            if email and verdict:
+                confirmed, unclear = email, ""
+            elif email and verdict is None:
+                unclear = email
+    if pending is not None:
+        unclear = spelled_email(" ".join(pending)) or unclear
+    if confirmed:
+        return confirmed, True
+    return unclear, None
+
+
+def _delivery_from_text(text):
+    lowered = text.lower()
+    wants_text = any(word in lowered for word in ("text", "sms", "message", "mensaje"))
+    wants_email = any(word in lowered for word in ("email", "e-mail", "mail", "correo"))
+    if "both" in lowered or "ambos" in lowered or (wants_text and wants_email):
+        return ["Both"]
+    if wants_text:
+        return ["Sms"]
+    if wants_email:
+        return ["Email"]
+    return None
+
+
+def fast_extract(transcript):
+    """
+    Extract contact fields from the script's confirmations
+
+    Returns:
+        tuple: (contact_info dict, confidence dict field -> 0.0..1.0)
+    """
+    turns = split_turns(transcript)
+    replies = _next_user_replies(turns)
+    info = {"name": "", "email": "", "organization": "", "department": "voicemail",
+            "purpose": "", "summary": "", "delivery_preference": ["Both"]}
+    confidence = {field: 0.0 for field in FIELDS}
+    asked_organization = False
+    asked_delivery = False
+
+    for index, (role, text) in enumerate(turns):
+        if role != "Agent":
+            continue
+
+        # Later confirmations override earlier ones (the caller may have corrected a detail)
+        match = NAME_CONFIRM.search(text)
+        if match:
+            confirmed = _confirmed(replies[index])
+            if confirmed is not False:
+                info["name"] = match.group(1).strip(" ,")
+                confidence["name"] = 0.95 if confirmed else 0.5
+
+        match = PURPOSE_CONFIRM.search(text)
+        if match:
+            confirmed = _confirmed(replies[index])
+            if confirmed is not False:
+                info["purpose"] = match.group(1).strip()
+                confidence["purpose"] = 0.9 if confirmed else 0.5
+
+        match = ORG_CONFIRM.search(text)
+        if match:
+            info["organization"] = match.group(1).strip()
+            confidence["organization"] = 0.9
+        elif ORG_INDEPENDENT.search(text):
+            info["organization"] = ""
+            confidence["organization"] = 0.9
+        elif ORG_QUESTION.search(text) and "?" in text:
+            asked_organization = True
+
+        for department, pattern in DEPARTMENT_OPENINGS:
+            if pattern.search(text):
+                info["department"] = department
+                confidence["department"] = 0.9
+
+        match = DELIVERY_CONFIRM.search(text)
+        if match and _delivery_from_text(match.group(1)):
+            info["delivery_preference"] = _delivery_from_text(match.group(1))
+            confidence["delivery_preference"] = 0.95
+        elif DELIVERY_QUESTION.search(text):
+            asked_delivery = True
+            reply = replies[index]
+            preference = _delivery_from_text(reply) if reply else None
+            if preference and confidence["delivery_preference"] < 0.95:
+                info["delivery_preference"] = preference
+                confidence["delivery_preference"] = 0.85
+
+    email, confirmed = scan_spelled_email(turns)
+    if email:
+        info["email"] = email
+        confidence["email"] = 0.95 if confirmed else 0.5
+
+    # Nothing asked about an organization: the rule says leave it empty, but the caller
+    # may have named one unprompted, so only moderately sure
+    if confidence["organization"] == 0.0 and not asked_organization:
+        confidence["organization"] = 0.6
+    # No delivery question at all → the documented default ["Both"]
+    if confidence["delivery_preference"] == 0.0 and not asked_delivery:
+        confidence["delivery_preference"] = 0.8
+
+    return info, confidence
+
+
+def fields_for_llm(confidence, threshold=EXTRACTION_FAST_PATH_THRESHOLD, summary_required=EXTRACTION_SUMMARY_REQUIRED):
+    """Fields the LLM still has to answer, in FIELDS order"""
+    needed = [field for field in FIELDS if field not in LLM_ONLY_FIELDS and confidence.get(field, 0.0) < threshold]
+    if needed or summary_required:
+        needed += LLM_ONLY_FIELDS
+    return [field for field in FIELDS if field in needed]
+
+
+class FastPathMetrics:
+    """How often the rules settle a field, and how many calls skip the LLM"""
+
+    def __init__(self):
+        self.calls = 0
+        self.llm_skipped = 0
+        self.resolved = {field: 0 for field in FIELDS}
+
+    def record(self, llm_fields):
+        self.calls += 1
+        if not llm_fields:
+            self.llm_skipped += 1
+        for field in FIELDS:
+            if field not in llm_fields:
+                self.resolved[field] += 1
+
+    def snapshot(self):
+        return {
+            "enabled": EXTRACTION_FAST_PATH,
+            "threshold": EXTRACTION_FAST_PATH_THRESHOLD,
+            "calls": self.calls,
+            "llm_skipped": self.llm_skipped,
+            "resolved_by_rules": {
+                field: round(count / self.calls, 3) if self.calls else 0.0
+                for field, count in self.resolved.items()
+            },
+        }
+
+
+fast_path_metrics = FastPathMetrics()
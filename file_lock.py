@@ -0,0 +1,27 @@
+"""
+Cross-process file lock
+An exclusive flock on a lock file, shared by every module whose files are
+written by several uvicorn workers (the call store and its CSV view, Google
+token files).
+"""
+
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single worker
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock held on `path` for the duration of the block"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
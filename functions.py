@@ -1,49 +1,55 @@
 import os
-import csv
-import json
-import time
-import re
-import httpx
 import asyncio
 from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
 from twilio_sms import send_sms
 # from email_automation import send_faith_agency_email  # Commented out - now using SendGrid
 from sendgrid_mailer import send_email  # New SendGrid email system
-from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 
-from google_sheet import save_to_google_sheets
+from google_sheet import append_to_google_sheets
 from ultravox_prompt import get_single_flow_prompt
+from extraction import extract_contact_from_transcript, extraction_cache, EXTRACTION_MODEL
+from batch_extraction import get_batch_extractor
+from department_classifier import DEPARTMENT_CLASSIFIER_THRESHOLD, get_department_classifier
+from call_store import get_call_store
+from job_queue import JobParked
+from ultravox_client import get_ultravox_client
+from twilio_client import get_twilio_client, twilio_request
+from transfer_engine import (
+    TransferSession,
+    TRANSFER_STATUS_CALLBACK_URL,
+    status_callback_kwargs,
+    wait_for_call_status,
+)
+from call_events import call_tracker, CallUnavailable
+from call_sessions import call_sessions
+from live_transcript import LiveTranscript, live_transcripts, LIVE_TRANSCRIPT_ENABLED
+from ultravox_transcript import CallMessage, iter_call_messages, format_messages
 
 load_dotenv()
 
-# Global variable to store transfer status
-transfer_status_cache = {}
-
-def store_transfer_status(call_sid, status):
-    """Store transfer status for a call SID"""
-    transfer_status_cache[call_sid] = status
-    print(f"📝 Stored transfer status for {call_sid}: {status}")
-
-def get_transfer_status(call_sid):
-    """Get transfer status for a given call SID"""
-    status = transfer_status_cache.get(call_sid, None)
+async def store_transfer_status(call_sid, status, post_call_queue=None):
+    """Store transfer status for a call SID (on its post-call job too, so it outlives the session)"""
+    if call_sessions.set_transfer_status(call_sid, status):
+        print(f"📝 Stored transfer status for {call_sid}: {status}")
+    else:
+        print(f"⚠️ No call session for {call_sid}, transfer status kept on the job only")
+    if post_call_queue is not None and not await post_call_queue.set_transfer_status(call_sid, status):
+        print(f"⚠️ No post-call job for {call_sid}, transfer status not persisted")
+
+def get_transfer_status(call_sid, job=None):
+    """Get transfer status for a given call SID, preferring the one persisted on its job"""
+    status = (job or {}).get("transfer_status") or call_sessions.get_transfer_status(call_sid)
     print(f"🔍 Retrieved transfer status for {call_sid}: {status}")
     return status
 
 # Configuration
 ULTRAVOX_API_KEY = os.getenv("ULTRAVOX_API_KEY")
 ULTRAVOX_API_URL = 'https://api.ultravox.ai/api/calls'
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 MANAGEMENT_REDIRECT_NUMBER = os.getenv("MANAGEMENT_REDIRECT_NUMBER")
 
-# Initialize OpenAI and Twilio clients
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-twilio_client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
-
 async def handle_transfer_background(call_sid, destination_number, transfer_reason):
     """Handle transfer in background without blocking Ultravox response"""
     try:
@@ -57,99 +63,13 @@ async def handle_transfer_background(call_sid, destination_number, transfer_reas
 
 async def quick_transfer_check(call_sid, destination_number):
     """Quick transfer check with shorter timeout for Ultravox responsiveness"""
-    try:
-        print(f"⚡ Quick transfer check to {destination_number}...")
-        
-        # Create a test call to management with shorter timeout
-        # Create management call
-        management_call = twilio_client.calls.create(
-            to=MANAGEMENT_REDIRECT_NUMBER,
-            from_=os.getenv("TWILIO_PHONE_NUMBER"),
-            timeout=25,  # Give management 25 seconds to answer
-            url="http://demo.twilio.com/docs/voice.xml"  # Simple holding pattern
-        )
-        
-        management_call_sid = management_call.sid
-        print(f"📞 Created management call: {management_call_sid}")
-        
-        # Wait and check management call status
-        max_wait_time = 20  # Wait up to 20 seconds minimum
-        check_interval = 4  # Check every 4 seconds
-        checks = max_wait_time // check_interval  # 5 checks total (at 4s, 8s, 12s, 16s, 20s)
-        
-        for i in range(checks):
-            print(f"⏰ Checking management call status (attempt {i+1}/{checks})...")
-            time.sleep(check_interval)
-            
-            # Get current call status
-            call_status = twilio_client.calls(management_call_sid).fetch().status
-            print(f"📊 Management call status: {call_status}")
-            
-            if call_status == "in-progress":
-                
-                # Management already answered our test call, so we need to bridge
-                # the customer call with the existing management call
-                try:
-                    # Create a conference room to bridge the calls
-                    conference_name = f"transfer-{call_sid[-8:]}"
-                    
-                    # First, put the customer call into the conference
-                    customer_twiml = f'''
-                    <Response>
-                        <Say>One moment please, connecting you now.</Say>
-                        <Dial>
-                            <Conference waitUrl="" startConferenceOnEnter="true" endConferenceOnExit="true">
-                                {conference_name}
-                            </Conference>
-                        </Dial>
-                    </Response>
-                    '''
-                    
-                    # Then, redirect the management call (which is already answered) to the same conference
-                    management_twiml = f'''
-                    <Response>
-                        <Dial>
-                            <Conference waitUrl="" startConferenceOnEnter="true" endConferenceOnExit="false">
-                                {conference_name}
-                            </Conference>
-                        </Dial>
-                    </Response>
-                    '''
-                    
-                    # Update both calls to join the conference
-                    print(f"🔗 Bridging customer call {call_sid} to conference {conference_name}")
-                    twilio_client.calls(call_sid).update(twiml=customer_twiml)
-                    
-                    print(f"🔗 Bridging management call {management_call_sid} to conference {conference_name}")
-                    twilio_client.calls(management_call_sid).update(twiml=management_twiml)
-                    
-                    print(f"✅ Both calls bridged in conference: {conference_name}")
-                    return {"status": "success", "message": "Connecting you to management now"}
-                    
-                except Exception as bridge_error:
-                    print(f"❌ Bridge error: {bridge_error}")
-                    # If bridge fails, hang up management call and return failure
-                    try:
-                        twilio_client.calls(management_call_sid).update(status='completed')
-                    except:
-                        pass
-                    return {"status": "failed", "message": "Transfer failed - technical error"}
-            
-            elif call_status in ["busy", "no-answer", "failed", "canceled", "completed"]:
-                print(f"❌ Management not available: {call_status}")
-                break
-        
-        # Clean up test call
-        try:
-            twilio_client.calls(management_call_sid).update(status='completed')
-        except:
-            pass
-        
-        return {"status": "failed", "message": "Management is currently unavailable"}
-        
-    except Exception as e:
-        print(f"❌ Quick transfer error: {e}")
-        return {"status": "failed", "message": f"Transfer error: {str(e)}"}
+    session = TransferSession(
+        get_twilio_client(),
+        call_sid,
+        MANAGEMENT_REDIRECT_NUMBER,
+        os.getenv("TWILIO_PHONE_NUMBER"),
+    )
+    return await session.run()
 
 async def handle_transfer(call_sid, destination_number=None):
     """Handle call transfer with failover logic and answer detection"""
@@ -162,11 +82,15 @@ async def handle_transfer(call_sid, destination_number=None):
         
         # Create a separate outbound call to management without affecting the customer call
         # This way the customer call stays with Ultravox until we confirm management answers
-        management_call = twilio_client.calls.create(
+        twilio_client = get_twilio_client()
+        management_call = await twilio_request(
+            "calls.create",
+            twilio_client.calls.create_async,
             to=destination_number,
             from_=os.getenv("TWILIO_PHONE_NUMBER"),
             timeout=20,  # Ring for 20 seconds  
-            url="http://demo.twilio.com/docs/voice.xml"  # Simple holding pattern
+            url="http://demo.twilio.com/docs/voice.xml",  # Simple holding pattern
+            **status_callback_kwargs()
         )
         
         management_call_sid = management_call.sid
@@ -186,10 +110,10 @@ async def handle_transfer(call_sid, destination_number=None):
                 </Dial>
             </Response>
             '''
-            twilio_client.calls(call_sid).update(twiml=connect_twiml)
+            await twilio_request("calls.update", twilio_client.calls(call_sid).update_async, twiml=connect_twiml)
             # End the test call to management since we're making a real connection
             try:
-                twilio_client.calls(management_call_sid).update(status='completed')
+                await twilio_request("calls.update", twilio_client.calls(management_call_sid).update_async, status='completed')
             except:
                 pass
             return {"status": "success", "message": "Transfer successful - management answered"}
@@ -197,7 +121,7 @@ async def handle_transfer(call_sid, destination_number=None):
             print(f"❌ Management didn't answer - customer stays with Ultravox")
             # Clean up the management call
             try:
-                twilio_client.calls(management_call_sid).update(status='completed')
+                await twilio_request("calls.update", twilio_client.calls(management_call_sid).update_async, status='completed')
             except:
                 pass
             # Customer call continues with Ultravox (no changes made to it)
@@ -218,6 +142,19 @@ async def monitor_transfer_status(call_sid, destination_number):
         checks_performed = 0
         max_checks = total_monitoring_time // check_interval  # 4 checks total
         
+        if TRANSFER_STATUS_CALLBACK_URL:
+            # Twilio tells us the moment management answers; poll once only if the callback never comes
+            print(f"🔍 Waiting up to {total_monitoring_time}s for management status callback")
+            call_status = await wait_for_call_status(call_sid, total_monitoring_time)
+            if call_status is None:
+                call = await twilio_request("calls.fetch", get_twilio_client().calls(call_sid).fetch_async)
+                call_status = call.status if call.status == "in-progress" else "no-answer"
+            if call_status == "in-progress":
+                print("✅ Management answered")
+                return "answered"
+            print(f"❌ Transfer failed - call ended with status: {call_status}")
+            return call_status
+
         print(f"🔍 Starting transfer monitoring - will check every {check_interval}s for {total_monitoring_time}s")
         
         for check_number in range(1, max_checks + 1):
@@ -226,7 +163,7 @@ async def monitor_transfer_status(call_sid, destination_number):
             checks_performed += 1
             
             # Get current call status
-            call = twilio_client.calls(call_sid).fetch()
+            call = await twilio_request("calls.fetch", get_twilio_client().calls(call_sid).fetch_async)
             call_status = call.status
             elapsed_time = check_number * check_interval
             
@@ -265,7 +202,7 @@ async def monitor_transfer_status(call_sid, destination_number):
         return "unknown"
 
 
-def sms_sending(to_number, from_number):
+async def sms_sending(to_number, from_number):
     """
     Send Faith Agency welcome SMS with website link
     
@@ -280,7 +217,7 @@ def sms_sending(to_number, from_number):
 www.vivabiblia.com"""
     
     try:
-        message_sid = send_sms(to_number, content, from_number)
+        message_sid = await send_sms(to_number, content, from_number)
         if message_sid:
             print(f"✅ Faith Agency SMS sent successfully to {to_number}")
             return message_sid
@@ -356,55 +293,16 @@ def email_sending(to_email, contact_name="", department=""):
 
 
 
-async def create_ultravox_call(config):
+async def create_ultravox_call(config, client=None):
     """Function to create an Ultravox call and get the join URL"""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            ULTRAVOX_API_URL,
-            json=config,
-            headers={'Content-Type': 'application/json', 'X-API-Key': ULTRAVOX_API_KEY}
-        )
-        response.raise_for_status()
-        return response.json()
+    client = client or get_ultravox_client()
+    response = await client.post(ULTRAVOX_API_URL, json=config)
+    response.raise_for_status()
+    return response.json()
 
 def format_chat(json_data):
-    """Format chat messages for transcript"""
-    roles = {
-        "MESSAGE_ROLE_USER": "User",
-        "MESSAGE_ROLE_AGENT": "Agent"
-    }
-    
-    chat_text = ""
-    for message in json_data.get("results", []):
-        role = roles.get(message["role"], "Unknown")
-        text = message.get("text", "[No response]")
-        medium = "(Voice)" if message.get("medium") == "MESSAGE_MEDIUM_VOICE" else "(Text)"
-        chat_text += f"{role} {medium}: {text}\n"
-
-    return chat_text
-
-def save_contact_to_csv(contact_data):
-    """Save contact information to Progress.csv"""
-    csv_file = "Progress.csv"
-    fieldnames = [
-        "timestamp", "callSid", "departmentCode", "departmentName",
-        "callerPhone", "name", "email", "organization", "purpose", "status", "summary"
-    ]
-    
-    # Check if file exists to determine if we need to write headers
-    file_exists = os.path.exists(csv_file)
-    
-    with open(csv_file, 'a', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        
-        # Write header if file is new
-        if not file_exists:
-            writer.writeheader()
-        
-        # Write the contact data
-        writer.writerow(contact_data)
-    
-    print(f"Contact information saved to {csv_file}")
+    """Format one page of raw chat messages for transcript"""
+    return format_messages(CallMessage.from_api(message) for message in json_data.get("results", []))
 
 def get_department_name(department_input):
     """Get department name from department input (could be number or word)"""
@@ -432,260 +330,260 @@ def get_department_name(department_input):
     dept_key = str(department_input).lower().strip()
     return department_map.get(dept_key, "Unknown Department")
 
-async def extract_contact_from_transcript(transcript: str):
-    """
-    Extract final confirmed contact info from transcript.
-    Email is ONLY valid if:
-      - It appears after "Let me spell it back slowly to confirm"
-      - AND the user confirms it (yes/ok/perfect/correct/etc.)
-    """
-    try:
-        prompt = f"""
-You are a strict data extraction assistant. Use only confirmed information.
-
-RULES:
-1. NAME → The name the agent repeats AND caller confirms.
-2. EMAIL → Only the version spelled by the agent after the phrase 
-   "Let me spell it back slowly to confirm". 
-   - Accept it ONLY if the caller then confirms (yes, ok, perfect, correcto, etc.).
-   - Convert "at" → "@" and "dot" → "."
-   - Remove spaces/commas.
-   - Ignore all earlier user-provided emails.
-3. DEPARTMENT → The department the user was routed to (viva, casting, press, support, sales, management, voicemail).
-4. ORGANIZATION → Only if explicitly mentioned, else empty.
-5. PURPOSE → The purpose of the call, as stated or confirmed by the user. Use the agent's paraphrase if confirmed, or the user's own words if not.
-6. SUMMARY → Write a short (1-2 lines) summary of the call, focusing on any details, requests, or context NOT already present in the other columns (name, phone, email, organization, purpose, department). Do NOT repeat info from those columns. Instead, mention any extra details, context, or special requests the user made, e.g. "User asked for a press kit and mentioned working with XYZ client." If nothing extra, say "No additional details provided."
-7. DELIVERY_PREFERENCE → Analyze the transcript to determine how the user wants to receive information (SMS, Email, or Both). Look for questions like "Would you like the link by SMS or email?" and the user's response. Return one of: ["Sms"], ["Email"], or ["Both"]. Classify the text message response as SMS.
-
-Return JSON only:
-{{
-  "name": "...",
-  "email": "...",
-  "organization": "...",
-  "department": "...",
-  "purpose": "...",
-  "summary": "...",
-  "delivery_preference": ["Sms"] or ["Email"] or ["Both"]
-}}
-
-Examples for delivery preference:
-- User says "SMS please" → ["Sms"]
-- User says "Email is better" → ["Email"] 
-- User says "Both please" or "You can send it to my email and also text me" → ["Both"]
-- User says "Just text me" → ["Sms"]
-- User says "Send it to my email" → ["Email"]
-- If no preference mentioned → ["Both"]
-
-TRANSCRIPT:
-{transcript}
-"""
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a precise data extraction assistant. Extract only confirmed information. Purpose and summary must follow the rules."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0
-        )
-
-        result = response.choices[0].message.content.strip()
-        print(f"🔎 Raw OpenAI response: {result}")
-        contact_info = json.loads(result)
+async def get_call_status(call_id, client=None):
+    """Fetch the current Ultravox call record once (used by the poll scheduler)."""
+    client = client or get_ultravox_client()
+    response = await client.get(f'{ULTRAVOX_API_URL}/{call_id}')
+    response.raise_for_status()
+    return response.json()
 
-        # --- Regex safeguard for email after "spell it back" ---
-        match = re.search(
-            r"spell it back.*?:\s*([a-z0-9 ,]+).*?Did I spell that correctly\?.*?User.*?(Yes|Ok|Okay|Perfect|Correct|Right|Sure|Sí|Correcto)",
-            transcript,
-            re.IGNORECASE | re.DOTALL,
-        )
-        if match:
-            spelled = match.group(1)
-            cleaned = spelled.replace(",", " ").replace("  ", " ").strip()
-            cleaned = cleaned.replace(" at ", "@").replace(" dot ", ".").replace(" ", "")
-            contact_info["email"] = cleaned
-
-        print(f"✅ Extracted contact info: {contact_info}")
-        return contact_info
-
-    except Exception as e:
-        print(f"❌ Extraction error: {e}")
-        return {
-            "name": "",
-            "email": "",
-            "organization": "",
-            "department": "voicemail",
-            "purpose": "",
-            "summary": "",
-            "delivery_preference": ["Both"]
-        }
-    
-
-async def get_call_status(call_id):
-    """Poll the Ultravox API for the call status until it ends."""
-    headers = {'X-API-Key': ULTRAVOX_API_KEY}
-    
-    while True:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f'{ULTRAVOX_API_URL}/{call_id}', headers=headers)
-            response.raise_for_status()
-            call_data = response.json()
-            
-            if call_data.get('ended') is not None:
-                return call_data.get('summary')
-        await asyncio.sleep(10)
-
-async def get_call_transcript(call_id):
-    """Retrieve the transcript of a completed call from Ultravox."""
-    headers = {'X-API-Key': ULTRAVOX_API_KEY}
+async def get_call_transcript(call_id, client=None):
+    """Retrieve the full transcript of a completed call from Ultravox (every page)."""
     transcript_url = f'{ULTRAVOX_API_URL}/{call_id}/messages'
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(transcript_url, headers=headers)
-        response.raise_for_status()
-        formatted_chat = format_chat(response.json())
-        return formatted_chat
-
-async def monitor_single_flow_call(call_id, caller_phone, call_sid):
-    """Monitor the single flow call and save contact information to CSV"""
+    messages = [message async for message in iter_call_messages(transcript_url, client)]
+    return format_messages(messages)
+
+async def monitor_single_flow_call(call_id, caller_phone, call_sid, queue):
+    """Wait for the single flow call to end, then hand it to the post-call job queue"""
     try:
         print(f"\n=== MONITORING SINGLE FLOW CALL {call_id} ===")
         print(f"Caller Phone: {caller_phone}")
         print(f"Call SID: {call_sid}")
         print("Waiting for call to complete...")
-        
-        # Wait for call to end
-        await get_call_status(call_id)
-        
-        # Get the transcript
-        transcript = await get_call_transcript(call_id)
-        
-        print(f"\n=== CALL COMPLETED - ID: {call_id} ===")
-        print(f"Full Transcript:\n{transcript}")
-        
-        # Extract contact information from transcript using OpenAI
-        contact_info = await extract_contact_from_transcript(transcript)
-        
-        if contact_info:
-            # Check if there was a transfer attempt and its result
-            transfer_result = get_transfer_status(call_sid)
 
-            # Determine status based on transfer result
-            if transfer_result == "success":
-                status = "Answered"
-            else:
-                status = "Not answered"
-
-            print(f"📊 Transfer status for {call_sid}: {transfer_result} → Status: {status}")
-
-            # Prepare data for CSV and Sheets
-            department_word = contact_info.get("department", "voicemail")
-            csv_data = {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "callSid": call_sid,
-                "departmentCode": department_word,  # Store what they actually said
-                "departmentName": get_department_name(department_word),
-                "callerPhone": caller_phone,
-                "name": contact_info.get("name", ""),
-                "email": contact_info.get("email", ""),
-                "organization": contact_info.get("organization", ""),
-                "purpose": contact_info.get("purpose", ""),
-                "status": status,  # Add status field
-                "summary": contact_info.get("summary", "")
-            }
-
-            # Save to CSV (update fieldnames if needed)
-            save_contact_to_csv(csv_data)
-
-            # Save to Google Sheets
-            print(f"\n=== SAVING TO GOOGLE SHEETS ===")
-            sheets_success = save_to_google_sheets(csv_data)
-            if sheets_success:
-                print(f"✅ Data saved to Google Sheets - {csv_data['departmentName']} worksheet")
-            else:
-                print(f"❌ Failed to save to Google Sheets")
+        # Pull the transcript while the caller is still talking
+        live_task = None
+        if LIVE_TRANSCRIPT_ENABLED:
+            live = LiveTranscript(call_id, f"{ULTRAVOX_API_URL}/{call_id}/messages")
+            live_transcripts.add(live)
+            live_task = asyncio.create_task(live.run())
 
-            # Handle delivery preference based on user's choice
-            delivery_preference = contact_info.get("delivery_preference", ["Both"])
-            print(f"\n=== USER DELIVERY PREFERENCE: {delivery_preference} ===")
-            
-            # Extract the preference string (remove the list brackets)
-            preference = delivery_preference[0] if isinstance(delivery_preference, list) and len(delivery_preference) > 0 else "Both"
-            
-            # Initialize results
-            sms_sent = False
-            email_sent = False
+        # Wait for the call.ended webhook (or the poll scheduler)
+        try:
+            await call_tracker.wait_for_end(call_id)
+        finally:
+            if live_task is not None:
+                live_task.cancel()
+        
+        print(f"\n=== CALL COMPLETED - ID: {call_id} ===")
+        await queue.mark_ready(call_id)
             
-            # Handle SMS sending based on preference
-            if preference in ["Sms", "Both"]:
-                print(f"\n=== SENDING SMS TO CALLER (User requested: {preference}) ===")
-                print(f"Using caller phone: {caller_phone}")
-                try:
-                    sms_result = sms_sending(caller_phone, TWILIO_PHONE_NUMBER)
-                    if sms_result:
-                        print(f"✅ SMS sent successfully to {caller_phone}")
-                        sms_sent = True
-                    else:
-                        print(f"❌ Failed to send SMS to {caller_phone}")
-                except Exception as e:
-                    print(f"❌ Error sending SMS: {e}")
+    except CallUnavailable as e:
+        # No transcript can be fetched either; fail the job instead of leaving it waiting
+        await queue.fail_waiting(call_id, e)
+    except Exception as e:
+        print(f"Error monitoring call {call_id}: {e}")
+    finally:
+        call_sessions.mark_ended(call_id)
+
+
+# --- Post-call pipeline stages (run by the job queue workers) ---------------
+# Each stage reads what earlier stages left in job["payload"] and adds its own
+# result. Raising makes the worker retry the stage with backoff.
+
+async def stage_transcript(job):
+    """Fetch the call transcript from Ultravox"""
+    if job["payload"].get("reprocess") and job["payload"].get("transcript"):
+        return
+    live = live_transcripts.get(job["call_id"])
+    if live is not None:
+        # Only the messages since the last live poll are left to fetch
+        live_transcripts.fetched_at_hangup += await live.poll()
+        transcript = live.text()
+    else:
+        transcript = await get_call_transcript(job["call_id"])
+    print(f"\n=== TRANSCRIPT - ID: {job['call_id']} ===")
+    print(f"Full Transcript:\n{transcript}")
+    job["payload"]["transcript"] = transcript
+
+async def stage_extract(job):
+    """Extract contact information from the transcript using OpenAI"""
+    transcript = job["payload"]["transcript"]
+    live = live_transcripts.pop(job["call_id"])
+    if live is not None:
+        speculative = await live.speculative_result()
+        if speculative is not None:
+            live_transcripts.speculative_hits += 1
+            job["payload"]["contact_info"] = speculative
+            return
+    extractor = get_batch_extractor()
+    if extractor is not None and await extractor.should_batch(job):
+        # Transcripts already extracted once skip the batch round-trip
+        cached = await extraction_cache.get(transcript, EXTRACTION_MODEL)
+        if cached is None:
+            await extractor.submit(job)
+            raise JobParked("waiting for batch extraction")
+        job["payload"]["contact_info"] = cached
+        return
+    job["payload"]["contact_info"] = await extract_contact_from_transcript(transcript)
+
+async def stage_record(job):
+    """Build the call record and save it to the call store"""
+    contact_info = job["payload"].get("contact_info")
+    if not contact_info:
+        print("No contact information found in transcript")
+        return
+
+    call_sid = job["call_sid"]
+    # Check if there was a transfer attempt and its result
+    transfer_result = get_transfer_status(call_sid, job)
+
+    # Determine status based on transfer result
+    if transfer_result == "success":
+        status = "Answered"
+    else:
+        status = "Not answered"
+
+    print(f"📊 Transfer status for {call_sid}: {transfer_result} → Status: {status}")
+
+    # Prepare data for CSV and Sheets
+    department_word = contact_info.get("department", "voicemail")
+    if get_department_name(department_word) == "Unknown Department" and job["payload"].get("transcript"):
+        # Label outside the known set: let the local classifier pick the department from the transcript
+        label, confidence = get_department_classifier().classify(job["payload"]["transcript"])
+        print(f"🧭 Unknown department '{department_word}' - classifier says {label} ({confidence})")
+        if confidence >= DEPARTMENT_CLASSIFIER_THRESHOLD:
+            department_word = label
+    csv_data = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "callSid": call_sid,
+        "departmentCode": department_word,  # Store what they actually said
+        "departmentName": get_department_name(department_word),
+        "callerPhone": job["caller_phone"],
+        "name": contact_info.get("name", ""),
+        "email": contact_info.get("email", ""),
+        "organization": contact_info.get("organization", ""),
+        "purpose": contact_info.get("purpose", ""),
+        "status": status,  # Add status field
+        "summary": contact_info.get("summary", "")
+    }
+
+    # Queued to the single writer and upserted by callSid, so a retried stage never records the call twice
+    await get_call_store().save(csv_data)
+    job["payload"]["csv_data"] = csv_data
+
+    print(f"\n=== SAVED TO CALL STORE ===")
+    print(f"Department: {csv_data['departmentName']}")
+    print(f"Name: {csv_data['name']}")
+    print(f"Phone: {csv_data['callerPhone']}")
+    print(f"Email: {csv_data['email']}")
+    print(f"Organization: {csv_data['organization']}")
+    print(f"Purpose: {csv_data['purpose']}")
+    print(f"Status: {csv_data['status']}")
+    print(f"Summary: {csv_data['summary']}")
+    print("=" * 50)
+
+async def stage_sheets(job):
+    """Append the call record to the department's Google Sheets worksheet"""
+    csv_data = job["payload"].get("csv_data")
+    if not csv_data:
+        return
+
+    print(f"\n=== SAVING TO GOOGLE SHEETS ===")
+    # Stored in the Sheets outbox and appended in the background, retried until it lands
+    if await append_to_google_sheets(csv_data):
+        print(f"✅ Row queued for Google Sheets - {csv_data['departmentName']} worksheet")
+    else:
+        print(f"⏭️ Call {csv_data['callSid']} is already on the {csv_data['departmentName']} worksheet")
+
+async def stage_notify(job):
+    """Send the follow-up SMS and/or email the caller asked for"""
+    payload = job["payload"]
+    contact_info = payload.get("contact_info")
+    csv_data = payload.get("csv_data")
+    if not contact_info or not csv_data:
+        return
+    if payload.get("reprocess"):
+        print(f"Skipping follow-up for reprocessed call {job['call_id']}")
+        return
+    caller_phone = job["caller_phone"]
+
+    # Handle delivery preference based on user's choice
+    delivery_preference = contact_info.get("delivery_preference", ["Both"])
+    print(f"\n=== USER DELIVERY PREFERENCE: {delivery_preference} ===")
+    
+    # Extract the preference string (remove the list brackets)
+    preference = delivery_preference[0] if isinstance(delivery_preference, list) and len(delivery_preference) > 0 else "Both"
+    
+    # Channels already delivered by an earlier attempt are not sent twice
+    sms_sent = payload.get("sms_sent", False)
+    email_sent = payload.get("email_sent", False)
+    failed_channels = []
+    
+    # Handle SMS sending based on preference
+    if preference in ["Sms", "Both"] and not sms_sent:
+        print(f"\n=== SENDING SMS TO CALLER (User requested: {preference}) ===")
+        print(f"Using caller phone: {caller_phone}")
+        try:
+            sms_result = await sms_sending(caller_phone, TWILIO_PHONE_NUMBER)
+            if sms_result:
+                print(f"✅ SMS sent successfully to {caller_phone}")
+                sms_sent = True
             else:
-                print(f"\n=== SKIPPING SMS (User preference: {preference}) ===")
-                print("User did not request SMS delivery")
-
-            # Handle Email sending based on preference
-            if preference in ["Email", "Both"]:
-                if contact_info.get("email"):
-                    print(f"\n=== SENDING EMAIL TO CALLER (User requested: {preference}) ===")
-                    print(f"Using email: {contact_info.get('email')}")
-                    try:
-                        email_result = email_sending(
-                            contact_info.get("email"), 
-                            contact_info.get("name", ""),
-                            csv_data.get('departmentName', '')
-                        )
-                        if email_result:
-                            print(f"✅ Email sent successfully to {contact_info.get('email')}")
-                            email_sent = True
-                        else:
-                            print(f"❌ Failed to send email to {contact_info.get('email')}")
-                    except Exception as e:
-                        print(f"❌ Error sending email: {e}")
+                print(f"❌ Failed to send SMS to {caller_phone}")
+        except Exception as e:
+            print(f"❌ Error sending SMS: {e}")
+        if not sms_sent:
+            failed_channels.append("sms")
+    elif preference not in ["Sms", "Both"]:
+        print(f"\n=== SKIPPING SMS (User preference: {preference}) ===")
+        print("User did not request SMS delivery")
+
+    # Handle Email sending based on preference
+    if preference in ["Email", "Both"] and not email_sent:
+        if contact_info.get("email"):
+            print(f"\n=== SENDING EMAIL TO CALLER (User requested: {preference}) ===")
+            print(f"Using email: {contact_info.get('email')}")
+            try:
+                email_result = await asyncio.to_thread(
+                    email_sending,
+                    contact_info.get("email"), 
+                    contact_info.get("name", ""),
+                    csv_data.get('departmentName', '')
+                )
+                if email_result:
+                    print(f"✅ Email sent successfully to {contact_info.get('email')}")
+                    email_sent = True
                 else:
-                    print(f"\n=== EMAIL REQUESTED BUT NO EMAIL ADDRESS (User requested: {preference}) ===")
-                    print("User requested email delivery but no email address was provided")
-                    print("Consider following up via SMS or phone call")
-            else:
-                print(f"\n=== SKIPPING EMAIL (User preference: {preference}) ===")
-                print("User did not request email delivery")
-            
-            # Summary of delivery actions
-            print(f"\n=== DELIVERY SUMMARY ===")
-            print(f"User preference: {preference}")
-            print(f"SMS sent: {'✅ Yes' if sms_sent else '❌ No'}")
-            print(f"Email sent: {'✅ Yes' if email_sent else '❌ No'}")
-            
-            # Handle edge cases
-            if preference == "Email" and not contact_info.get("email") and not sms_sent:
-                print(f"⚠️  WARNING: User wanted email only but no email provided and no SMS sent as fallback")
-            elif preference == "Sms" and not sms_sent and contact_info.get("email"):
-                print(f"⚠️  Note: SMS failed but email is available - consider manual follow-up")
-            elif preference == "Both" and not sms_sent and not email_sent:
-                print(f"⚠️  CRITICAL: User wanted both delivery methods but neither succeeded")
-
-            print(f"\n=== SAVED TO PROGRESS.CSV ===")
-            print(f"Department: {csv_data['departmentName']}")
-            print(f"Name: {csv_data['name']}")
-            print(f"Phone: {csv_data['callerPhone']}")
-            print(f"Email: {csv_data['email']}")
-            print(f"Organization: {csv_data['organization']}")
-            print(f"Purpose: {csv_data['purpose']}")
-            print(f"Status: {csv_data['status']}")
-            print(f"Summary: {csv_data['summary']}")
-            print("=" * 50)
+                    print(f"❌ Failed to send email to {contact_info.get('email')}")
+            except Exception as e:
+                print(f"❌ Error sending email: {e}")
+            if not email_sent:
+                failed_channels.append("email")
         else:
-            print("No contact information found in transcript")
-            
-    except Exception as e:
-        print(f"Error monitoring call {call_id}: {e}")
\ No newline at end of file
+            print(f"\n=== EMAIL REQUESTED BUT NO EMAIL ADDRESS (User requested: {preference}) ===")
+            print("User requested email delivery but no email address was provided")
+            print("Consider following up via SMS or phone call")
+    elif preference not in ["Email", "Both"]:
+        print(f"\n=== SKIPPING EMAIL (User preference: {preference}) ===")
+        print("User did not request email delivery")
+
+    payload["sms_sent"] = sms_sent
+    payload["email_sent"] = email_sent
+    
+    # Summary of delivery actions
+    print(f"\n=== DELIVERY SUMMARY ===")
+    print(f"User preference: {preference}")
+    print(f"SMS sent: {'✅ Yes' if sms_sent else '❌ No'}")
+    print(f"Email sent: {'✅ Yes' if email_sent else '❌ No'}")
+    
+    # Handle edge cases
+    if preference == "Email" and not contact_info.get("email") and not sms_sent:
+        print(f"⚠️  WARNING: User wanted email only but no email provided and no SMS sent as fallback")
+    elif preference == "Sms" and not sms_sent and contact_info.get("email"):
+        print(f"⚠️  Note: SMS failed but email is available - consider manual follow-up")
+    elif preference == "Both" and not sms_sent and not email_sent:
+        print(f"⚠️  CRITICAL: User wanted both delivery methods but neither succeeded")
+
+    if failed_channels:
+        raise RuntimeError(f"Follow-up delivery failed: {', '.join(failed_channels)}")
+
+
+# Post-call stages in execution order
+POST_CALL_STAGES = {
+    "transcript": stage_transcript,
+    "extract": stage_extract,
+    "record": stage_record,
+    "sheets": stage_sheets,
+    "notify": stage_notify,
+}
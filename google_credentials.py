@@ -0,0 +1,243 @@
+"""
+Shared Google OAuth credentials
+The Sheets and Gmail clients get their credentials from one process-wide
+CredentialManager instead of each reading token.json and refreshing it in
+the request path. Each token file is loaded once; a background task refreshes
+tokens GOOGLE_TOKEN_REFRESH_MARGIN seconds before they expire, in a thread,
+and the clients built on the same Credentials object pick up the new token
+without rebuilding. Token files are rewritten atomically under a
+cross-process lock, and a process that finds a newer token on disk (another
+worker already refreshed it) adopts it instead of refreshing again.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from dotenv import load_dotenv
+
+from file_lock import file_lock
+
+load_dotenv()
+
+# Refresh this long before the access token expires (Google tokens last an hour)
+GOOGLE_TOKEN_REFRESH_MARGIN = float(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300"))
+# Wait before trying a failed refresh again
+GOOGLE_TOKEN_RETRY_DELAY = float(os.getenv("GOOGLE_TOKEN_RETRY_DELAY", "60"))
+# Longest the background task sleeps (picks up tokens loaded in the meantime)
+GOOGLE_TOKEN_CHECK_INTERVAL = float(os.getenv("GOOGLE_TOKEN_CHECK_INTERVAL", "60"))
+
+
+def seconds_left(credentials):
+    """Seconds until the access token expires, None when it has no expiry"""
+    if credentials.expiry is None:
+        return None
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (credentials.expiry - now).total_seconds()
+
+
+def write_token_file(path, credentials):
+    """Replace the token file atomically (readers never see a half-written file)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as token:
+        token.write(credentials.to_json())
+        token.flush()
+        os.fsync(token.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Token:
+    def __init__(self, path, scopes):
+        self.path = path
+        self.scopes = list(scopes)
+        self.credentials = None
+        self.lock = threading.Lock()
+        self.refreshes = 0
+        self.adopted = 0
+        self.failures = 0
+        self.last_error = None
+        self.retry_at = 0.0
+
+
+class CredentialManager:
+    """Loads each token file once and keeps its access token fresh in the background"""
+
+    def __init__(self, refresh_margin=GOOGLE_TOKEN_REFRESH_MARGIN, retry_delay=GOOGLE_TOKEN_RETRY_DELAY):
+        """
+        Args:
+            refresh_margin (float): Seconds before expiry a token is refreshed
+            retry_delay (float): Seconds before a failed refresh is tried again
+        """
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._task = None
+
+    def _token(self, token_file, scopes):
+        path = os.path.abspath(token_file)
+        with self._lock:
+            if path not in self._tokens:
+                self._tokens[path] = _Token(path, scopes)
+            return self._tokens[path]
+
+    def _due(self, credentials):
+        if not credentials.refresh_token:
+            return False
+        if not credentials.valid:
+            return True
+        left = seconds_left(credentials)
+        return left is not None and left <= self.refresh_margin
+
+    def _refresh(self, token):
+        """Refresh (caller holds token.lock); blocking, run in a thread"""
+        credentials = token.credentials
+        with file_lock(f"{token.path}.lock"):
+            # Another process may have refreshed the file since we loaded it
+            try:
+                on_disk = Credentials.from_authorized_user_file(token.path, token.scopes)
+            except Exception:
+                on_disk = None
+            if on_disk is not None and on_disk.token and on_disk.token != credentials.token \
+                    and not self._due(on_disk):
+                # Updated in place so clients built on these credentials use the new token
+                credentials.token = on_disk.token
+                credentials.expiry = on_disk.expiry
+                token.adopted += 1
+                return
+            credentials.refresh(Request())
+            write_token_file(token.path, credentials)
+        token.refreshes += 1
+        token.last_error = None
+        print(f"🔑 Refreshed Google token {os.path.relpath(token.path)}")
+
+    def get(self, token_file, scopes):
+        """
+        Credentials for a token file, loaded on first use
+
+        Blocking (disk, and a refresh when the token is already about to
+        expire); call from a thread, or use `credentials()` on the loop.
+
+        Returns:
+            Credentials: Shared object kept fresh in the background, None if the file
+            does not exist or holds an expired token without a refresh token (the
+            caller has to authorize again)
+
+        Raises:
+            Exception: The token file is unreadable or the refresh was rejected
+        """
+        token = self._token(token_file, scopes)
+        with token.lock:
+            if token.credentials is None:
+                if not os.path.exists(token.path):
+                    return None
+                token.credentials = Credentials.from_authorized_user_file(token.path, token.scopes)
+            if self._due(token.credentials):
+                self._refresh(token)
+            if not token.credentials.valid:
+                # Nothing to refresh it with; read the file again after the caller re-authorizes
+                print(f"⚠️ Google token {os.path.relpath(token.path)} is expired and cannot be refreshed")
+                token.credentials = None
+                return None
+            return token.credentials
+
+    async def credentials(self, token_file, scopes):
+        """`get` without blocking the event loop"""
+        return await asyncio.to_thread(self.get, token_file, scopes)
+
+    def store(self, token_file, credentials, scopes):
+        """Adopt credentials from an interactive login and save them"""
+        token = self._token(token_file, scopes)
+        with token.lock:
+            with file_lock(f"{token.path}.lock"):
+                write_token_file(token.path, credentials)
+            token.credentials = credentials
+
+    def invalidate(self, token_file):
+        """Forget a token so the next `get` reads the file again (e.g. after a revoked token)"""
+        path = os.path.abspath(token_file)
+        with self._lock:
+            token = self._tokens.get(path)
+        if token is not None:
+            with token.lock:
+                token.credentials = None
+
+    # --- background refresh ---------------------------------------------
+
+    def refresh_due(self):
+        """Refresh every loaded token close to expiry (blocking)"""
+        with self._lock:
+            tokens = list(self._tokens.values())
+        now = time.monotonic()
+        for token in tokens:
+            if now < token.retry_at:
+                continue
+            with token.lock:
+                if token.credentials is None or not self._due(token.credentials):
+                    continue
+                try:
+                    self._refresh(token)
+                except Exception as e:
+                    token.failures += 1
+                    token.last_error = str(e)
+                    token.retry_at = time.monotonic() + self.retry_delay
+                    print(f"❌ Google token refresh failed for {os.path.relpath(token.path)}: {e}")
+
+    def next_check_in(self):
+        """Seconds until the next token needs refreshing (capped at GOOGLE_TOKEN_CHECK_INTERVAL)"""
+        wait = GOOGLE_TOKEN_CHECK_INTERVAL
+        now = time.monotonic()
+        with self._lock:
+            tokens = list(self._tokens.values())
+        for token in tokens:
+            credentials = token.credentials
+            if credentials is None or not credentials.refresh_token:
+                continue
+            left = seconds_left(credentials)
+            if left is not None:
+                wait = min(wait, max(left - self.refresh_margin, token.retry_at - now))
+        return max(1.0, wait)
+
+    async def run(self):
+        while True:
+            await asyncio.to_thread(self.refresh_due)
+            await asyncio.sleep(self.next_check_in())
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        print(f"🔑 Google credential refresher started ({self.refresh_margin:.0f}s before expiry)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def snapshot(self):
+        with self._lock:
+            tokens = list(self._tokens.values())
+        snapshot = {}
+        for token in tokens:
+            credentials = token.credentials
+            left = seconds_left(credentials) if credentials is not None else None
+            snapshot[os.path.relpath(token.path)] = {
+                "loaded": credentials is not None,
+                "expires_in_s": round(left) if left is not None else None,
+                "refreshes": token.refreshes,
+                "adopted_from_disk": token.adopted,
+                "failures": token.failures,
+                "last_error": token.last_error,
+            }
+        return snapshot
+
+
+# Process-wide manager shared by the Sheets and Gmail clients
+credential_manager = CredentialManager()
@@ -2,17 +2,70 @@
 """
 Google Sheets Integration for Faith Agency
 Saves call data to appropriate department worksheets
+
+One GoogleSheetManager is shared by the whole process, so token.json is read
+and the Sheets client is built (from the discovery document bundled with the
+client library, no network fetch) once instead of on every call. Inside the
+app, rows are stored in the persistent outbox (sheets_outbox.py) and sent by
+SheetsWriter, which coalesces the rows of each worksheet and appends them in
+a single API call every SHEETS_FLUSH_INTERVAL seconds or as soon as
+SHEETS_BATCH_ROWS rows are waiting, within a per-minute request quota shared
+(through the outbox database) by every worker process.
 """
 
 import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+import time
+import asyncio
+import threading
+from google.auth.exceptions import RefreshError
 from googleapiclient.discovery import build
 from dotenv import load_dotenv
 
+from openai_scheduler import parse_reset
+from google_credentials import credential_manager
+
 # Load environment variables
 load_dotenv()
 
+# Writer flushes once this many rows are queued or the oldest has waited this long
+SHEETS_BATCH_ROWS = int(os.getenv("SHEETS_BATCH_ROWS", "50"))
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", "2.0"))
+# Sheets API requests per minute for all processes together (Google's default is 60 per user per minute)
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "50"))
+# Wait after a 429 that carries no Retry-After: the per-minute quota window
+SHEETS_QUOTA_PAUSE = float(os.getenv("SHEETS_QUOTA_PAUSE", "60"))
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+
+class SheetsNotReady(RuntimeError):
+    """No authenticated Sheets client or no SheetID; nothing was sent"""
+
+
+def classify_sheets_error(error):
+    """
+    How a failed Sheets request should be retried
+
+    Returns:
+        tuple: (kind, retry_after seconds or None), kind being
+            quota (429), auth (token expired/revoked), not_sent (rejected
+            before or by the API) or uncertain (5xx, timeouts, dropped
+            connections: the rows may have been appended)
+    """
+    if isinstance(error, SheetsNotReady):
+        return "not_sent", None
+    if isinstance(error, RefreshError):
+        return "auth", None
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None)
+    if status == 429:
+        return "quota", parse_reset(resp.get("retry-after"))
+    if status == 401:
+        return "auth", None
+    if status is not None and 400 <= status < 500 and status != 408:
+        return "not_sent", None
+    return "uncertain", None
+
 class GoogleSheetManager:
     def __init__(self):
         """Initialize Google Sheets manager"""
@@ -20,27 +73,28 @@ class GoogleSheetManager:
         self.service = None
         self.credentials_file = "sheets_automation/credentials.json"
         self.token_file = "sheets_automation/token.json"
+        # The client's HTTP connection is not thread-safe; one request at a time
+        self._lock = threading.Lock()
+        self.api_calls = 0
+        self.read_calls = 0
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self.max_write_seconds = 0.0
+        self.errors = 0
         self._authenticate()
     
     def _authenticate(self):
         """Authenticate using existing token from sheets_automation folder"""
         try:
-            if not os.path.exists(self.token_file):
-                print(f"❌ Token file not found: {self.token_file}")
+            # Loaded once per process and refreshed in the background before it expires
+            creds = credential_manager.get(self.token_file, SCOPES)
+            if creds is None:
+                print(f"❌ No usable token in {self.token_file}")
                 print("Please run the sheets_automation/read_sheet.py first to authenticate")
                 return False
             
-            SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
-            
-            # Refresh token if needed
-            if creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-                # Save refreshed token
-                with open(self.token_file, 'w') as token:
-                    token.write(creds.to_json())
-            
-            self.service = build('sheets', 'v4', credentials=creds)
+            # Bundled discovery document: no fetch, and cache_discovery only warns without a cache backend
+            self.service = build('sheets', 'v4', credentials=creds, static_discovery=True, cache_discovery=False)
             print(f"✅ Google Sheets authenticated successfully")
             return True
             
@@ -48,7 +102,8 @@ class GoogleSheetManager:
             print(f"❌ Google Sheets authentication failed: {e}")
             return False
     
-    def get_worksheet_name(self, department_name):
+    @staticmethod
+    def get_worksheet_name(department_name):
         """Convert department name to worksheet name"""
         # Mapping of department names to worksheet names
         department_mapping = {
@@ -63,6 +118,104 @@ class GoogleSheetManager:
         }
         
         return department_mapping.get(department_name, "General Voicemail")
+
+    @staticmethod
+    def worksheet_for(call_data):
+        """Worksheet the call's row belongs on"""
+        return GoogleSheetManager.get_worksheet_name(call_data.get("departmentName", "Unknown Department"))
+
+    @staticmethod
+    def row_for(call_data):
+        """Sheet row for a call record, in the worksheet's column order"""
+        return [
+            call_data.get("timestamp", ""),
+            call_data.get("callerPhone", ""),
+            call_data.get("name", ""),
+            call_data.get("email", ""),
+            call_data.get("organization", ""),
+            call_data.get("purpose", ""),
+            call_data.get("status", "Not answered"),
+            call_data.get("summary", "")
+        ]
+
+    def append_rows(self, worksheet_name, rows):
+        """
+        Append several rows to one worksheet in a single API call
+
+        Args:
+            worksheet_name (str): Target worksheet
+            rows (list): Rows from row_for()
+
+        Returns:
+            int: Cells updated
+
+        Raises:
+            SheetsNotReady: Not authenticated or no SheetID configured
+            Exception: Errors from the Sheets API
+        """
+        self._ready()
+        start = time.monotonic()
+        with self._lock:
+            try:
+                result = self.service.spreadsheets().values().append(
+                    spreadsheetId=self.sheet_id,
+                    range=f"{worksheet_name}!A:H",
+                    valueInputOption='RAW',
+                    insertDataOption='INSERT_ROWS',
+                    body={'values': rows}
+                ).execute()
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                elapsed = time.monotonic() - start
+                self.api_calls += 1
+                self.write_seconds += elapsed
+                self.max_write_seconds = max(self.max_write_seconds, elapsed)
+        self.rows_written += len(rows)
+        return result.get('updates', {}).get('updatedCells', 0)
+
+    def _ready(self):
+        if not self.service:
+            # A missing/invalid token at startup should not disable Sheets until a restart
+            self._authenticate()
+        if not self.service:
+            raise SheetsNotReady("Google Sheets service not authenticated")
+        if not self.sheet_id:
+            raise SheetsNotReady("SheetID not found in .env file")
+
+    def existing_keys(self, worksheet_name):
+        """
+        (timestamp, callerPhone) of every row already on the worksheet
+
+        The sheet has no CallSid column, so these two identify a call's row
+        when checking whether an append that timed out actually landed.
+        """
+        self._ready()
+        with self._lock:
+            self.read_calls += 1
+            result = self.service.spreadsheets().values().get(
+                spreadsheetId=self.sheet_id,
+                range=f"{worksheet_name}!A:B",
+            ).execute()
+        return {tuple(row[:2]) for row in result.get('values', []) if len(row) >= 2}
+
+    def reset(self):
+        """Drop the client so the next request re-reads and refreshes the token"""
+        self.service = None
+        credential_manager.invalidate(self.token_file)
+
+    def snapshot(self):
+        return {
+            "authenticated": self.service is not None,
+            "api_calls": self.api_calls,
+            "read_calls": self.read_calls,
+            "rows_written": self.rows_written,
+            "rows_per_call": round(self.rows_written / self.api_calls, 2) if self.api_calls else 0.0,
+            "avg_write_ms": round(self.write_seconds / self.api_calls * 1000, 1) if self.api_calls else 0.0,
+            "max_write_ms": round(self.max_write_seconds * 1000, 1),
+            "errors": self.errors,
+        }
     
     def append_call_data(self, call_data):
         """
@@ -73,54 +226,261 @@ class GoogleSheetManager:
             bool: True if successful, False otherwise
         """
         try:
-            if not self.service:
-                print("❌ Google Sheets service not authenticated")
-                return False
-
-            if not self.sheet_id:
-                print("❌ SheetID not found in .env file")
-                return False
-
             # Get the worksheet name based on department
-            department_name = call_data.get("departmentName", "Unknown Department")
-            worksheet_name = self.get_worksheet_name(department_name)
+            worksheet_name = self.worksheet_for(call_data)
 
             print(f"📊 Saving to worksheet: {worksheet_name}")
 
-            # Prepare data row - match the new column order
-            row_data = [
-                call_data.get("timestamp", ""),
-                call_data.get("callerPhone", ""),
-                call_data.get("name", ""),
-                call_data.get("email", ""),
-                call_data.get("organization", ""),
-                call_data.get("purpose", ""),
-                call_data.get("status", "Not answered"),
-                call_data.get("summary", "")
-            ]
-
-            # Append data to the worksheet
-            range_name = f"{worksheet_name}!A:H"
-
-            body = {
-                'values': [row_data]
-            }
-
-            result = self.service.spreadsheets().values().append(
-                spreadsheetId=self.sheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                insertDataOption='INSERT_ROWS',
-                body=body
-            ).execute()
+            updated_cells = self.append_rows(worksheet_name, [self.row_for(call_data)])
 
-            print(f"✅ Data saved to {worksheet_name} - {result.get('updates', {}).get('updatedCells', 0)} cells updated")
+            print(f"✅ Data saved to {worksheet_name} - {updated_cells} cells updated")
             return True
 
         except Exception as e:
             print(f"❌ Error saving to Google Sheets: {e}")
             return False
 
+_sheet_manager = None
+_sheet_manager_lock = threading.Lock()
+
+
+def get_sheet_manager():
+    """Process-wide GoogleSheetManager, authenticated on first use"""
+    global _sheet_manager
+    with _sheet_manager_lock:
+        if _sheet_manager is None:
+            _sheet_manager = GoogleSheetManager()
+        return _sheet_manager
+
+
+class SheetsWriter:
+    """
+    Single task that sends the Sheets outbox in batched per-worksheet appends
+
+    `submit` stores the row in the outbox and returns; the task flushes once
+    SHEETS_BATCH_ROWS rows are due or the oldest has waited
+    SHEETS_FLUSH_INTERVAL seconds, with one append per worksheet. Requests
+    are paced to SHEETS_REQUESTS_PER_MINUTE across every process sharing the
+    outbox, a 429 pauses all of them for the Retry-After (or the quota
+    window), and other failures go back to the outbox with exponential
+    backoff.
+    """
+
+    def __init__(self, outbox, manager=None, batch_rows=SHEETS_BATCH_ROWS, flush_interval=SHEETS_FLUSH_INTERVAL,
+                 requests_per_minute=SHEETS_REQUESTS_PER_MINUTE):
+        """
+        Args:
+            outbox (SheetsOutbox): Persistent queue of pending rows
+            manager (GoogleSheetManager): Defaults to the process-wide manager
+            batch_rows (int): Due rows that trigger an immediate flush
+            flush_interval (float): Longest a due row waits for its batch
+            requests_per_minute (int): Sheets API requests allowed per minute (all processes)
+        """
+        self.outbox = outbox
+        self._manager = manager
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.requests_per_minute = requests_per_minute
+        self._wake = asyncio.Event()
+        self._task = None
+        self.flushes = 0
+        self.quota_waits = 0
+        self.rate_limited = 0
+        self.auth_failures = 0
+        self.landed_on_retry = 0
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            self._manager = get_sheet_manager()
+        return self._manager
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        print(f"📊 Google Sheets writer started (batch {self.batch_rows} rows, every {self.flush_interval}s, "
+              f"{self.requests_per_minute} requests/min shared)")
+
+    async def stop(self):
+        """Stop the task; unsent rows stay in the outbox for the next start"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def submit(self, call_data):
+        """
+        Store a call's row in the outbox for its worksheet
+
+        Returns:
+            bool: False when the CallSid was already appended (nothing queued)
+        """
+        queued = await self.outbox.enqueue(
+            call_data["callSid"], GoogleSheetManager.worksheet_for(call_data), GoogleSheetManager.row_for(call_data)
+        )
+        if queued:
+            self._wake.set()
+        return queued
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self._wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        # The first manager use reads token.json and builds the client; keep it off the loop
+        await asyncio.to_thread(lambda: self.manager)
+        await self.outbox.prune()
+        while True:
+            self._wake.clear()
+            try:
+                due, oldest_age = await self.outbox.due_backlog()
+                if not due:
+                    next_due = await self.outbox.next_due_in()
+                    await self._sleep(min(next_due, 60.0) if next_due is not None else 60.0)
+                elif due < self.batch_rows and oldest_age < self.flush_interval:
+                    await self._sleep(self.flush_interval - oldest_age)
+                else:
+                    await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Outbox trouble (disk, locked database): rows are safe on disk, try again shortly
+                print(f"❌ Google Sheets writer error: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _acquire_quota(self):
+        waited = False
+        while True:
+            wait = await self.outbox.take_quota(self.requests_per_minute)
+            if wait <= 0:
+                return
+            if not waited:
+                self.quota_waits += 1
+                waited = True
+            await asyncio.sleep(wait)
+
+    async def _flush(self):
+        items = await self.outbox.claim(self.batch_rows)
+        if not items:
+            return
+        self.flushes += 1
+        by_worksheet = {}
+        for item in items:
+            by_worksheet.setdefault(item["worksheet"], []).append(item)
+
+        worksheets = list(by_worksheet.items())
+        for index, (worksheet_name, worksheet_items) in enumerate(worksheets):
+            try:
+                worksheet_items = await self._skip_landed(worksheet_name, worksheet_items)
+                if not worksheet_items:
+                    continue
+                await self._acquire_quota()
+                await asyncio.to_thread(
+                    self.manager.append_rows, worksheet_name, [item["row"] for item in worksheet_items]
+                )
+            except Exception as e:
+                kind, pause = await self._failed(worksheet_name, worksheet_items, e)
+                if kind == "quota":
+                    # Everything else in this batch would hit the same quota
+                    rest = [item for _, later in worksheets[index + 1:] for item in later]
+                    if rest:
+                        await self.outbox.retry(rest, e, delay=pause, count_attempt=False)
+                    return
+                continue
+            stale = await self.outbox.mark_sent(worksheet_items)
+            print(f"📊 Saved {len(worksheet_items)} rows to {worksheet_name}"
+                  + (f" ({stale} updated meanwhile, the sheet keeps the earlier values)" if stale else ""))
+
+    async def _skip_landed(self, worksheet_name, items):
+        """Mark rows whose earlier, unconfirmed append is already on the sheet as sent"""
+        if not any(item["uncertain"] for item in items):
+            return items
+        await self._acquire_quota()
+        existing = await asyncio.to_thread(self.manager.existing_keys, worksheet_name)
+        landed = [item for item in items if item["uncertain"] and tuple(item["row"][:2]) in existing]
+        if landed:
+            await self.outbox.mark_sent(landed)
+            self.landed_on_retry += len(landed)
+            print(f"📊 {len(landed)} rows were already on {worksheet_name} - not appending them again")
+        landed_sids = {item["call_sid"] for item in landed}
+        return [item for item in items if item["call_sid"] not in landed_sids]
+
+    async def _failed(self, worksheet_name, items, error):
+        """
+        Put a failed worksheet batch back in the outbox
+
+        Returns:
+            tuple: (error kind, seconds the shared quota pause lasts or None)
+        """
+        kind, retry_after = classify_sheets_error(error)
+        if kind == "quota":
+            self.rate_limited += 1
+            pause = await self.outbox.pause_quota(retry_after or SHEETS_QUOTA_PAUSE)
+            print(f"🚦 Google Sheets quota exceeded - pausing every writer {pause:.0f}s")
+            await self.outbox.retry(items, error, delay=pause, count_attempt=False)
+            return kind, pause
+        if kind == "auth":
+            self.auth_failures += 1
+            self.manager.reset()
+        failed = await self.outbox.retry(items, error, uncertain=kind == "uncertain")
+        print(f"❌ Error saving {len(items)} rows to {worksheet_name} ({kind}): {error}")
+        if failed:
+            print(f"❌ Gave up on {failed} rows for {worksheet_name} after repeated failures")
+        return kind, None
+
+    async def snapshot(self):
+        return {
+            "flushes": self.flushes,
+            "quota_waits": self.quota_waits,
+            "rate_limited": self.rate_limited,
+            "auth_failures": self.auth_failures,
+            "already_on_sheet": self.landed_on_retry,
+            "outbox": await self.outbox.snapshot(),
+            **(self._manager.snapshot() if self._manager else {}),
+        }
+
+
+_sheets_writer = None
+
+
+def set_sheets_writer(writer):
+    """Install the process-wide Sheets writer (called from the app lifespan)"""
+    global _sheets_writer
+    _sheets_writer = writer
+
+
+def get_sheets_writer():
+    return _sheets_writer
+
+
+async def append_to_google_sheets(call_data):
+    """
+    Append a call record to its department worksheet without blocking the loop
+
+    When the app runs the writer the row is stored in the outbox and sent
+    in the background (retried until it lands); otherwise the single append
+    is made in a thread.
+
+    Returns:
+        bool: False when the call's row was already appended
+
+    Raises:
+        Exception: The direct append failed (the caller retries)
+    """
+    writer = get_sheets_writer()
+    if writer is not None and writer.running:
+        return await writer.submit(call_data)
+    if not await asyncio.to_thread(save_to_google_sheets, call_data):
+        raise RuntimeError("Failed to save to Google Sheets")
+    return True
+
+
 def save_to_google_sheets(call_data):
     """
     Simple function to save call data to Google Sheets
@@ -132,12 +492,8 @@ def save_to_google_sheets(call_data):
         bool: True if successful, False otherwise
     """
     try:
-        manager = GoogleSheetManager()
-        if manager.service:
-            return manager.append_call_data(call_data)
-        else:
-            print("❌ Failed to initialize Google Sheets manager")
-            return False
+        # append_call_data retries authentication and reports a missing token itself
+        return get_sheet_manager().append_call_data(call_data)
     except Exception as e:
         print(f"❌ Google Sheets integration error: {e}")
         return False
@@ -0,0 +1,553 @@
+"""
+Durable post-call job queue
+Every call gets a SQLite-backed job that walks through the post-call stages
+(transcript → extraction → local record → Google Sheets → SMS/email).
+A fixed-size worker pool drains the queue, retries each stage with backoff
+and picks up unfinished jobs again after a restart. A claimed job carries its
+worker's id and a lease the worker renews while the stage runs; only jobs
+whose lease has expired are taken over, so a second process (or a restart
+while the old one is still draining) never repeats a stage in flight. A job
+waiting for its call to end is leased the same way to the process monitoring
+the call, so resume() only hands out calls whose process is gone.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "post_call_jobs.db")
+POST_CALL_WORKERS = int(os.getenv("POST_CALL_WORKERS", "4"))
+POST_CALL_MAX_ATTEMPTS = int(os.getenv("POST_CALL_MAX_ATTEMPTS", "5"))
+POST_CALL_RETRY_BASE = float(os.getenv("POST_CALL_RETRY_BASE", "5"))
+POST_CALL_RETRY_MAX = float(os.getenv("POST_CALL_RETRY_MAX", "300"))
+# A running job whose worker has not renewed its lease for this long is taken over
+POST_CALL_LEASE_SECONDS = float(os.getenv("POST_CALL_LEASE_SECONDS", "120"))
+
+# Job statuses
+WAITING = "waiting"  # call still live
+PENDING = "pending"  # ready for a worker
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+BATCHED = "batched"  # parked until a batch extraction result comes back
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_id TEXT NOT NULL UNIQUE,
+    call_sid TEXT,
+    caller_phone TEXT,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL DEFAULT '{}',
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_run_at REAL NOT NULL DEFAULT 0,
+    transfer_status TEXT,
+    claimed_by TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs (status, next_run_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_call_sid ON jobs (call_sid);
+"""
+
+# Columns added after the first release: name -> definition for ALTER TABLE on older databases
+ADDED_COLUMNS = {
+    "transfer_status": "TEXT",
+    "claimed_by": "TEXT",
+    "lease_expires_at": "REAL",
+}
+
+
+class JobParked(Exception):
+    """Raised by a stage handler that handed the job to an out-of-band processor"""
+
+
+class PostCallQueue:
+    """SQLite job table; all methods are coroutines that keep disk I/O off the loop"""
+
+    def __init__(self, stages, db_path=JOB_QUEUE_DB, lease_seconds=POST_CALL_LEASE_SECONDS):
+        """
+        Args:
+            stages (list): Ordered stage names a job moves through
+            db_path (str): SQLite database file
+            lease_seconds (float): How long a claim holds without a heartbeat
+        """
+        self.stages = list(stages)
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        # Identifies this process's claims; a restarted process gets a new one
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Several processes may share the queue
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        self._conn.executescript(SCHEMA)
+        self.ready = asyncio.Event()
+        self.completed = 0
+        self.failed = 0
+        self.leases_taken_over = 0
+        self.leases_lost = 0
+
+    def _migrate(self):
+        """Add columns missing from a database created by an older version"""
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if not existing:
+            return  # fresh database, SCHEMA creates everything
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- producers ------------------------------------------------------
+
+    def _enqueue(self, call_id, call_sid, caller_phone):
+        now = time.time()
+        self._execute(
+            "INSERT OR IGNORE INTO jobs (call_id, call_sid, caller_phone, stage, status, created_at, updated_at, "
+            "claimed_by, lease_expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (call_id, call_sid, caller_phone, self.stages[0], WAITING, now, now, self.owner, now + self.lease_seconds),
+        )
+
+    async def enqueue(self, call_id, call_sid, caller_phone):
+        """Record a live call monitored by this process; it becomes runnable once mark_ready is called"""
+        await self._run(self._enqueue, call_id, call_sid, caller_phone)
+
+    def _mark_ready(self, call_id):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, updated_at = ?, next_run_at = ?, claimed_by = NULL, lease_expires_at = NULL "
+            "WHERE call_id = ? AND status = ?",
+            (PENDING, now, now, call_id, WAITING),
+        )
+
+    async def mark_ready(self, call_id):
+        """The call ended: let the workers start post-processing"""
+        await self._run(self._mark_ready, call_id)
+        self.ready.set()
+
+    def _fail_waiting(self, call_id, error):
+        return self._execute(
+            "UPDATE jobs SET status = ?, last_error = ?, updated_at = ?, claimed_by = NULL, lease_expires_at = NULL "
+            "WHERE call_id = ? AND status = ?",
+            (FAILED, str(error), time.time(), call_id, WAITING),
+        ) > 0
+
+    async def fail_waiting(self, call_id, error):
+        """The call can no longer be looked up (e.g. deleted): give up on its job without running it"""
+        failed = await self._run(self._fail_waiting, call_id, error)
+        if failed:
+            self.failed += 1
+        return failed
+
+    def _renew_waiting(self):
+        return self._execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE status = ? AND claimed_by = ?",
+            (time.time() + self.lease_seconds, WAITING, self.owner),
+        )
+
+    async def renew_waiting(self):
+        """Extend the leases on the live calls this process is monitoring"""
+        return await self._run(self._renew_waiting)
+
+    def _release_waiting(self):
+        return self._execute(
+            "UPDATE jobs SET claimed_by = NULL, lease_expires_at = NULL WHERE status = ? AND claimed_by = ?",
+            (WAITING, self.owner),
+        )
+
+    async def release_waiting(self):
+        """Stop monitoring (shutdown): the next process to resume() takes these calls over at once"""
+        return await self._run(self._release_waiting)
+
+    def _set_transfer_status(self, call_sid, status):
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET transfer_status = ?, updated_at = ? WHERE call_sid = ?",
+                (status, time.time(), call_sid),
+            ).rowcount
+
+    async def set_transfer_status(self, call_sid, status):
+        """
+        Record the call's transfer outcome on its job
+
+        Kept in its own column (workers rewrite the payload), so the record
+        stage sees it however long the job was parked, retried or resumed.
+
+        Returns:
+            bool: False when no job exists for the Call SID
+        """
+        return await self._run(self._set_transfer_status, call_sid, status) > 0
+
+    # --- workers --------------------------------------------------------
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Runnable jobs, plus running ones whose worker stopped renewing its lease
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE (status = ? AND next_run_at <= ?) "
+                    "OR (status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)) "
+                    "ORDER BY next_run_at LIMIT 1",
+                    (PENDING, now, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, claimed_by = ?, lease_expires_at = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (RUNNING, self.owner, now + self.lease_seconds, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        if job["status"] == RUNNING:
+            self.leases_taken_over += 1
+            print(f"⏱️ Lease of {job['claimed_by']} on call {job['call_id']} expired - taking over")
+        job["status"] = RUNNING
+        job["claimed_by"] = self.owner
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    async def claim(self):
+        """Take the next runnable job, or None"""
+        return await self._run(self._claim)
+
+    def _renew(self, job):
+        now = time.time()
+        return self._execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ? AND claimed_by = ?",
+            (now + self.lease_seconds, job["id"], RUNNING, self.owner),
+        ) > 0
+
+    async def renew(self, job):
+        """
+        Extend the lease on a job this process is running
+
+        Returns:
+            bool: False if the lease was lost (another worker took the job over)
+        """
+        return await self._run(self._renew, job)
+
+    def _lost(self, job, action):
+        self.leases_lost += 1
+        print(f"⚠️ Lease on call {job['call_id']} was taken over - not saving its {action}")
+
+    def _advance(self, job):
+        now = time.time()
+        index = self.stages.index(job["stage"])
+        if index + 1 < len(self.stages):
+            stage, status = self.stages[index + 1], PENDING
+        else:
+            stage, status = job["stage"], DONE
+        # Parked jobs have no owner; running ones only move on for the worker holding the lease.
+        # The status is checked too, so a job requeued meanwhile (claim cleared) is not moved on.
+        updated = self._execute(
+            "UPDATE jobs SET stage = ?, status = ?, attempts = 0, payload = ?, last_error = NULL, "
+            "updated_at = ?, next_run_at = ?, claimed_by = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND status = ? AND claimed_by IS ?",
+            (stage, status, json.dumps(job["payload"]), now, now, job["id"], job["status"],
+             self.owner if job["status"] == RUNNING else None),
+        )
+        return status if updated else None
+
+    async def advance(self, job):
+        """
+        Save the job's payload and move it to its next stage (or finish it)
+
+        Returns:
+            str: New status, None if the lease was lost
+        """
+        status = await self._run(self._advance, job)
+        if status is None:
+            self._lost(job, "stage result")
+        if status == DONE:
+            self.completed += 1
+        return status
+
+    def _retry(self, job, error):
+        now = time.time()
+        attempts = job["attempts"] + 1
+        if attempts >= POST_CALL_MAX_ATTEMPTS:
+            status, next_run_at = FAILED, now
+        else:
+            status = PENDING
+            next_run_at = now + min(POST_CALL_RETRY_MAX, POST_CALL_RETRY_BASE * (2 ** (attempts - 1)))
+        updated = self._execute(
+            "UPDATE jobs SET status = ?, attempts = ?, payload = ?, last_error = ?, "
+            "updated_at = ?, next_run_at = ?, claimed_by = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND claimed_by = ?",
+            (status, attempts, json.dumps(job["payload"]), str(error), now, next_run_at, job["id"], self.owner),
+        )
+        return status if updated else None
+
+    async def retry(self, job, error):
+        """Schedule the current stage again with backoff, or give up after max attempts"""
+        status = await self._run(self._retry, job, error)
+        if status is None:
+            self._lost(job, "retry")
+        if status == FAILED:
+            self.failed += 1
+        return status
+
+    # --- parked jobs (batch extraction) ---------------------------------
+
+    def _park(self, job):
+        return self._execute(
+            "UPDATE jobs SET status = ?, payload = ?, updated_at = ?, claimed_by = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND claimed_by = ?",
+            (BATCHED, json.dumps(job["payload"]), time.time(), job["id"], self.owner),
+        ) > 0
+
+    async def park(self, job):
+        """Take the job out of the worker rotation until complete_parked/release_parked"""
+        if not await self._run(self._park, job):
+            self._lost(job, "parking")
+
+    def _load(self, call_id, status=None):
+        sql, params = "SELECT * FROM jobs WHERE call_id = ?", (call_id,)
+        if status is not None:
+            sql, params = sql + " AND status = ?", (call_id, status)
+        rows = self._fetchall(sql, params)
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _complete_parked(self, call_id, payload_update):
+        job = self._load(call_id, BATCHED)
+        if job is None:
+            return None
+        job["payload"].update(payload_update)
+        return self._advance(job)
+
+    async def complete_parked(self, call_id, payload_update):
+        """
+        Finish the parked stage with an out-of-band result and move on
+
+        Returns:
+            str: New job status, None if the job was not parked
+        """
+        status = await self._run(self._complete_parked, call_id, payload_update)
+        if status == DONE:
+            self.completed += 1
+        if status is not None:
+            self.ready.set()
+        return status
+
+    def _requeue(self, call_id, stage, payload_update, only_status=None):
+        job = self._load(call_id, only_status)
+        if job is None:
+            return False
+        job["payload"].update(payload_update)
+        now = time.time()
+        # A job a live process still holds (stage running, call being monitored) is left to it;
+        # requeuing would run the stage twice or process a call that has not ended
+        return self._execute(
+            "UPDATE jobs SET stage = ?, status = ?, attempts = 0, payload = ?, last_error = NULL, "
+            "updated_at = ?, next_run_at = ?, claimed_by = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND status = ? AND NOT (status IN (?, ?) AND lease_expires_at >= ?)",
+            (stage or job["stage"], PENDING, json.dumps(job["payload"]), now, now, job["id"], job["status"],
+             RUNNING, WAITING, now),
+        ) > 0
+
+    async def release_parked(self, call_id, payload_update):
+        """Hand a parked job back to the workers at its current stage"""
+        released = await self._run(self._requeue, call_id, None, payload_update, BATCHED)
+        self.ready.set()
+        return released
+
+    async def requeue(self, call_id, stage, payload_update=None):
+        """
+        Run an existing job (e.g. a historical call) again from the given stage
+
+        Returns:
+            bool: False if there is no such job or a live process still holds it
+        """
+        requeued = await self._run(self._requeue, call_id, stage, payload_update or {})
+        self.ready.set()
+        return requeued
+
+    # --- startup / metrics ----------------------------------------------
+
+    def _resume(self):
+        now = time.time()
+        # Only jobs whose process is gone (lease expired or never set); live leases belong to another process
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, claimed_by = NULL, lease_expires_at = NULL, updated_at = ? "
+                    "WHERE status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                    (PENDING, now, RUNNING, now),
+                )
+                rows = self._conn.execute(
+                    "SELECT id, call_id, call_sid, caller_phone FROM jobs WHERE status = ? "
+                    "AND (claimed_by IS NULL OR lease_expires_at IS NULL OR lease_expires_at < ?)",
+                    (WAITING, now),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET claimed_by = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                    [(self.owner, now + self.lease_seconds, now, row["id"]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [{"call_id": row["call_id"], "call_sid": row["call_sid"], "caller_phone": row["caller_phone"]}
+                for row in rows]
+
+    async def resume(self):
+        """
+        Requeue jobs interrupted mid-stage by a restart (once their lease has expired)
+
+        Live calls whose monitoring process is gone are leased to this process.
+
+        Returns:
+            list: Jobs whose call was still live, so the caller can track them again
+        """
+        waiting = await self._run(self._resume)
+        self.ready.set()
+        return waiting
+
+    def _metrics(self):
+        now = time.time()
+        counts = {
+            row["status"]: row["n"]
+            for row in self._fetchall("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        }
+        oldest = self._fetchall(
+            "SELECT MIN(updated_at) AS t FROM jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+        )[0]["t"]
+        by_stage = {
+            row["stage"]: row["n"]
+            for row in self._fetchall(
+                "SELECT stage, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) GROUP BY stage", (PENDING, RUNNING)
+            )
+        }
+        return {
+            "depth": counts.get(PENDING, 0) + counts.get(RUNNING, 0),
+            "waiting_for_call_end": counts.get(WAITING, 0),
+            "parked_for_batch": counts.get(BATCHED, 0),
+            "by_status": counts,
+            "by_stage": by_stage,
+            "oldest_job_age_seconds": round(now - oldest, 1) if oldest else 0.0,
+            "completed_since_start": self.completed,
+            "failed_since_start": self.failed,
+            "leases_taken_over": self.leases_taken_over,
+            "leases_lost": self.leases_lost,
+        }
+
+    async def metrics(self):
+        return await self._run(self._metrics)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PostCallWorkerPool:
+    """Fixed number of workers draining a PostCallQueue"""
+
+    def __init__(self, queue, handlers, concurrency=POST_CALL_WORKERS, idle_poll=1.0):
+        """
+        Args:
+            queue (PostCallQueue): Job source
+            handlers (dict): stage name -> async callable(job) that fills job["payload"]
+            concurrency (int): Number of workers
+            idle_poll (float): Seconds between checks for delayed retries when idle
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.idle_poll = idle_poll
+        self.busy = 0
+        self._tasks = []
+
+    async def _heartbeat(self, job):
+        """Renew the job's lease while its stage runs"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                if not await self.queue.renew(job):
+                    return
+            except Exception as e:
+                print(f"⚠️ Could not renew lease on call {job['call_id']}: {e}")
+
+    async def _process(self, job):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._run_stage(job)
+        finally:
+            heartbeat.cancel()
+
+    async def _run_stage(self, job):
+        stage = job["stage"]
+        try:
+            await self.handlers[stage](job)
+        except JobParked as e:
+            await self.queue.park(job)
+            print(f"📦 Post-call stage '{stage}' for call {job['call_id']} parked: {e}")
+            return
+        except Exception as e:
+            status = await self.queue.retry(job, e)
+            print(f"⚠️ Post-call stage '{stage}' failed for call {job['call_id']} "
+                  f"(attempt {job['attempts'] + 1}, now {status}): {e}")
+            return
+        await self.queue.advance(job)
+
+    async def _worker(self, number):
+        while True:
+            job = await self.queue.claim()
+            if job is None:
+                self.queue.ready.clear()
+                try:
+                    await asyncio.wait_for(self.queue.ready.wait(), timeout=self.idle_poll)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.busy += 1
+            try:
+                await self._process(job)
+            finally:
+                self.busy -= 1
+
+    def start(self):
+        print(f"👷 Starting {self.concurrency} post-call workers")
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,188 @@
+"""
+Live transcript ingestion
+While a call is in progress its messages are pulled from
+/calls/{id}/messages every few seconds, resuming from a stored page cursor.
+The messages API only hands out a cursor past a page once the page is full,
+so live polling uses small pages (LIVE_TRANSCRIPT_PAGE_SIZE): a poll
+transfers the new messages plus at most one page's worth already held,
+instead of the whole call. A running rule-based extraction is kept
+up to date, and once the agent delivers the closing line a speculative full
+extraction starts, so the post-call stages usually find the transcript and
+its extraction ready within a second or two of hang-up.
+"""
+
+import os
+import re
+import time
+import asyncio
+from dotenv import load_dotenv
+
+from ultravox_transcript import fetch_message_page, format_messages
+from extraction import extract_contact_from_transcript
+from fast_extraction import fast_extract
+
+load_dotenv()
+
+LIVE_TRANSCRIPT_ENABLED = os.getenv("LIVE_TRANSCRIPT_ENABLED", "true").lower() == "true"
+LIVE_TRANSCRIPT_INTERVAL = float(os.getenv("LIVE_TRANSCRIPT_INTERVAL", "3"))
+# Messages per page while polling; the unfinished last page is fetched again on each poll
+LIVE_TRANSCRIPT_PAGE_SIZE = int(os.getenv("LIVE_TRANSCRIPT_PAGE_SIZE", "20"))
+# Live transcripts kept for calls whose post-processing has not picked them up yet
+LIVE_TRANSCRIPT_MAX = int(os.getenv("LIVE_TRANSCRIPT_MAX", "1000"))
+
+# Agent lines from the CLOSING block of ultravox_prompt.py: the call is about to end
+CLOSING_LINE = re.compile(
+    r"get back to you within 24 hours|Have a blessed day|Should I proceed to end the call", re.IGNORECASE
+)
+
+
+class LiveTranscript:
+    """Incrementally fetched transcript of one live call"""
+
+    def __init__(self, call_id, messages_url, client=None, page_size=LIVE_TRANSCRIPT_PAGE_SIZE):
+        """
+        Args:
+            call_id (str): Ultravox call ID
+            messages_url (str): /calls/{id}/messages endpoint
+            client (httpx.AsyncClient): Ultravox client, defaults to the shared one
+            page_size (int): Messages per page request
+        """
+        self.call_id = call_id
+        self.client = client
+        self.messages = []
+        # Cursor: the page we stopped on and how many of its messages we already have
+        self.page_url = messages_url
+        self.page_params = {"pageSize": page_size}
+        self.seen_on_page = 0
+        self.polls = 0
+        self.refetched = 0  # messages downloaded again from the unfinished last page
+        self.partial = None
+        self.confidence = None
+        self._speculative = None
+        self._speculative_upto = 0  # messages the speculative extraction saw
+        self._lock = asyncio.Lock()
+        self.updated_at = time.time()
+
+    def text(self):
+        return format_messages(self.messages)
+
+    async def poll(self):
+        """
+        Fetch messages added since the last poll
+
+        Returns:
+            int: Number of new messages
+        """
+        async with self._lock:
+            new = 0
+            while True:
+                results, next_url = await fetch_message_page(self.page_url, self.page_params, self.client)
+                fresh = results[self.seen_on_page:]
+                self.messages.extend(fresh)
+                new += len(fresh)
+                self.refetched += len(results) - len(fresh)
+
+                if not next_url:
+                    # Stay on this page; later polls pick up messages appended to it
+                    self.seen_on_page = len(results)
+                    break
+                # The next URL already carries the cursor and page size
+                self.page_url, self.page_params, self.seen_on_page = next_url, None, 0
+
+            self.polls += 1
+            if new:
+                self.updated_at = time.time()
+                self._update_partial(self.messages[-new:])
+            return new
+
+    def _update_partial(self, fresh):
+        text = self.text()
+        self.partial, self.confidence = fast_extract(text)
+        closing = any(
+            message.role == "MESSAGE_ROLE_AGENT" and CLOSING_LINE.search(message.text or "")
+            for message in fresh
+        )
+        if closing:
+            self._start_speculative(text)
+
+    def _caller_spoke_since(self, index):
+        return any(message.role == "MESSAGE_ROLE_USER" for message in self.messages[index:])
+
+    def _start_speculative(self, text):
+        """Extract now; after the closing line only agent/tool messages normally follow"""
+        if self._speculative is not None and not self._caller_spoke_since(self._speculative_upto):
+            return
+        print(f"🔮 Closing line heard on call {self.call_id} - extracting ahead of hang-up")
+        self.cancel_speculative()
+        self._speculative_upto = len(self.messages)
+        self._speculative = asyncio.create_task(extract_contact_from_transcript(text))
+
+    async def speculative_result(self):
+        """
+        Result of the speculative extraction, if the caller said nothing after it started
+
+        Returns:
+            dict: Contact info, None if there is no usable speculative result
+        """
+        if self._speculative is None or self._caller_spoke_since(self._speculative_upto):
+            self.cancel_speculative()
+            return None
+        return await self._speculative
+
+    async def run(self, interval=LIVE_TRANSCRIPT_INTERVAL):
+        """Poll until cancelled (the monitor cancels this when the call ends)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Live transcript poll failed for call {self.call_id}: {e}")
+
+    def cancel_speculative(self):
+        if self._speculative is not None and not self._speculative.done():
+            self._speculative.cancel()
+
+
+class LiveTranscriptRegistry:
+    """Live transcripts by call ID until the post-call stages consume them"""
+
+    def __init__(self, max_entries=LIVE_TRANSCRIPT_MAX):
+        self.max_entries = max_entries
+        self._transcripts = {}
+        self.fetched_at_hangup = 0
+        self.speculative_hits = 0
+        self.polls = 0
+        self.refetched = 0
+
+    def add(self, live):
+        self._transcripts[live.call_id] = live
+        while len(self._transcripts) > self.max_entries:
+            oldest = min(self._transcripts.values(), key=lambda item: item.updated_at)
+            self.pop(oldest.call_id).cancel_speculative()
+
+    def get(self, call_id):
+        return self._transcripts.get(call_id)
+
+    def pop(self, call_id):
+        live = self._transcripts.pop(call_id, None)
+        if live is not None:
+            self.polls += live.polls
+            self.refetched += live.refetched
+        return live
+
+    def snapshot(self):
+        return {
+            "enabled": LIVE_TRANSCRIPT_ENABLED,
+            "live_transcripts": len(self._transcripts),
+            "messages_held": sum(len(live.messages) for live in self._transcripts.values()),
+            "messages_fetched_at_hangup": self.fetched_at_hangup,
+            "polls": self.polls + sum(live.polls for live in self._transcripts.values()),
+            "messages_refetched": self.refetched + sum(live.refetched for live in self._transcripts.values()),
+            "speculative_hits": self.speculative_hits,
+        }
+
+
+# Process-wide registry shared by the call monitor and the post-call stages
+live_transcripts = LiveTranscriptRegistry()
@@ -1,5 +1,8 @@
 import os
+import copy
+import json
 import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -11,19 +14,124 @@ from dotenv import load_dotenv
 from functions import (
     get_single_flow_prompt,
     create_ultravox_call,
-    monitor_single_flow_call
+    get_call_status,
+    monitor_single_flow_call,
+    POST_CALL_STAGES
 )
+from ultravox_client import create_ultravox_client, set_ultravox_client, get_pool_metrics
+from call_sessions import call_sessions
+from call_events import call_tracker, verify_ultravox_signature, handle_ultravox_event, webhook_verification_warning
+from poll_scheduler import CallPollScheduler
+from job_queue import PostCallQueue, PostCallWorkerPool
+from batch_extraction import BatchExtractor, set_batch_extractor
+from extraction import extraction_cache
+from fast_extraction import fast_path_metrics
+from transcript_compaction import compaction_metrics, preload_tokenizer
+from model_router import router_metrics
+from openai_scheduler import openai_scheduler
+from department_classifier import get_department_classifier
+from call_store import CallStore, CallRecordWriter, set_call_store
+from google_sheet import SheetsWriter, set_sheets_writer
+from sheets_outbox import SheetsOutbox
+from google_credentials import credential_manager
+from live_transcript import live_transcripts
+from transfer_engine import notify_call_status, TRANSFER_STATUS_CALLBACK_URL
+from twilio_client import create_twilio_client, set_twilio_client, close_twilio_client, twilio_metrics
+from twilio.request_validator import RequestValidator
 
 load_dotenv()
 
-# Global dictionary to track active calls
-call_mapping = {}  # Maps Ultravox call ID to Twilio Call SID
-
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = os.getenv("PORT", "8000")
+TWILIO_VALIDATE_SIGNATURES = os.getenv("TWILIO_VALIDATE_SIGNATURES", "true").lower() == "true"
+
+async def watch_live_calls(queue, poll_scheduler):
+    """
+    Keep the leases on this process's live calls and monitor those whose process is gone
+
+    The first pass resumes calls that were live when the previous process stopped.
+    """
+    while True:
+        try:
+            for job in await queue.resume():
+                print(f"♻️ Resuming monitoring for call {job['call_id']}")
+                poll_scheduler.track(job["call_id"])
+                asyncio.create_task(monitor_single_flow_call(
+                    job["call_id"], job["caller_phone"], job["call_sid"], queue
+                ))
+            await asyncio.sleep(queue.lease_seconds / 3)
+            await queue.renew_waiting()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Live call lease error: {e}")
+            await asyncio.sleep(queue.lease_seconds / 3)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the shared clients, the call poll scheduler and the post-call workers"""
+    webhook_warning = webhook_verification_warning()
+    if webhook_warning:
+        print(webhook_warning)
+    twilio_client = create_twilio_client()
+    set_twilio_client(twilio_client)
+    async with create_ultravox_client() as ultravox_client:
+        app.state.ultravox_client = ultravox_client
+        set_ultravox_client(ultravox_client)
+        print("🌐 Shared Ultravox HTTP client ready")
+        poll_scheduler = CallPollScheduler(lambda call_id: get_call_status(call_id, client=ultravox_client))
+        app.state.poll_scheduler = poll_scheduler
+        scheduler_task = asyncio.create_task(poll_scheduler.run())
+
+        call_store = CallStore()
+        app.state.call_store = call_store
+        set_call_store(call_store)
+        call_record_writer = CallRecordWriter(call_store)
+        call_record_writer.start()
+        credential_manager.start()
+        await preload_tokenizer()
+        sheets_outbox = SheetsOutbox()
+        sheets_writer = SheetsWriter(sheets_outbox)
+        app.state.sheets_writer = sheets_writer
+        set_sheets_writer(sheets_writer)
+        sheets_writer.start()
+        post_call_queue = PostCallQueue(POST_CALL_STAGES)
+        app.state.post_call_queue = post_call_queue
+        batch_extractor = BatchExtractor(post_call_queue)
+        app.state.batch_extractor = batch_extractor
+        set_batch_extractor(batch_extractor)
+        batch_task = asyncio.create_task(batch_extractor.run())
+        worker_pool = PostCallWorkerPool(post_call_queue, POST_CALL_STAGES)
+        worker_pool.start()
+
+        # Resume calls whose process stopped, and keep this process's live calls leased
+        watch_task = asyncio.create_task(watch_live_calls(post_call_queue, poll_scheduler))
+        try:
+            yield
+        finally:
+            watch_task.cancel()
+            await post_call_queue.release_waiting()
+            await worker_pool.stop()
+            batch_task.cancel()
+            set_batch_extractor(None)
+            batch_extractor.close()
+            post_call_queue.close()
+            await sheets_writer.stop()
+            set_sheets_writer(None)
+            sheets_outbox.close()
+            await credential_manager.stop()
+            await call_record_writer.stop()
+            set_call_store(None)
+            call_store.close()
+            extraction_cache.close()
+            scheduler_task.cancel()
+            set_ultravox_client(None)
+            set_twilio_client(None)
+            await close_twilio_client(twilio_client)
+            print("🌐 Shared Ultravox and Twilio clients closed")
 
 # Initialize FastAPI app
-app = FastAPI(title="Inbound Calling System", description="AI-powered inbound call management system")
+app = FastAPI(title="Inbound Calling System", description="AI-powered inbound call management system", lifespan=lifespan)
 
 origins = ["*"]
 
@@ -94,22 +202,34 @@ async def incoming_call(request: Request):
         #twiml.say("Connecting you to our AI assistant.")
         
         # Create Ultravox call configuration with single flow prompt
-        call_config = ULTRAVOX_CALL_CONFIG.copy()
+        call_config = copy.deepcopy(ULTRAVOX_CALL_CONFIG)
         call_config['systemPrompt'] = get_single_flow_prompt(caller_phone)
+
+        # Pin this caller's Call SID on the transfer tool so /api/transfer knows which call it is
+        if call_sid:
+            for tool in call_config["selectedTools"]:
+                if tool["toolName"] == "transferCall":
+                    tool.setdefault("parameterOverrides", {})["callSid"] = call_sid
         
         try:
-            response = await create_ultravox_call(call_config)
+            ultravox_client = request.app.state.ultravox_client
+            response = await create_ultravox_call(call_config, client=ultravox_client)
             join_url = response.get('joinUrl')
             call_id = response.get('callId')
             
             print(f"Created single flow Ultravox call {call_id}")
             
-            # Store mapping: Ultravox Call ID → Twilio Call SID
-            call_mapping[call_id] = call_sid
-            print(f"📝 Stored call mapping: {call_id} → {call_sid}")
+            # Register the session: Ultravox Call ID ↔ Twilio Call SID
+            call_sessions.add(call_id, call_sid, caller_phone)
+            print(f"📝 Stored call session: {call_id} → {call_sid}")
+
+            # Track the call so the call.ended webhook (or the poll scheduler) can wake its monitor
+            request.app.state.poll_scheduler.track(call_id)
             
-            # Start monitoring task for complete conversation
-            asyncio.create_task(monitor_single_flow_call(call_id, caller_phone, call_sid))
+            # Persist the post-call job first, then wait for the call to end
+            post_call_queue = request.app.state.post_call_queue
+            await post_call_queue.enqueue(call_id, call_sid, caller_phone)
+            asyncio.create_task(monitor_single_flow_call(call_id, caller_phone, call_sid, post_call_queue))
             
             # Connect to Ultravox using proper TwiML
             connect = twiml.connect()
@@ -132,6 +252,52 @@ async def incoming_call(request: Request):
 def health_check():
     return {"status": "healthy", "service": "Inbound Calling System"}
 
+# Runtime metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    return {
+        "ultravox_http": get_pool_metrics(app.state.ultravox_client),
+        "call_events": call_tracker.snapshot(),
+        "ultravox_polling": app.state.poll_scheduler.snapshot(),
+        "twilio": twilio_metrics.snapshot(),
+        "call_sessions": call_sessions.snapshot(),
+        "post_call_queue": await app.state.post_call_queue.metrics(),
+        "call_store": await app.state.call_store.snapshot(),
+        "google_sheets": await app.state.sheets_writer.snapshot(),
+        "google_credentials": credential_manager.snapshot(),
+        "batch_extraction": await app.state.batch_extractor.snapshot(),
+        "extraction_cache": await extraction_cache.snapshot(),
+        "extraction_fast_path": fast_path_metrics.snapshot(),
+        "transcript_compaction": compaction_metrics.snapshot(),
+        "extraction_router": router_metrics.snapshot(),
+        "openai_scheduler": openai_scheduler.snapshot(),
+        "department_classifier": get_department_classifier().snapshot(),
+        "live_transcripts": live_transcripts.snapshot(),
+    }
+
+# Ultravox webhook receiver (configure the call.ended event to point here)
+@app.post("/api/ultravox/events")
+async def ultravox_events(request: Request):
+    """Wake the post-call pipeline as soon as Ultravox reports a call ended"""
+    body = await request.body()
+    if not verify_ultravox_signature(
+        body,
+        request.headers.get("X-Ultravox-Webhook-Timestamp"),
+        request.headers.get("X-Ultravox-Webhook-Signature"),
+    ):
+        print("⚠️ Rejected Ultravox webhook with invalid signature")
+        return JSONResponse(status_code=401, content={"status": "invalid signature"})
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"status": "invalid json"})
+    if not isinstance(payload, dict):
+        return JSONResponse(status_code=400, content={"status": "expected a json object"})
+
+    handled = handle_ultravox_event(payload)
+    return {"status": "ok", "handled": handled}
+
 # Transfer call endpoint for Ultravox tool calls
 @app.post("/api/transfer")
 async def transfer_call(request: Request):
@@ -144,6 +310,7 @@ async def transfer_call(request: Request):
         
         data = await request.json()
         received_call_sid = data.get("callSid")
+        received_call_id = data.get("callId")
         destination_number = data.get("destinationNumber")
         transfer_reason = data.get("transferReason", "Caller requested transfer")
         
@@ -152,13 +319,18 @@ async def transfer_call(request: Request):
         # Handle placeholder call_sid by finding the real Twilio Call SID
         real_call_sid = None
         if received_call_sid == "active_call_sid" or not received_call_sid:
-            # Try to find the real Call SID from our mapping
-            # Since we don't have the Ultravox call ID here, we'll use the most recent one
-            if call_mapping:
-                real_call_sid = list(call_mapping.values())[-1]  # Get the most recent
+            # Prefer the Ultravox call ID when the tool sends one; otherwise fall back
+            # to the most recent active call (ambiguous if several calls overlap)
+            session = call_sessions.get(received_call_id) if received_call_id else None
+            if session is None:
+                session = call_sessions.latest_active()
+                if session is not None and call_sessions.active_count() > 1:
+                    print(f"⚠️ {call_sessions.active_count()} active calls - guessing most recent for transfer")
+            if session is not None:
+                real_call_sid = session.call_sid
                 print(f"🔍 Found real Call SID: {real_call_sid}")
             else:
-                print("⚠️ No call mapping found, cannot transfer")
+                print("⚠️ No active call session found, cannot transfer")
                 return {"error": "Cannot transfer: No active call found", "status": "failed"}
         else:
             real_call_sid = received_call_sid
@@ -179,7 +351,7 @@ async def transfer_call(request: Request):
         
         # Store transfer result for later use in monitoring
         from functions import store_transfer_status
-        store_transfer_status(real_call_sid, result.get("status", "failed"))
+        await store_transfer_status(real_call_sid, result.get("status", "failed"), request.app.state.post_call_queue)
         
         print(f"🔄 Transfer request: {transfer_reason}")
         print(f"📞 Using real Call SID: {real_call_sid}")
@@ -193,6 +365,27 @@ async def transfer_call(request: Request):
         return {"status": "failed", "message": f"Transfer endpoint error: {str(e)}"}
 
 
+# Twilio status callbacks for management transfer legs
+@app.post("/api/transfer/status")
+async def transfer_status_callback(request: Request):
+    """Resolve the waiting transfer as soon as Twilio reports the leg was answered or ended"""
+    form_data = await request.form()
+    params = dict(form_data)
+
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    if TWILIO_VALIDATE_SIGNATURES and auth_token and TRANSFER_STATUS_CALLBACK_URL:
+        validator = RequestValidator(auth_token)
+        if not validator.validate(TRANSFER_STATUS_CALLBACK_URL, params, request.headers.get("X-Twilio-Signature", "")):
+            print("⚠️ Rejected Twilio status callback with invalid signature")
+            return JSONResponse(status_code=403, content={"status": "invalid signature"})
+
+    call_sid = params.get("CallSid", "")
+    call_status = params.get("CallStatus", "")
+    print(f"📨 Twilio status callback: {call_sid} → {call_status}")
+    handled = notify_call_status(call_sid, call_status)
+    return {"status": "ok", "handled": handled}
+
+
 @app.get("/api/pause")
 async def pause_endpoint(seconds: int = 20):
     """Simple pause endpoint for Ultravox tools"""
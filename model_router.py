@@ -0,0 +1,261 @@
+"""
+Model tiering for contact extraction
+Short calls where the rules already settled most fields go to the cheapest
+model; everything else starts on EXTRACTION_MODEL. An answer that breaks the
+JSON schema, or that disagrees with what the script's confirmations show, is
+escalated to the next (stronger) tier, at most EXTRACTION_MAX_ESCALATIONS
+tiers above the starting one. Latency, token cost and escalations are
+tracked per tier and served at /metrics.
+"""
+
+import os
+import re
+from dotenv import load_dotenv
+
+from fast_extraction import FIELDS, EXTRACTION_FAST_PATH_THRESHOLD
+
+load_dotenv()
+
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "gpt-4o-mini")
+# Cheap tier for short/simple calls and the stronger tier answers are escalated to (empty disables a tier)
+EXTRACTION_SIMPLE_MODEL = os.getenv("EXTRACTION_SIMPLE_MODEL", "gpt-4.1-nano")
+EXTRACTION_ESCALATION_MODEL = os.getenv("EXTRACTION_ESCALATION_MODEL", "gpt-4o")
+# A call is "simple" when its prompt transcript is this short and at most this many fields are left for the LLM
+EXTRACTION_SIMPLE_MAX_TOKENS = int(os.getenv("EXTRACTION_SIMPLE_MAX_TOKENS", "1500"))
+EXTRACTION_SIMPLE_MAX_FIELDS = int(os.getenv("EXTRACTION_SIMPLE_MAX_FIELDS", "3"))
+# Answers scoring below this are re-asked on the next tier
+EXTRACTION_ESCALATION_CONFIDENCE = float(os.getenv("EXTRACTION_ESCALATION_CONFIDENCE", "0.75"))
+# Tiers above the starting one a request may climb (errors and schema failures included)
+EXTRACTION_MAX_ESCALATIONS = int(os.getenv("EXTRACTION_MAX_ESCALATIONS", "1"))
+EXTRACTION_STRUCTURED_OUTPUTS = os.getenv("EXTRACTION_STRUCTURED_OUTPUTS", "true").lower() == "true"
+
+MODEL_TIERS = list(dict.fromkeys(
+    model for model in (EXTRACTION_SIMPLE_MODEL, EXTRACTION_MODEL, EXTRACTION_ESCALATION_MODEL) if model
+))
+
+# USD per 1M (input, output) tokens, for the cost estimate in /metrics
+MODEL_PRICES = {
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Department decides the worksheet and follow-up, so a wrong one weighs double
+CONFIDENCE_WEIGHTS = {"department": 2.0}
+
+DEPARTMENTS = ["viva", "casting", "press", "support", "sales", "management", "voicemail"]
+DELIVERY_OPTIONS = ["Sms", "Email", "Both"]
+EMAIL_SHAPE = re.compile(r"[^@\s]+@[^@\s]+\.[A-Za-z]{2,}")
+
+FIELD_SCHEMAS = {
+    "name": {"type": "string"},
+    "email": {"type": "string"},
+    "organization": {"type": "string"},
+    "department": {"type": "string", "enum": DEPARTMENTS},
+    "purpose": {"type": "string"},
+    "summary": {"type": "string"},
+    "delivery_preference": {
+        "type": "array",
+        "items": {"type": "string", "enum": DELIVERY_OPTIONS},
+    },
+}
+
+
+def extraction_response_format(fields=None):
+    """
+    Structured-outputs response_format restricted to the requested fields
+
+    Returns:
+        dict: json_schema response_format, None when structured outputs are off
+    """
+    if not EXTRACTION_STRUCTURED_OUTPUTS:
+        return None
+    fields = list(fields or FIELDS)
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "contact_info",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {field: FIELD_SCHEMAS[field] for field in fields},
+                "required": fields,
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def schema_errors(info, fields):
+    """
+    Problems with a parsed answer, checked against FIELD_SCHEMAS
+
+    Returns:
+        list: Human-readable errors, empty when the answer is valid
+    """
+    if not isinstance(info, dict):
+        return [f"answer is {type(info).__name__}, not an object"]
+    errors = []
+    for field in fields:
+        if field not in info:
+            errors.append(f"missing {field}")
+            continue
+        value = info[field]
+        if field == "delivery_preference":
+            if not isinstance(value, list) or len(value) != 1 or value[0] not in DELIVERY_OPTIONS:
+                errors.append(f"delivery_preference {value!r}")
+        elif not isinstance(value, str):
+            errors.append(f"{field} is {type(value).__name__}")
+        elif field == "department" and value not in DEPARTMENTS:
+            errors.append(f"department {value!r}")
+        elif field == "email" and value and not EMAIL_SHAPE.fullmatch(value):
+            errors.append(f"email {value!r}")
+    return errors
+
+
+def _same(a, b):
+    if isinstance(a, list) or isinstance(b, list):
+        return a == b
+    return str(a or "").strip().lower() == str(b or "").strip().lower()
+
+
+def answer_confidence(info, fields, rules, rule_confidence):
+    """
+    How well the LLM's answer agrees with the script's confirmations
+
+    A field counts against the answer when the rules found a confident value
+    that the model contradicts, or when the model left name/purpose empty
+    although the transcript holds one (the agent confirmed a name or purpose,
+    however unsure the rules are about it). Rule values include the local
+    department classifier's label when it was confident.
+
+    Args:
+        info (dict): Parsed model answer
+        fields (list): Fields the model was asked for
+        rules, rule_confidence: fast_extract output for the same transcript
+
+    Returns:
+        float: 0.0..1.0
+    """
+    checked = [field for field in fields if field != "summary"]
+    if not checked:
+        return 1.0
+    doubts = 0.0
+    for field in checked:
+        if rule_confidence.get(field, 0.0) >= EXTRACTION_FAST_PATH_THRESHOLD and rules.get(field) \
+                and not _same(info.get(field), rules[field]):
+            doubts += CONFIDENCE_WEIGHTS.get(field, 1.0)
+        elif field in ("name", "purpose") and rules.get(field) and not info.get(field):
+            doubts += CONFIDENCE_WEIGHTS.get(field, 1.0)
+    total = sum(CONFIDENCE_WEIGHTS.get(field, 1.0) for field in checked)
+    return round(max(0.0, 1 - doubts / total), 3)
+
+
+def starting_tier(transcript_tokens, llm_fields, tiers=None):
+    """
+    Index of the tier a request starts on
+
+    Returns:
+        int: 0 for short calls with few open fields, else the EXTRACTION_MODEL tier
+    """
+    tiers = tiers or MODEL_TIERS
+    if transcript_tokens <= EXTRACTION_SIMPLE_MAX_TOKENS and len(llm_fields) <= EXTRACTION_SIMPLE_MAX_FIELDS:
+        return 0
+    return tiers.index(EXTRACTION_MODEL) if EXTRACTION_MODEL in tiers else 0
+
+
+def last_tier(first, tiers=None, max_escalations=EXTRACTION_MAX_ESCALATIONS):
+    """Index one past the last tier a request starting on `first` may be escalated to"""
+    tiers = tiers or MODEL_TIERS
+    return min(len(tiers), first + 1 + max(0, max_escalations))
+
+
+def request_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of one request (0.0 for models without a price)"""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class TierStats:
+    def __init__(self):
+        self.started = 0
+        self.requests = 0
+        self.errors = 0
+        self.schema_failures = 0
+        self.low_confidence = 0
+        self.escalations = 0
+        self.accepted = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+
+class RouterMetrics:
+    """Per-tier latency, cost and escalation counts"""
+
+    def __init__(self, tiers=None):
+        self.tiers = {model: TierStats() for model in (tiers or MODEL_TIERS)}
+        self.rules_fallbacks = 0
+
+    def _tier(self, model):
+        return self.tiers.setdefault(model, TierStats())
+
+    def started(self, model):
+        self._tier(model).started += 1
+
+    def record_request(self, model, seconds, prompt_tokens=0, completion_tokens=0):
+        stats = self._tier(model)
+        stats.requests += 1
+        stats.latency_seconds += seconds
+        stats.max_latency_seconds = max(stats.max_latency_seconds, seconds)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        stats.cost += request_cost(model, prompt_tokens, completion_tokens)
+
+    def record_outcome(self, model, outcome, escalated):
+        """outcome: accepted, error, schema or low_confidence"""
+        stats = self._tier(model)
+        if outcome == "accepted":
+            stats.accepted += 1
+        elif outcome == "error":
+            stats.errors += 1
+        elif outcome == "schema":
+            stats.schema_failures += 1
+        else:
+            stats.low_confidence += 1
+        if escalated:
+            stats.escalations += 1
+
+    def snapshot(self):
+        tiers = {}
+        for model, stats in self.tiers.items():
+            requests = stats.requests
+            tiers[model] = {
+                "started": stats.started,
+                "requests": requests,
+                "accepted": stats.accepted,
+                "errors": stats.errors,
+                "schema_failures": stats.schema_failures,
+                "low_confidence": stats.low_confidence,
+                "escalations": stats.escalations,
+                "escalation_rate": round(stats.escalations / requests, 3) if requests else 0.0,
+                "avg_latency_ms": round(stats.latency_seconds / requests * 1000, 1) if requests else 0.0,
+                "max_latency_ms": round(stats.max_latency_seconds * 1000, 1),
+                "prompt_tokens": stats.prompt_tokens,
+                "completion_tokens": stats.completion_tokens,
+                "cost_usd": round(stats.cost, 6),
+                "avg_cost_usd": round(stats.cost / requests, 6) if requests else 0.0,
+            }
+        return {
+            "tiers": tiers,
+            "structured_outputs": EXTRACTION_STRUCTURED_OUTPUTS,
+            "escalation_confidence": EXTRACTION_ESCALATION_CONFIDENCE,
+            "rules_fallbacks": self.rules_fallbacks,
+        }
+
+
+router_metrics = RouterMetrics()
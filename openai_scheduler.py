@@ -0,0 +1,270 @@
+"""
+Rate-limit-aware OpenAI request scheduler
+Every extraction request first takes one request and its estimated tokens
+from per-model token buckets sized to the account's RPM/TPM limits, so a burst
+of calls ending together waits in line instead of failing on 429s. The
+x-ratelimit-* headers of each response resize and resync the buckets, and a
+429 that survives the SDK's own retries pauses the model until the reset time
+before the request is tried again. Time spent waiting is reported at /metrics.
+"""
+
+import os
+import re
+import time
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Starting limits per model until the response headers report the real ones
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+# 429s (after the SDK's retries) waited out before the request is given up
+OPENAI_RATE_LIMIT_RETRIES = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "5"))
+# Pause after a 429 that carries no reset/retry-after header
+OPENAI_RATE_LIMIT_PAUSE = float(os.getenv("OPENAI_RATE_LIMIT_PAUSE", "2"))
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value):
+    """
+    Seconds in an x-ratelimit-reset-* value ("1s", "6m0s", "20ms")
+
+    Returns:
+        float: Seconds, None if the value cannot be read
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _int_header(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Continuously refilling budget of `capacity` units per minute"""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    @property
+    def rate(self):
+        return self.capacity / self.period
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)"""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def sync(self, limit=None, remaining=None, reset=None, now=None):
+        """Adopt the limit and remaining budget the API reported"""
+        now = now or time.monotonic()
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+            if remaining <= 0 and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def pause(self, seconds, now=None):
+        now = now or time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class ModelLimiter:
+    """Request and token buckets for one model, admitting waiters in arrival order"""
+
+    def __init__(self, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+
+class RateLimitScheduler:
+    """Per-model RPM/TPM admission for OpenAI requests"""
+
+    def __init__(self, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT, max_rate_limit_retries=OPENAI_RATE_LIMIT_RETRIES):
+        """
+        Args:
+            rpm (int): Requests per minute per model until headers say otherwise
+            tpm (int): Tokens per minute per model until headers say otherwise
+            max_rate_limit_retries (int): 429 responses waited out per request
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self._limiters = {}
+        self.waiting = 0
+        self.admitted = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.rate_limited = 0
+        self.gave_up = 0
+        self.header_syncs = 0
+
+    def limiter(self, model):
+        if model not in self._limiters:
+            self._limiters[model] = ModelLimiter(self.rpm, self.tpm)
+        return self._limiters[model]
+
+    async def _admit(self, model, tokens):
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await self.limiter(model).acquire(tokens)
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited >= 0.001:
+            self.delayed += 1
+
+    def observe(self, model, headers):
+        """Resync the model's buckets from x-ratelimit-* response headers"""
+        if not headers:
+            return
+        limiter = self.limiter(model)
+        request_limit = _int_header(headers, "x-ratelimit-limit-requests")
+        token_limit = _int_header(headers, "x-ratelimit-limit-tokens")
+        if request_limit is None and token_limit is None:
+            return
+        limiter.requests.sync(
+            request_limit,
+            _int_header(headers, "x-ratelimit-remaining-requests"),
+            parse_reset(headers.get("x-ratelimit-reset-requests")),
+        )
+        limiter.tokens.sync(
+            token_limit,
+            _int_header(headers, "x-ratelimit-remaining-tokens"),
+            parse_reset(headers.get("x-ratelimit-reset-tokens")),
+        )
+        self.header_syncs += 1
+
+    def _rate_limited(self, model, error):
+        """Pause the model after a 429 until the reset time the API gave"""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        self.observe(model, headers)
+        pause = (
+            parse_reset(headers.get("retry-after"))
+            or parse_reset(headers.get("x-ratelimit-reset-tokens"))
+            or parse_reset(headers.get("x-ratelimit-reset-requests"))
+            or OPENAI_RATE_LIMIT_PAUSE
+        )
+        limiter = self.limiter(model)
+        limiter.requests.pause(pause)
+        limiter.tokens.pause(pause)
+        self.rate_limited += 1
+        print(f"🚦 OpenAI rate limit on {model} - pausing {pause:.1f}s")
+
+    async def run(self, model, estimated_tokens, request):
+        """
+        Run one OpenAI request once the model has budget for it
+
+        Args:
+            model (str): Model the request goes to (limits are per model)
+            estimated_tokens (int): Prompt tokens plus the expected completion
+            request: Zero-argument callable returning the awaitable; raw
+                responses (with_raw_response) have their headers read and are parsed
+
+        Returns:
+            The (parsed) response
+
+        Raises:
+            Exception: Non-429 errors immediately, a 429 after max_rate_limit_retries
+        """
+        attempt = 0
+        while True:
+            await self._admit(model, estimated_tokens)
+            try:
+                response = await request()
+            except Exception as e:
+                if getattr(e, "status_code", None) != 429:
+                    raise
+                self._rate_limited(model, e)
+                attempt += 1
+                if attempt > self.max_rate_limit_retries:
+                    self.gave_up += 1
+                    raise
+                continue
+
+            if hasattr(response, "parse"):
+                self.observe(model, response.headers)
+                response = response.parse()
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                # Settle the estimate against what was actually used
+                self.limiter(model).tokens.take(usage.total_tokens - estimated_tokens)
+            return response
+
+    def snapshot(self):
+        now = time.monotonic()
+        models = {}
+        for model, limiter in self._limiters.items():
+            limiter.requests._refill(now)
+            limiter.tokens._refill(now)
+            models[model] = {
+                "rpm_limit": int(limiter.requests.capacity),
+                "tpm_limit": int(limiter.tokens.capacity),
+                "requests_available": round(limiter.requests.level, 1),
+                "tokens_available": round(limiter.tokens.level),
+                "paused_for_s": round(max(0.0, limiter.tokens.paused_until - now), 1),
+            }
+        return {
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "delayed": self.delayed,
+            "avg_queue_wait_ms": round(self.wait_seconds / self.admitted * 1000, 1) if self.admitted else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_seconds * 1000, 1),
+            "rate_limited": self.rate_limited,
+            "gave_up": self.gave_up,
+            "header_syncs": self.header_syncs,
+            "models": models,
+        }
+
+
+# Process-wide scheduler shared by every extraction request
+openai_scheduler = RateLimitScheduler()
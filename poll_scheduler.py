@@ -0,0 +1,199 @@
+"""
+Centralized poll scheduler for active Ultravox calls
+One task owns every live call ID and polls GET /calls/{id} with adaptive
+intervals and bounded concurrency, replacing one sleeping coroutine per call.
+"""
+
+import os
+import time
+import heapq
+import random
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+
+from call_events import call_tracker, ULTRAVOX_SWEEP_INTERVAL
+
+load_dotenv()
+
+# Backoff between polls while the call is far from its expected end (seconds)
+POLL_BASE_INTERVAL = float(os.getenv("ULTRAVOX_POLL_BASE_INTERVAL", "5"))
+POLL_MAX_INTERVAL = float(os.getenv("ULTRAVOX_POLL_MAX_INTERVAL", "60"))
+# Interval used inside the window around the expected call end (seconds)
+POLL_FAST_INTERVAL = float(os.getenv("ULTRAVOX_POLL_FAST_INTERVAL", "2"))
+POLL_FAST_WINDOW = float(os.getenv("ULTRAVOX_POLL_FAST_WINDOW", "45"))
+# Expected call length until enough real calls have been observed (seconds)
+EXPECTED_CALL_SECONDS = float(os.getenv("ULTRAVOX_EXPECTED_CALL_SECONDS", "180"))
+POLL_CONCURRENCY = int(os.getenv("ULTRAVOX_POLL_CONCURRENCY", "10"))
+# A call whose status poll fails this many times in a row (or returns 404) is given up
+POLL_MAX_FAILURES = int(os.getenv("ULTRAVOX_POLL_MAX_FAILURES", "5"))
+# When the call.ended webhook is configured, polling only sweeps missed events
+WEBHOOKS_ENABLED = os.getenv("ULTRAVOX_WEBHOOKS_ENABLED", "true").lower() == "true"
+
+RATE_WINDOW = 60.0
+
+
+class CallPollScheduler:
+    """Polls every tracked call from a single task"""
+
+    def __init__(self, fetch_call, webhooks_enabled=WEBHOOKS_ENABLED, concurrency=POLL_CONCURRENCY,
+                 max_failures=POLL_MAX_FAILURES):
+        """
+        Args:
+            fetch_call: async callable(call_id) -> Ultravox call record
+            webhooks_enabled (bool): Poll only as a slow sweeper for missed events
+            concurrency (int): Maximum polls in flight at once
+            max_failures (int): Consecutive failed polls before a call is given up
+        """
+        self.fetch_call = fetch_call
+        self.webhooks_enabled = webhooks_enabled
+        self.max_failures = max_failures
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._calls = {}  # call_id -> {"started_at", "attempts", "next_poll_at"}
+        self._heap = []  # (next_poll_at, call_id), stale entries skipped lazily
+        self._wakeup = asyncio.Event()
+        self._in_flight = set()
+        self._poll_times = deque()
+        self._durations = deque(maxlen=50)
+        self.total_polls = 0
+        self.failed_polls = 0
+        self.dropped_calls = 0
+
+    # --- tracking -------------------------------------------------------
+
+    def track(self, call_id):
+        """Start polling a call; it is dropped as soon as its end is known"""
+        if call_id in self._calls:
+            return
+        now = time.time()
+        self._calls[call_id] = {"started_at": now, "attempts": 0, "failures": 0, "next_poll_at": 0.0}
+        self._schedule(call_id, now)
+        call_tracker.register(call_id).add_done_callback(lambda _: self.untrack(call_id))
+
+    def untrack(self, call_id):
+        entry = self._calls.pop(call_id, None)
+        if entry is not None:
+            self._durations.append(time.time() - entry["started_at"])
+
+    def expected_call_seconds(self):
+        """Median duration of recently completed calls"""
+        if len(self._durations) < 5:
+            return EXPECTED_CALL_SECONDS
+        ordered = sorted(self._durations)
+        return ordered[len(ordered) // 2]
+
+    # --- scheduling -----------------------------------------------------
+
+    def next_interval(self, entry, now):
+        """
+        Seconds until the next poll of a call
+
+        Webhook mode: a flat sweep interval. Otherwise: fast polling inside
+        the window around the expected end, exponential backoff with jitter
+        elsewhere, never overshooting the start of the fast window.
+        """
+        if self.webhooks_enabled:
+            return ULTRAVOX_SWEEP_INTERVAL
+
+        elapsed = now - entry["started_at"]
+        window_start = self.expected_call_seconds() - POLL_FAST_WINDOW
+        window_end = window_start + 2 * POLL_FAST_WINDOW
+        if window_start <= elapsed <= window_end:
+            return POLL_FAST_INTERVAL
+
+        backoff = min(POLL_MAX_INTERVAL, POLL_BASE_INTERVAL * (2 ** entry["attempts"]))
+        interval = random.uniform(backoff / 2, backoff)
+        if elapsed < window_start:
+            interval = min(interval, window_start - elapsed)
+        return max(interval, POLL_FAST_INTERVAL)
+
+    def _schedule(self, call_id, now):
+        entry = self._calls[call_id]
+        delay = self.next_interval(entry, now)
+        # Restart the backoff once the call has been polled inside the fast window
+        entry["attempts"] = 0 if delay == POLL_FAST_INTERVAL else entry["attempts"] + 1
+        entry["next_poll_at"] = now + delay
+        heapq.heappush(self._heap, (entry["next_poll_at"], call_id))
+        self._wakeup.set()
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            poll_at, call_id = heapq.heappop(self._heap)
+            entry = self._calls.get(call_id)
+            if entry is not None and entry["next_poll_at"] == poll_at:
+                due.append(call_id)
+        return due
+
+    async def _poll(self, call_id):
+        async with self._semaphore:
+            if call_id not in self._calls:
+                return
+            self.total_polls += 1
+            self._poll_times.append(time.time())
+            try:
+                call_data = await self.fetch_call(call_id)
+                if call_data.get("ended") is not None:
+                    call_tracker.mark_ended(call_id, source="poller", call_data=call_data)
+                    return
+                if call_id in self._calls:
+                    self._calls[call_id]["failures"] = 0
+            except Exception as e:
+                self.failed_polls += 1
+                print(f"⚠️ Poll failed for call {call_id}: {e}")
+                if self._give_up(call_id, e):
+                    return
+        if call_id in self._calls:
+            self._schedule(call_id, time.time())
+
+    def _give_up(self, call_id, error):
+        """Stop polling a call that is unknown (404) or keeps failing; returns True if dropped"""
+        entry = self._calls.get(call_id)
+        if entry is None:
+            return True
+        entry["failures"] += 1
+        not_found = getattr(getattr(error, "response", None), "status_code", None) == 404
+        if not not_found and entry["failures"] < self.max_failures:
+            return False
+        # Dropped before the tracker is told, so the lost call stays out of the duration estimate
+        del self._calls[call_id]
+        self.dropped_calls += 1
+        reason = "call not found (404)" if not_found else f"{entry['failures']} failed polls in a row: {error}"
+        call_tracker.mark_lost(call_id, reason)
+        return True
+
+    async def run(self):
+        """Scheduler loop; run as a single background task"""
+        print(f"⏱️ Call poll scheduler started ({'sweeper' if self.webhooks_enabled else 'adaptive'} mode)")
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            for call_id in self._pop_due(now):
+                task = asyncio.create_task(self._poll(call_id))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0) if timeout is not None else None)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- metrics --------------------------------------------------------
+
+    def polls_per_second(self):
+        cutoff = time.time() - RATE_WINDOW
+        while self._poll_times and self._poll_times[0] < cutoff:
+            self._poll_times.popleft()
+        return len(self._poll_times) / RATE_WINDOW
+
+    def snapshot(self):
+        return {
+            "mode": "sweeper" if self.webhooks_enabled else "adaptive",
+            "tracked_calls": len(self._calls),
+            "polls_per_second": round(self.polls_per_second(), 3),
+            "total_polls": self.total_polls,
+            "failed_polls": self.failed_polls,
+            "dropped_calls": self.dropped_calls,
+            "expected_call_seconds": round(self.expected_call_seconds(), 1),
+        }
@@ -0,0 +1,398 @@
+"""
+Persistent Google Sheets outbox
+Every sheet row is written to a SQLite outbox (`sheets_outbox.db`) keyed by
+Twilio CallSid before anything is sent, so a quota spike, a Sheets outage or
+an expired token only delays the row instead of losing it. The SheetsWriter
+in google_sheet.py claims due rows in batches and marks them sent or
+schedules them again with exponential backoff. A CallSid that was already
+sent is never queued again, and rows whose last attempt may have reached the
+sheet (timeouts, 5xx) are checked against the worksheet before being resent.
+An enqueue that changes a row's values bumps its version. An append cannot
+update a sheet row in place, so a row whose append landed is marked sent
+even when newer values arrived meanwhile; those are only counted and logged.
+
+The Sheets request quota is a token bucket stored in the same database, so
+every worker process sharing the outbox draws from one per-minute budget
+and a 429 seen by one of them pauses them all.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+from openai_scheduler import TokenBucket
+
+load_dotenv()
+
+SHEETS_OUTBOX_DB = os.getenv("SHEETS_OUTBOX_DB", "sheets_outbox.db")
+SHEETS_RETRY_BASE = float(os.getenv("SHEETS_RETRY_BASE", "5"))
+SHEETS_RETRY_MAX = float(os.getenv("SHEETS_RETRY_MAX", "900"))
+SHEETS_MAX_ATTEMPTS = int(os.getenv("SHEETS_MAX_ATTEMPTS", "20"))
+# Rows claimed by a process that died mid-send are released after this long
+SHEETS_CLAIM_TIMEOUT = float(os.getenv("SHEETS_CLAIM_TIMEOUT", "300"))
+# Sent CallSids are remembered this long for deduplication
+SHEETS_OUTBOX_RETENTION_DAYS = float(os.getenv("SHEETS_OUTBOX_RETENTION_DAYS", "30"))
+
+# Row statuses
+PENDING = "pending"
+SENDING = "sending"  # claimed by a writer
+SENT = "sent"
+FAILED = "failed"  # gave up after SHEETS_MAX_ATTEMPTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    call_sid TEXT PRIMARY KEY,
+    worksheet TEXT NOT NULL,
+    row TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    uncertain INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS quota (
+    name TEXT PRIMARY KEY,
+    level REAL NOT NULL,
+    updated REAL NOT NULL,
+    paused_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+# Columns added after the first release, with their definitions
+ADDED_COLUMNS = {
+    "version": "INTEGER NOT NULL DEFAULT 0",
+}
+SHEETS_QUOTA = "sheets"
+
+
+def retry_delay(attempts, base=SHEETS_RETRY_BASE, cap=SHEETS_RETRY_MAX):
+    """Backoff before attempt number `attempts + 1`"""
+    return min(cap, base * (2 ** max(0, attempts - 1)))
+
+
+class SheetsOutbox:
+    """SQLite outbox of sheet rows; all methods are coroutines that keep disk I/O off the loop"""
+
+    def __init__(self, db_path=SHEETS_OUTBOX_DB):
+        """
+        Args:
+            db_path (str): SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Several worker processes share the outbox
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        self._conn.executescript(SCHEMA)
+        self.enqueued = 0
+        self.duplicates = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.updated_while_sending = 0
+
+    def _migrate(self):
+        """Add columns missing from a database created by an older version"""
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if not existing:
+            return  # fresh database, SCHEMA creates everything
+        for name, definition in ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE outbox ADD COLUMN {name} {definition}")
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(func, *args)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- producers ------------------------------------------------------
+
+    def _enqueue(self, call_sid, worksheet, row):
+        now = time.time()
+        # A row that is already in the sheet is left alone; an unsent one takes the newer values.
+        # A row being sent keeps its claim; only a change of values bumps the version.
+        return self._execute(
+            "INSERT INTO outbox (call_sid, worksheet, row, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(call_sid) DO UPDATE SET worksheet = excluded.worksheet, row = excluded.row, "
+            "status = CASE WHEN status = 'sending' THEN status ELSE 'pending' END, "
+            "attempts = 0, updated_at = excluded.updated_at, next_attempt_at = 0, "
+            "version = version + (row != excluded.row OR worksheet != excluded.worksheet) "
+            "WHERE status != 'sent'",
+            (call_sid, worksheet, json.dumps(row), PENDING, now, now),
+        ) > 0
+
+    async def enqueue(self, call_sid, worksheet, row):
+        """
+        Queue a row for its worksheet
+
+        Returns:
+            bool: False when the CallSid was already sent (nothing queued)
+        """
+        queued = await self._run(self._enqueue, call_sid, worksheet, row)
+        if queued:
+            self.enqueued += 1
+        else:
+            self.duplicates += 1
+        return queued
+
+    # --- writer ---------------------------------------------------------
+
+    def _claim(self, limit):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Release rows a crashed process claimed; whether they reached the sheet is unknown
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, uncertain = 1 WHERE status = ? AND updated_at < ?",
+                    (PENDING, SENDING, now - SHEETS_CLAIM_TIMEOUT),
+                )
+                rows = self._conn.execute(
+                    "SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+                    (PENDING, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, updated_at = ? WHERE call_sid = ?",
+                    [(SENDING, now, row["call_sid"]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        claimed = []
+        for row in rows:
+            item = dict(row)
+            item["row"] = json.loads(item["row"])
+            claimed.append(item)
+        return claimed
+
+    async def claim(self, limit):
+        """Take up to `limit` due rows, oldest first, for this writer"""
+        return await self._run(self._claim, limit)
+
+    def _mark_sent(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Changed while this writer was sending; the append landed, so the newer values cannot go out
+                stale = sum(
+                    self._conn.execute(
+                        "SELECT COUNT(*) FROM outbox WHERE call_sid = ? AND version != ?",
+                        (item["call_sid"], item["version"]),
+                    ).fetchone()[0]
+                    for item in items
+                )
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, uncertain = 0, last_error = NULL, updated_at = ? "
+                    "WHERE call_sid = ?",
+                    [(SENT, now, item["call_sid"]) for item in items],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return stale
+
+    async def mark_sent(self, items):
+        """
+        Mark claimed rows as sent; their CallSids are never appended again
+
+        Args:
+            items (list): Rows from claim()
+
+        Returns:
+            int: Rows whose values changed while being sent (the sheet keeps the older values)
+        """
+        stale = await self._run(self._mark_sent, list(items))
+        self.sent += len(items)
+        self.updated_while_sending += stale
+        return stale
+
+    def _retry(self, items, error, delay, uncertain, count_attempt):
+        now = time.time()
+        failed = 0
+        updates = []
+        for item in items:
+            attempts = item["attempts"] + (1 if count_attempt else 0)
+            if attempts >= SHEETS_MAX_ATTEMPTS:
+                status, next_attempt_at = FAILED, now
+                failed += 1
+            else:
+                status = PENDING
+                next_attempt_at = now + (delay if delay is not None else retry_delay(attempts))
+            updates.append((status, attempts, int(uncertain or item["uncertain"]), str(error),
+                            now, next_attempt_at, item["call_sid"]))
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = ?, uncertain = ?, last_error = ?, "
+                "updated_at = ?, next_attempt_at = ? WHERE call_sid = ?",
+                updates,
+            )
+        return failed
+
+    async def retry(self, items, error, delay=None, uncertain=False, count_attempt=True):
+        """
+        Put claimed rows back with backoff, or give up on those out of attempts
+
+        Args:
+            items (list): Rows from claim()
+            error: What went wrong (stored as last_error)
+            delay (float): Fixed wait instead of the exponential backoff (quota resets)
+            uncertain (bool): The append may have landed; check the sheet before resending
+            count_attempt (bool): False for quota waits, which are not the row's fault
+        """
+        failed = await self._run(self._retry, items, error, delay, uncertain, count_attempt)
+        self.retried += len(items) - failed
+        self.failed += failed
+        return failed
+
+    def _next_due_in(self):
+        rows = self._fetchall(
+            "SELECT MIN(next_attempt_at) AS due FROM outbox WHERE status = ?", (PENDING,)
+        )
+        due = rows[0]["due"] if rows else None
+        return None if due is None else max(0.0, due - time.time())
+
+    async def next_due_in(self):
+        """Seconds until the next pending row is due, None when nothing is pending"""
+        return await self._run(self._next_due_in)
+
+    def _oldest_pending_age(self):
+        rows = self._fetchall(
+            "SELECT MIN(created_at) AS oldest, COUNT(*) AS due FROM outbox WHERE status = ? AND next_attempt_at <= ?",
+            (PENDING, time.time()),
+        )
+        if not rows or not rows[0]["due"]:
+            return 0, 0.0
+        return rows[0]["due"], time.time() - rows[0]["oldest"]
+
+    async def due_backlog(self):
+        """
+        Rows ready to send now
+
+        Returns:
+            tuple: (count, seconds the oldest of them has been waiting)
+        """
+        return await self._run(self._oldest_pending_age)
+
+    def _prune(self, retention_days=SHEETS_OUTBOX_RETENTION_DAYS):
+        return self._execute(
+            "DELETE FROM outbox WHERE status = ? AND updated_at < ?",
+            (SENT, time.time() - retention_days * 86400),
+        )
+
+    async def prune(self):
+        """Forget sent rows older than the dedup retention window"""
+        return await self._run(self._prune)
+
+    # --- shared request quota -------------------------------------------
+
+    def _take_quota(self, capacity, period, name=SHEETS_QUOTA):
+        """One request from the shared bucket; returns 0.0 when taken, else the seconds to wait"""
+        # Wall-clock time: monotonic clocks are not comparable between processes
+        now = time.time()
+        bucket = TokenBucket(capacity, period)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT level, updated, paused_until FROM quota WHERE name = ?", (name,)
+                ).fetchone()
+                if row is not None:
+                    bucket.level, bucket.updated, bucket.paused_until = row["level"], row["updated"], row["paused_until"]
+                else:
+                    bucket.updated = now
+                wait = bucket.wait_time(1, now)
+                if wait <= 0:
+                    bucket.take(1)
+                self._conn.execute(
+                    "INSERT INTO quota (name, level, updated, paused_until) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated = excluded.updated, "
+                    "paused_until = excluded.paused_until",
+                    (name, bucket.level, bucket.updated, bucket.paused_until),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return max(0.0, wait)
+
+    async def take_quota(self, capacity, period=60.0):
+        """
+        Take one Sheets request from the bucket shared by every process using this outbox
+
+        Args:
+            capacity (int): Requests allowed per period, across all processes
+            period (float): Seconds the capacity refills over
+
+        Returns:
+            float: 0.0 when the request may be made now, else seconds to wait before asking again
+        """
+        return await self._run(self._take_quota, capacity, period)
+
+    def _pause_quota(self, seconds, name=SHEETS_QUOTA):
+        until = time.time() + seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO quota (name, level, updated, paused_until) VALUES (?, 0, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)",
+                (name, time.time(), until),
+            )
+            return self._conn.execute(
+                "SELECT paused_until FROM quota WHERE name = ?", (name,)
+            ).fetchone()["paused_until"] - time.time()
+
+    async def pause_quota(self, seconds):
+        """
+        Stop every process from sending for `seconds` (a 429 was returned)
+
+        Returns:
+            float: Seconds until the shared pause ends
+        """
+        return await self._run(self._pause_quota, seconds)
+
+    # --- metrics --------------------------------------------------------
+
+    def _counts(self):
+        rows = self._fetchall(
+            "SELECT status, COUNT(*) AS n, MIN(created_at) AS oldest FROM outbox GROUP BY status"
+        )
+        return {row["status"]: (row["n"], row["oldest"]) for row in rows}
+
+    async def snapshot(self):
+        counts = await self._run(self._counts)
+        pending, oldest = counts.get(PENDING, (0, None))
+        return {
+            "pending": pending,
+            "sending": counts.get(SENDING, (0, None))[0],
+            "sent": counts.get(SENT, (0, None))[0],
+            "failed": counts.get(FAILED, (0, None))[0],
+            "oldest_pending_age_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "enqueued": self.enqueued,
+            "duplicates_skipped": self.duplicates,
+            "updated_while_sending": self.updated_while_sending,
+            "retried": self.retried,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
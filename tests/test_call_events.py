@@ -0,0 +1,53 @@
+import hmac
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from call_events import handle_ultravox_event, verify_ultravox_signature
+
+SECRET = "whsec_test"
+BODY = b'{"event": "call.ended", "call": {"callId": "abc"}}'
+
+
+def _timestamp(offset_seconds=0):
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)).isoformat()
+
+
+def _sign(body, timestamp, secret=SECRET):
+    return hmac.new(secret.encode(), body + timestamp.encode(), hashlib.sha256).hexdigest()
+
+
+def test_valid_signature():
+    timestamp = _timestamp()
+    assert verify_ultravox_signature(BODY, timestamp, _sign(BODY, timestamp), secret=SECRET)
+
+
+def test_any_of_several_rotated_signatures():
+    timestamp = _timestamp()
+    header = f"{_sign(BODY, timestamp, 'old_secret')}, {_sign(BODY, timestamp)}"
+    assert verify_ultravox_signature(BODY, timestamp, header, secret=SECRET)
+
+
+def test_tampered_body_or_wrong_secret():
+    timestamp = _timestamp()
+    signature = _sign(BODY, timestamp)
+    assert not verify_ultravox_signature(BODY + b" ", timestamp, signature, secret=SECRET)
+    assert not verify_ultravox_signature(BODY, timestamp, signature, secret="other")
+
+
+def test_stale_or_missing_headers():
+    old = _timestamp(-3600)
+    assert not verify_ultravox_signature(BODY, old, _sign(BODY, old), secret=SECRET)
+    assert not verify_ultravox_signature(BODY, None, _sign(BODY, _timestamp()), secret=SECRET)
+    assert not verify_ultravox_signature(BODY, _timestamp(), None, secret=SECRET)
+    assert not verify_ultravox_signature(BODY, "not a date", "abc", secret=SECRET)
+
+
+def test_unsigned_deliveries_need_an_explicit_opt_in(monkeypatch):
+    monkeypatch.setattr("call_events.ULTRAVOX_WEBHOOK_SECRET", None)
+    assert not verify_ultravox_signature(BODY, None, None, allow_unsigned=False)
+    assert verify_ultravox_signature(BODY, None, None, allow_unsigned=True)
+
+
+def test_event_with_a_malformed_call_is_ignored():
+    assert handle_ultravox_event({"event": "call.ended", "call": "abc"}) is False
+    assert handle_ultravox_event({"event": "call.ended"}) is False
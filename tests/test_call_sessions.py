@@ -0,0 +1,14 @@
+from call_sessions import CallSessionRegistry
+
+
+def test_latest_active_is_the_most_recently_started_call():
+    sessions = CallSessionRegistry()
+    first = sessions.add("first", "CA1", "+15550000001")
+    second = sessions.add("second", "CA2", "+15550000002")
+    third = sessions.add("third", "CA3", "+15550000003")
+    first.created_at, second.created_at, third.created_at = 1.0, 2.0, 3.0
+
+    sessions.mark_ended("third")
+    # Looking up the older call moves it to the end of the LRU order
+    sessions.get("first")
+    assert sessions.latest_active() is second
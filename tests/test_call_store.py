@@ -0,0 +1,58 @@
+import asyncio
+
+from call_store import CallStore
+
+
+def test_upsert_updates_the_row_of_a_resaved_call_sid(tmp_path):
+    async def scenario():
+        store = CallStore(str(tmp_path / "calls.db"), import_csv=None)
+        try:
+            await store.upsert({"callSid": "CA1", "timestamp": "2025-01-01 10:00:00", "name": "Ana", "status": "completed"})
+            await store.upsert({"callSid": "CA1", "timestamp": "2025-01-01 10:00:00", "name": "Ana Diaz",
+                                "status": "transferred"})
+            await store.upsert({"callSid": "CA2", "timestamp": "2025-01-02 09:00:00", "name": "Ben"})
+            return await store.count(), await store.get("CA1"), await store.find()
+        finally:
+            store.close()
+
+    count, record, found = asyncio.run(scenario())
+    assert count == 2
+    assert record["name"] == "Ana Diaz"
+    assert record["status"] == "transferred"
+    assert [call["callSid"] for call in found] == ["CA2", "CA1"]
+
+
+def test_export_csv_has_one_row_per_call(tmp_path):
+    async def scenario():
+        store = CallStore(str(tmp_path / "calls.db"), import_csv=None)
+        try:
+            for name in ("first", "second"):
+                await store.upsert({"callSid": "CA1", "timestamp": "2025-01-01 10:00:00", "name": name})
+            return await store.export_csv(str(tmp_path / "Progress.csv"))
+        finally:
+            store.close()
+
+    assert asyncio.run(scenario()) == 1
+    lines = (tmp_path / "Progress.csv").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert "second" in lines[1]
+
+
+def test_legacy_phone_column_fills_a_missing_caller_phone(tmp_path, capsys):
+    legacy = tmp_path / "Progress.csv"
+    legacy.write_text(
+        "timestamp,callSid,departmentCode,name,phone,notes\n"
+        "2025-09-15 21:34:37,CA1,press,Ana,+15550000001,called twice\n",
+        encoding="utf-8",
+    )
+
+    async def scenario():
+        store = CallStore(str(tmp_path / "calls.db"), import_csv=str(legacy))
+        try:
+            return await store.get("CA1")
+        finally:
+            store.close()
+
+    record = asyncio.run(scenario())
+    assert record["callerPhone"] == "+15550000001"
+    assert "columns not imported: notes" in capsys.readouterr().out
@@ -0,0 +1,23 @@
+import json
+import sqlite3
+
+from department_classifier import job_examples, verified_labels
+
+
+def test_training_uses_verified_labels_not_the_llm_ones(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE jobs (call_id TEXT, status TEXT, payload TEXT)")
+    for call_id, text, llm_department in [
+        ("checked", "User (Voice): The app crashes on my phone.", "sales"),
+        ("unchecked", "User (Voice): I want to audition.", "casting"),
+    ]:
+        payload = {"transcript": text, "contact_info": {"department": llm_department}}
+        conn.execute("INSERT INTO jobs VALUES (?, 'done', ?)", (call_id, json.dumps(payload)))
+    conn.commit()
+    conn.close()
+    labels = tmp_path / "labels.csv"
+    labels.write_text("call_id,department\nchecked,Support\nmissing,press\n", encoding="utf-8")
+
+    examples = job_examples(db_path, verified_labels(str(labels)))
+    assert examples == [("User (Voice): The app crashes on my phone.", "support")]
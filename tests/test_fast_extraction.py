@@ -0,0 +1,77 @@
+from fast_extraction import fast_extract, scan_spelled_email, split_turns
+
+
+def _transcript(*turns):
+    return "".join(f"{role} (Voice): {text}\n" for role, text in turns)
+
+
+NAME_AND_PURPOSE = [
+    ("Agent", "Hello, thanks for calling Faith Agency. May I have your name?"),
+    ("User", "It's John Smith."),
+    ("Agent", "I heard John Smith. Did I get that right?"),
+    ("User", "Yes, no problem."),
+    ("Agent", "So you're calling about a partnership proposal. Did I get that right?"),
+    ("User", "Yeah, no worries."),
+]
+
+
+def _spell_back(email_letters):
+    return ("Agent", f"Let me spell it back: {email_letters}. Did I spell that correctly?")
+
+
+def test_corrected_spelling_is_the_one_kept():
+    turns = split_turns(_transcript(
+        ("Agent", "What's the best email to reach you?"),
+        ("User", "john at gmail dot com"),
+        _spell_back("j, o, n, at, g, m, a, i, l, dot, c, o, m"),
+        ("User", "No, that's not right. It's j o h n."),
+        _spell_back("j, o, h, n, at, g, m, a, i, l, dot, c, o, m"),
+        ("User", "Yes."),
+    ))
+    assert scan_spelled_email(turns) == ("john@gmail.com", True)
+
+
+def test_yes_no_problem_confirms_the_spelling():
+    for reply in ("Yes.", "Yes, no problem.", "yes no worries", "Sí, no hay problema."):
+        turns = split_turns(_transcript(
+            _spell_back("j, o, h, n, n, at, g, m, a, i, l, dot, c, o, m"),
+            ("User", reply),
+        ))
+        assert scan_spelled_email(turns) == ("johnn@gmail.com", True), reply
+
+
+def test_last_confirmed_spelling_wins():
+    turns = split_turns(_transcript(
+        _spell_back("j, o, h, n, at, g, m, a, i, l, dot, c, o, m"),
+        ("User", "Yes, that's right."),
+        ("Agent", "Actually, I use my work address for this."),
+        _spell_back("j, o, h, n, at, f, a, i, t, h, dot, o, r, g"),
+        ("User", "Correct."),
+        _spell_back("j, o, h, n, at, w, r, o, n, g, dot, o, r, g"),
+        ("User", "Hmm, hold on."),
+    ))
+    assert scan_spelled_email(turns) == ("john@faith.org", True)
+
+
+def test_fast_extract_confirms_name_purpose_and_email():
+    transcript = _transcript(
+        *NAME_AND_PURPOSE,
+        _spell_back("j, o, h, n, at, g, m, a, i, l, dot, c, o, m"),
+        ("User", "Yes, no problem."),
+    )
+    info, confidence = fast_extract(transcript)
+    assert info["name"] == "John Smith" and confidence["name"] == 0.95
+    assert info["purpose"] == "a partnership proposal" and confidence["purpose"] == 0.9
+    assert info["email"] == "john@gmail.com" and confidence["email"] == 0.95
+
+
+def test_fast_extract_drops_a_rejected_name():
+    transcript = _transcript(
+        ("Agent", "I heard Jon Smyth. Did I get that right?"),
+        ("User", "No, it's John Smith."),
+        ("Agent", "I heard John Smith. Did I get that right?"),
+        ("User", "Not quite, Smith with an i and no e."),
+    )
+    info, confidence = fast_extract(transcript)
+    assert info["name"] == ""
+    assert confidence["name"] == 0.0
@@ -0,0 +1,143 @@
+import time
+import asyncio
+
+from job_queue import PostCallQueue, FAILED, PENDING, RUNNING, WAITING
+
+STAGES = ["transcript", "extract", "record"]
+
+
+def _status(queue, call_id):
+    return queue._fetchall("SELECT status FROM jobs WHERE call_id = ?", (call_id,))[0]["status"]
+
+
+def test_resume_returns_live_calls_and_requeues_abandoned_jobs(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "jobs.db")
+        first = PostCallQueue(STAGES, db_path=db_path, lease_seconds=0.05)
+        await first.enqueue("live", "CA-live", "+15550000001")
+        await first.enqueue("ended", "CA-ended", "+15550000002")
+        await first.mark_ready("ended")
+        job = await first.claim()
+        assert job["call_id"] == "ended" and _status(first, "ended") == RUNNING
+        first.close()
+
+        # A restarted process: the old worker never renews its lease
+        time.sleep(0.1)
+        second = PostCallQueue(STAGES, db_path=db_path)
+        try:
+            waiting = await second.resume()
+            assert [job["call_id"] for job in waiting] == ["live"]
+            assert _status(second, "live") == WAITING
+            assert _status(second, "ended") == PENDING
+            resumed = await second.claim()
+            assert resumed["call_id"] == "ended" and resumed["stage"] == "transcript"
+        finally:
+            second.close()
+
+    asyncio.run(scenario())
+
+
+def test_resume_leaves_jobs_leased_by_a_running_process(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "jobs.db")
+        owner = PostCallQueue(STAGES, db_path=db_path, lease_seconds=60)
+        other = PostCallQueue(STAGES, db_path=db_path, lease_seconds=60)
+        try:
+            await owner.enqueue("call", "CA1", "+15550000001")
+            await owner.mark_ready("call")
+            job = await owner.claim()
+            await other.resume()
+            assert _status(other, "call") == RUNNING
+            assert await other.claim() is None
+
+            job["payload"]["transcript"] = "Agent (Voice): Hello\n"
+            assert await owner.advance(job) == PENDING
+            advanced = await other.claim()
+            assert advanced["stage"] == "extract"
+            assert advanced["payload"]["transcript"] == "Agent (Voice): Hello\n"
+        finally:
+            owner.close()
+            other.close()
+
+    asyncio.run(scenario())
+
+
+def test_stale_owner_cannot_save_after_takeover(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "jobs.db")
+        stale = PostCallQueue(STAGES, db_path=db_path, lease_seconds=0.05)
+        fresh = PostCallQueue(STAGES, db_path=db_path, lease_seconds=60)
+        try:
+            await stale.enqueue("call", "CA1", "+15550000001")
+            await stale.mark_ready("call")
+            job = await stale.claim()
+            await asyncio.sleep(0.1)
+            taken = await fresh.claim()
+            assert taken["call_id"] == "call"
+            assert await stale.advance(job) is None
+            assert stale.leases_lost == 1
+            assert fresh.leases_taken_over == 1
+        finally:
+            stale.close()
+            fresh.close()
+
+    asyncio.run(scenario())
+
+
+def test_unavailable_call_fails_its_waiting_job(tmp_path):
+    async def scenario():
+        queue = PostCallQueue(STAGES, db_path=str(tmp_path / "jobs.db"))
+        try:
+            await queue.enqueue("deleted", "CA1", "+15550000001")
+            assert await queue.fail_waiting("deleted", "call not found (404)")
+            assert _status(queue, "deleted") == FAILED
+            assert await queue.resume() == []
+            assert await queue.claim() is None
+        finally:
+            queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_resume_skips_live_calls_monitored_by_another_process(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "jobs.db")
+        monitoring = PostCallQueue(STAGES, db_path=db_path, lease_seconds=60)
+        restarted = PostCallQueue(STAGES, db_path=db_path, lease_seconds=60)
+        try:
+            await monitoring.enqueue("live", "CA1", "+15550000001")
+            assert await restarted.resume() == []
+
+            await monitoring.release_waiting()
+            assert [job["call_id"] for job in await restarted.resume()] == ["live"]
+            assert await monitoring.resume() == []
+        finally:
+            monitoring.close()
+            restarted.close()
+
+    asyncio.run(scenario())
+
+
+def test_requeue_leaves_a_running_job_to_its_worker(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "jobs.db")
+        worker = PostCallQueue(STAGES, db_path=db_path, lease_seconds=0.2)
+        cli = PostCallQueue(STAGES, db_path=db_path)
+        try:
+            await worker.enqueue("call", "CA1", "+15550000001")
+            await worker.mark_ready("call")
+            job = await worker.claim()
+            assert await cli.requeue("call", "transcript", {"reprocess": True}) is False
+            assert _status(cli, "call") == RUNNING
+
+            # Once the worker is gone its job may be requeued, and the stale worker cannot save it
+            await asyncio.sleep(0.3)
+            assert await cli.requeue("call", "transcript", {"reprocess": True}) is True
+            assert await worker.advance(job) is None
+            requeued = await cli.claim()
+            assert requeued["stage"] == "transcript" and requeued["payload"]["reprocess"] is True
+        finally:
+            worker.close()
+            cli.close()
+
+    asyncio.run(scenario())
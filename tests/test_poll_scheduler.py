@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+from call_events import call_tracker, CallUnavailable
+from poll_scheduler import CallPollScheduler
+
+
+def _not_found(call_id):
+    request = httpx.Request("GET", f"https://api.ultravox.ai/api/calls/{call_id}")
+    return httpx.HTTPStatusError("404 Not Found", request=request, response=httpx.Response(404, request=request))
+
+
+def test_unknown_call_is_dropped_on_404():
+    async def fetch_call(call_id):
+        raise _not_found(call_id)
+
+    async def scenario():
+        scheduler = CallPollScheduler(fetch_call, webhooks_enabled=True)
+        scheduler.track("deleted-call")
+        waiter = asyncio.create_task(call_tracker.wait_for_end("deleted-call"))
+        await scheduler._poll("deleted-call")
+        with pytest.raises(CallUnavailable):
+            await waiter
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["tracked_calls"] == 0
+    assert snapshot["dropped_calls"] == 1
+
+
+def test_call_is_dropped_after_consecutive_failures_only():
+    results = []
+
+    async def fetch_call(call_id):
+        outcome = results.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def scenario():
+        scheduler = CallPollScheduler(fetch_call, webhooks_enabled=True, max_failures=3)
+        scheduler.track("flaky-call")
+        results.extend([TimeoutError(), TimeoutError(), {"ended": None}, TimeoutError(), TimeoutError()])
+        for _ in range(5):
+            await scheduler._poll("flaky-call")
+        assert scheduler.snapshot()["tracked_calls"] == 1
+
+        results.append(TimeoutError())
+        await scheduler._poll("flaky-call")
+        assert scheduler.snapshot()["tracked_calls"] == 0
+        with pytest.raises(CallUnavailable):
+            await call_tracker.wait_for_end("flaky-call")
+
+    asyncio.run(scenario())
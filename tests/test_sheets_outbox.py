@@ -0,0 +1,56 @@
+import asyncio
+
+from sheets_outbox import SheetsOutbox
+
+ROW = ["2025-01-01 10:00:00", "+15550000001", "Ana", "Billing"]
+
+
+def test_reenqueue_while_sending_is_appended_once(tmp_path):
+    async def scenario():
+        outbox = SheetsOutbox(str(tmp_path / "outbox.db"))
+        try:
+            await outbox.enqueue("CA1", "Calls", ROW)
+            claimed = await outbox.claim(10)
+            assert [(item["call_sid"], item["version"]) for item in claimed] == [("CA1", 0)]
+
+            # The same row is saved again while the writer is appending it
+            await outbox.enqueue("CA1", "Calls", ROW)
+            assert await outbox.mark_sent(claimed) == 0
+            assert await outbox.claim(10) == []
+            assert await outbox.enqueue("CA1", "Calls", ROW) is False
+        finally:
+            outbox.close()
+
+    asyncio.run(scenario())
+
+
+def test_changed_row_while_sending_is_not_appended_twice(tmp_path):
+    async def scenario():
+        outbox = SheetsOutbox(str(tmp_path / "outbox.db"))
+        try:
+            await outbox.enqueue("CA1", "Calls", ROW)
+            claimed = await outbox.claim(10)
+            await outbox.enqueue("CA1", "Calls", ROW[:2] + ["Ana Diaz", "Billing"])
+            assert await outbox.mark_sent(claimed) == 1
+            assert await outbox.claim(10) == []
+            snapshot = await outbox.snapshot()
+            assert snapshot["sent"] == 1 and snapshot["updated_while_sending"] == 1
+        finally:
+            outbox.close()
+
+    asyncio.run(scenario())
+
+
+def test_unsent_row_takes_the_newer_values(tmp_path):
+    async def scenario():
+        outbox = SheetsOutbox(str(tmp_path / "outbox.db"))
+        try:
+            await outbox.enqueue("CA1", "Calls", ROW)
+            await outbox.enqueue("CA1", "Calls", ROW)
+            await outbox.enqueue("CA1", "Calls", ROW[:2] + ["Ana Diaz", "Billing"])
+            claimed = await outbox.claim(10)
+            assert [(item["row"][2], item["version"]) for item in claimed] == [("Ana Diaz", 1)]
+        finally:
+            outbox.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+"""/api/incoming must stay responsive while a transfer is waiting for management"""
+
+import time
+import uuid
+import asyncio
+
+import httpx
+
+# Simulated latency of one Twilio REST request (seconds)
+TWILIO_LATENCY = 0.25
+# Slowest acceptable /api/incoming response while a transfer is in progress
+MAX_INCOMING_LATENCY = 0.5
+
+
+class FakeTwilioCall:
+    def __init__(self, sid, status="ringing"):
+        self.sid = sid
+        self.status = status
+
+    async def fetch_async(self):
+        await asyncio.sleep(TWILIO_LATENCY)
+        return self
+
+    async def update_async(self, **kwargs):
+        await asyncio.sleep(TWILIO_LATENCY)
+        return self
+
+
+class FakeTwilioCalls:
+    """Management never answers, so the transfer runs for TRANSFER_MAX_WAIT"""
+
+    def __call__(self, sid):
+        return FakeTwilioCall(sid)
+
+    async def create_async(self, **kwargs):
+        await asyncio.sleep(TWILIO_LATENCY)
+        return FakeTwilioCall(f"CA{uuid.uuid4().hex}")
+
+
+class FakeTwilioClient:
+    def __init__(self):
+        self.calls = FakeTwilioCalls()
+
+
+async def fake_create_ultravox_call(config, client=None):
+    return {"joinUrl": "wss://example.invalid/join", "callId": str(uuid.uuid4())}
+
+
+def test_incoming_calls_are_answered_during_a_transfer(tmp_path, monkeypatch):
+    # Every database the lifespan opens lives in tmp_path, never in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("JOB_QUEUE_DB", str(tmp_path / "post_call_jobs.db"))
+    monkeypatch.setenv("CALL_STORE_DB", str(tmp_path / "calls.db"))
+    monkeypatch.setenv("SHEETS_OUTBOX_DB", str(tmp_path / "sheets_outbox.db"))
+    # Short transfer timings and placeholder credentials; nothing talks to a real service
+    monkeypatch.setenv("TRANSFER_CHECK_INTERVAL", "0.5")
+    monkeypatch.setenv("TRANSFER_MAX_WAIT", "3")
+    monkeypatch.setenv("PUBLIC_BASE_URL", "")
+    monkeypatch.setenv("MANAGEMENT_REDIRECT_NUMBER", "+15550000001")
+    monkeypatch.setenv("TWILIO_PHONE_NUMBER", "+15550000002")
+    monkeypatch.setenv("TWILIO_ACCOUNT_SID", "AC00000000000000000000000000000000")
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN", "check")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-check")
+
+    import main
+    import twilio_client
+
+    monkeypatch.setattr(main, "create_ultravox_call", fake_create_ultravox_call)
+
+    async def scenario():
+        async with main.app.router.lifespan_context(main.app):
+            twilio_client.set_twilio_client(FakeTwilioClient())
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+                transfer = asyncio.create_task(client.post(
+                    "/api/transfer",
+                    json={"callSid": "CA00000000000000000000000000000001", "destinationNumber": "management_number"},
+                ))
+                await asyncio.sleep(TWILIO_LATENCY * 2)
+
+                latencies = []
+                while not transfer.done() and len(latencies) < 10:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/api/incoming",
+                        data={"From": "+15550000000", "CallSid": f"CA{uuid.uuid4().hex}"},
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.text
+                    await asyncio.sleep(0.1)
+
+                return latencies, (await transfer).json()
+
+    latencies, transfer_result = asyncio.run(scenario())
+    assert transfer_result["status"] == "failed"
+    assert latencies, "transfer finished before any incoming call was measured"
+    assert max(latencies) < MAX_INCOMING_LATENCY
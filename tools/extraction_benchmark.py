@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Benchmark: extraction latency, token usage and accuracy
+Runs every transcript of tools/extraction_corpus.json through each extractor
+variant and compares the result with the expected fields. By default the
+chat completions are answered by tools/fake_openai_server.py in-process (its
+latency model scales with prompt and completion tokens), so latency and token
+numbers are comparable between variants without an API key. Accuracy of the
+LLM variants is only meaningful against a real endpoint (--base-url, with
+OPENAI_API_KEY set); the fake server answers with crude heuristics.
+
+Variants:
+    llm        full prompt, whole transcript, no rules (the original extractor)
+    compacted  full prompt on the compacted transcript
+    fast_path  rules only, no OpenAI request
+    hybrid     rules first, OpenAI for the remaining fields on the compacted transcript (production default)
+
+Usage:
+    python tools/extraction_benchmark.py [--variants llm,hybrid] [--repeat 3]
+    python tools/extraction_benchmark.py --base-url https://api.openai.com/v1 --models gpt-4o-mini
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# extraction.py builds its shared client at import; the benchmark passes its own
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+
+import httpx
+from openai import AsyncOpenAI
+
+from extraction import run_extraction, DEFAULT_CONTACT_INFO
+from transcript_compaction import preload_tokenizer
+from model_router import MODEL_TIERS
+from fast_extraction import fast_extract
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(TOOLS_DIR, "extraction_corpus.json")
+SCORED_FIELDS = ["name", "email", "organization", "department", "delivery_preference", "purpose"]
+
+VARIANTS = {
+    "llm": {"fast_path": False, "compaction": False},
+    "compacted": {"fast_path": False, "compaction": True},
+    "fast_path": None,
+    "hybrid": {"fast_path": True, "compaction": True},
+}
+
+
+def fake_openai_client():
+    """AsyncOpenAI client wired straight to the fake server app (no sockets)"""
+    sys.path.insert(0, TOOLS_DIR)
+    from fake_openai_server import app
+
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake-openai")
+    return AsyncOpenAI(api_key="sk-fake", base_url="http://fake-openai/v1", http_client=http_client)
+
+
+def field_correct(field, got, expected):
+    """Compare one extracted field with the corpus expectation"""
+    if field == "purpose":
+        text = f"{got.get('purpose', '')} {got.get('summary', '')}".lower()
+        return all(keyword in text for keyword in expected["purpose_keywords"])
+    if field == "delivery_preference":
+        return sorted(got.get(field) or []) == sorted(expected[field])
+    value = str(got.get(field) or "").strip()
+    if field in ("name", "email", "organization"):
+        return value.lower() == expected[field].lower()
+    return value == expected[field]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def extract(variant, transcript, client, models):
+    """
+    One extraction with the given variant
+
+    Returns:
+        tuple: (contact_info, usage dict, error message or None)
+    """
+    settings = VARIANTS[variant]
+    no_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "models": []}
+    if settings is None:
+        info, _ = fast_extract(transcript)
+        return info, no_usage, None
+    try:
+        return (*await run_extraction(transcript, client=client, models=models, **settings), None)
+    except Exception as e:
+        return dict(DEFAULT_CONTACT_INFO), no_usage, str(e)
+
+
+async def run_variant(variant, corpus, client, models, repeat):
+    latencies = []
+    prompt_tokens = []
+    completion_tokens = []
+    cost = 0.0
+    escalated = 0
+    correct = {field: 0 for field in SCORED_FIELDS}
+    misses = []
+    errors = 0
+
+    for _ in range(repeat):
+        for case in corpus:
+            start = time.perf_counter()
+            # The extraction path logs every step; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                info, usage, error = await extract(variant, case["transcript"], client, models)
+            latencies.append(time.perf_counter() - start)
+            prompt_tokens.append(usage["prompt_tokens"])
+            completion_tokens.append(usage["completion_tokens"])
+            cost += usage["cost_usd"]
+            escalated += len(usage["models"]) > 1
+            errors += error is not None
+            for field in SCORED_FIELDS:
+                if field_correct(field, info, case["expected"]):
+                    correct[field] += 1
+                elif len(misses) < 50:
+                    misses.append((case["id"], field, repr(info.get(field))))
+
+    calls = len(latencies)
+    return {
+        "variant": variant,
+        "calls": calls,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "prompt_tokens_per_call": round(sum(prompt_tokens) / calls, 1),
+        "completion_tokens_per_call": round(sum(completion_tokens) / calls, 1),
+        "cost_usd_per_call": round(cost / calls, 6),
+        "escalation_rate": round(escalated / calls, 3),
+        "accuracy": {field: round(count / calls, 3) for field, count in correct.items()},
+        "misses": sorted(set(misses)),
+    }
+
+
+def print_report(results, show_misses):
+    header = (f"{'variant':<10} {'p50 ms':>9} {'p95 ms':>9} {'prompt tok':>11} {'compl tok':>10} "
+              f"{'$/1k calls':>11} {'escalated':>10} {'errors':>7}  ")
+    print(header + " ".join(f"{field[:8]:>8}" for field in SCORED_FIELDS))
+    for result in results:
+        print(f"{result['variant']:<10} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+              f"{result['prompt_tokens_per_call']:>11.1f} {result['completion_tokens_per_call']:>10.1f} "
+              f"{result['cost_usd_per_call'] * 1000:>11.3f} {result['escalation_rate']:>10.0%} {result['errors']:>7}  "
+              + " ".join(f"{result['accuracy'][field]:>8.0%}" for field in SCORED_FIELDS))
+    if show_misses:
+        for result in results:
+            for case_id, field, got in result["misses"]:
+                print(f"  ✗ {result['variant']}: {case_id} {field} = {got}")
+
+
+async def main(args):
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    unknown = [variant for variant in variants if variant not in VARIANTS]
+    if unknown:
+        raise SystemExit(f"Unknown variant(s): {', '.join(unknown)} (choose from {', '.join(VARIANTS)})")
+
+    if args.base_url:
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=args.base_url)
+    else:
+        client = fake_openai_client()
+
+    models = [model.strip() for model in args.models.split(",") if model.strip()]
+    await preload_tokenizer()
+    print(f"📊 {len(corpus)} transcripts × {args.repeat} run(s), model tiers {' → '.join(models)}, "
+          f"endpoint {args.base_url or 'in-process fake server'}")
+    results = []
+    try:
+        for variant in variants:
+            results.append(await run_variant(variant, corpus, client, models, args.repeat))
+    finally:
+        await client.close()
+
+    print_report(results, args.misses)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {id, transcript, expected}")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="Comma-separated variants to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per variant")
+    parser.add_argument("--base-url", help="Real OpenAI-compatible endpoint instead of the in-process fake")
+    parser.add_argument("--models", default=",".join(MODEL_TIERS),
+                        help="Comma-separated model tiers, cheapest first (one model disables escalation)")
+    parser.add_argument("--misses", action="store_true", help="List every wrong field")
+    parser.add_argument("--json", help="Also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI Files, Batches and Chat Completions APIs
+Answers extraction prompts with simple transcript heuristics so batch and
+online extraction can be exercised without a real API key. Batches complete
+FAKE_BATCH_DELAY seconds after they are created. Chat completions are delayed
+by a simple latency model (fixed overhead plus time per prompt and completion
+token) so prompt size shows up in benchmark latencies, and carry the
+x-ratelimit-* headers of a FAKE_RPM_LIMIT/FAKE_TPM_LIMIT account; requests over
+those limits get a 429 like the real API.
+
+Usage:
+    python tools/fake_openai_server.py --port 8100
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-fake python main.py
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from fastapi import FastAPI, Request, HTTPException
+from collections import deque
+from fastapi.responses import PlainTextResponse, JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript_compaction import count_tokens, load_tokenizer
+
+FAKE_BATCH_DELAY = 5.0
+# Roughly gpt-4o-mini: time to first token plus prefill and decode time
+FAKE_LATENCY_BASE = 0.25
+FAKE_LATENCY_PER_PROMPT_TOKEN = 0.00005
+FAKE_LATENCY_PER_COMPLETION_TOKEN = 0.01
+# Per-minute limits reported in the x-ratelimit-* headers and enforced with 429s
+FAKE_RPM_LIMIT = 500
+FAKE_TPM_LIMIT = 200000
+DEPARTMENTS = ["viva", "casting", "press", "support", "sales", "management"]
+
+app = FastAPI(title="Fake OpenAI")
+files = {}  # file_id -> {"meta": dict, "content": bytes}
+recent_requests = deque()  # (time, tokens) of chat completions in the last minute
+batches = {}  # batch_id -> dict
+
+
+def fake_extraction(prompt):
+    """Heuristic answer to the extraction prompt (only looks at the transcript)"""
+    transcript = prompt.split("TRANSCRIPT:", 1)[-1]
+    requested = re.search(r"ONLY these fields are still needed: ([a-z_, ]+)\.", transcript)
+    transcript = transcript.split("ONLY these fields are still needed:", 1)[0]
+    lowered = transcript.lower()
+
+    name = re.search(r"(?:my name is|this is) ([A-Z][a-z]+(?: [A-Z][a-z]+)?)", transcript)
+    email = re.search(r"[\w.+-]+@[\w-]+\.[\w.]+", transcript)
+    department = next((d for d in DEPARTMENTS if d in lowered), "voicemail")
+    if "both" in lowered:
+        delivery = ["Both"]
+    elif "email" in lowered and "sms" not in lowered and "text" not in lowered:
+        delivery = ["Email"]
+    elif "sms" in lowered or "text me" in lowered:
+        delivery = ["Sms"]
+    else:
+        delivery = ["Both"]
+
+    answer = {
+        "name": name.group(1) if name else "",
+        "email": email.group(0) if email else "",
+        "organization": "",
+        "department": department,
+        "purpose": "",
+        "summary": "No additional details provided.",
+        "delivery_preference": delivery,
+    }
+    if requested:
+        fields = [field.strip() for field in requested.group(1).split(",")]
+        answer = {field: value for field, value in answer.items() if field in fields}
+    return json.dumps(answer)
+
+
+def chat_completion(body):
+    prompt = body["messages"][-1]["content"]
+    content = fake_extraction(prompt)
+    prompt_tokens = sum(count_tokens(message["content"]) for message in body["messages"])
+    completion_tokens = count_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def store_file(content, filename, purpose):
+    file_id = f"file-{uuid.uuid4().hex}"
+    meta = {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+    files[file_id] = {"meta": meta, "content": content}
+    return meta
+
+
+def run_batch(batch):
+    """Answer every request line of the batch input file"""
+    output = []
+    for line in files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        output.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "request_id": uuid.uuid4().hex,
+                "body": chat_completion(request["body"]),
+            },
+            "error": None,
+        }))
+    out = store_file(("\n".join(output) + "\n").encode("utf-8"), "batch_output.jsonl", "batch_output")
+    batch.update({
+        "status": "completed",
+        "output_file_id": out["id"],
+        "completed_at": int(time.time()),
+        "request_counts": {"total": len(output), "completed": len(output), "failed": 0},
+    })
+
+
+def simulated_latency(usage):
+    return (FAKE_LATENCY_BASE
+            + usage["prompt_tokens"] * FAKE_LATENCY_PER_PROMPT_TOKEN
+            + usage["completion_tokens"] * FAKE_LATENCY_PER_COMPLETION_TOKEN)
+
+
+def rate_limit_headers(now):
+    """x-ratelimit-* headers for the sliding minute ending now"""
+    while recent_requests and now - recent_requests[0][0] >= 60:
+        recent_requests.popleft()
+    used_tokens = sum(tokens for _, tokens in recent_requests)
+    reset = f"{60 - (now - recent_requests[0][0]):.3f}s" if recent_requests else "0s"
+    return {
+        "x-ratelimit-limit-requests": str(FAKE_RPM_LIMIT),
+        "x-ratelimit-limit-tokens": str(FAKE_TPM_LIMIT),
+        "x-ratelimit-remaining-requests": str(max(0, FAKE_RPM_LIMIT - len(recent_requests))),
+        "x-ratelimit-remaining-tokens": str(max(0, FAKE_TPM_LIMIT - used_tokens)),
+        "x-ratelimit-reset-requests": reset,
+        "x-ratelimit-reset-tokens": reset,
+    }
+
+
+@app.post("/v1/chat/completions")
+async def create_chat_completion(request: Request):
+    completion = chat_completion(await request.json())
+    now = time.time()
+    headers = rate_limit_headers(now)
+    tokens = completion["usage"]["total_tokens"]
+    if int(headers["x-ratelimit-remaining-requests"]) < 1 or int(headers["x-ratelimit-remaining-tokens"]) < tokens:
+        error = {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}
+        retry_after = headers["x-ratelimit-reset-tokens"].rstrip("s")
+        return JSONResponse({"error": error}, status_code=429, headers={**headers, "retry-after": retry_after})
+    recent_requests.append((now, tokens))
+    await asyncio.sleep(simulated_latency(completion["usage"]))
+    return JSONResponse(completion, headers=rate_limit_headers(now))
+
+
+@app.post("/v1/files")
+async def create_file(request: Request):
+    form = await request.form()
+    upload = form["file"]
+    return store_file(await upload.read(), upload.filename, form.get("purpose", "batch"))
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return PlainTextResponse(files[file_id]["content"].decode("utf-8"))
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    if body["input_file_id"] not in files:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body["endpoint"],
+        "input_file_id": body["input_file_id"],
+        "completion_window": body["completion_window"],
+        "status": "in_progress",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "metadata": body.get("metadata"),
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    return batches[batch_id]
+
+
+@app.get("/v1/batches")
+async def list_batches(limit: int = 20, after: str = None):
+    ordered = sorted(batches.values(), key=lambda batch: batch["created_at"], reverse=True)
+    if after is not None:
+        ids = [batch["id"] for batch in ordered]
+        ordered = ordered[ids.index(after) + 1:] if after in ids else []
+    page = ordered[:limit]
+    return {
+        "object": "list",
+        "data": page,
+        "first_id": page[0]["id"] if page else None,
+        "last_id": page[-1]["id"] if page else None,
+        "has_more": len(ordered) > limit,
+    }
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+    if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= FAKE_BATCH_DELAY:
+        run_batch(batch)
+    return batch
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    load_tokenizer()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--batch-delay", type=float, default=FAKE_BATCH_DELAY,
+                        help="Seconds until a batch reports completed")
+    parser.add_argument("--latency-base", type=float, default=FAKE_LATENCY_BASE,
+                        help="Fixed seconds added to every chat completion (0 disables the latency model)")
+    parser.add_argument("--rpm", type=int, default=FAKE_RPM_LIMIT, help="Requests per minute before 429s")
+    parser.add_argument("--tpm", type=int, default=FAKE_TPM_LIMIT, help="Tokens per minute before 429s")
+    args = parser.parse_args()
+    FAKE_BATCH_DELAY = args.batch_delay
+    FAKE_RPM_LIMIT = args.rpm
+    FAKE_TPM_LIMIT = args.tpm
+    FAKE_LATENCY_BASE = args.latency_base
+    if not FAKE_LATENCY_BASE:
+        FAKE_LATENCY_PER_PROMPT_TOKEN = FAKE_LATENCY_PER_COMPLETION_TOKEN = 0.0
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: email spell-back parsing on adversarial transcripts
+Compares the old DOTALL safeguard regex with the single-pass, turn-aware
+scan_spelled_email on transcripts that repeat the spell-back many times
+without the "Did I spell that correctly?" check or a confirmation (the old
+regex's worst case: every "spell it back" rescans the rest of the call).
+
+Usage:
+    python tools/spellback_benchmark.py [--max-turns 3200]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_extraction import scan_spelled_email, split_turns
+
+# The safeguard previously used in extract_contact_from_transcript
+LEGACY_SPELLBACK = re.compile(
+    r"spell it back.*?:\s*([a-z0-9 ,]+).*?Did I spell that correctly\?.*?User.*?(Yes|Ok|Okay|Perfect|Correct|Right|Sure|Sí|Correcto)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Stop timing the legacy regex once one run takes longer than this (seconds)
+LEGACY_BUDGET = 1.0
+
+SPELL_BACK_TURNS = [
+    "Agent (Voice): Thanks. Let me spell it back slowly to confirm: j, o, h, n, at, g, m, a, i, l, dot, c, o, m. Is that it?",
+    "User (Voice): hmm, hold on a second",
+]
+CONFIRMED_TURNS = [
+    "Agent (Voice): Thanks. Let me spell it back slowly to confirm: j, o, h, n, at, g, m, a, i, l, dot, c, o, m. Did I spell that correctly?",
+    "User (Voice): Yes, perfect",
+]
+FILLER_TURNS = [
+    "Agent (Voice): I still haven't heard from you.",
+    "User (Voice): uh",
+]
+
+
+def adversarial_transcript(turns, confirm_last):
+    """Spell-backs the caller never answers, optionally confirmed at the very end"""
+    lines = []
+    while len(lines) < turns:
+        lines.extend(SPELL_BACK_TURNS)
+        lines.extend(FILLER_TURNS)
+    lines = lines[:turns]
+    if confirm_last:
+        lines.extend(CONFIRMED_TURNS)
+    return "\n".join(lines) + "\n"
+
+
+def time_call(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spell-back parser micro-benchmark")
+    parser.add_argument("--max-turns", type=int, default=3200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'turns':>7} {'confirmed':>9} {'KB':>8} {'legacy ms':>11} {'scan ms':>9} {'scan µs/KB':>11}")
+    legacy_enabled = {True: True, False: True}
+    turns = 100
+    while turns <= args.max_turns:
+        for confirm_last in (False, True):
+            transcript = adversarial_transcript(turns, confirm_last)
+            kb = len(transcript) / 1024
+
+            scan = time_call(lambda: scan_spelled_email(split_turns(transcript)), args.repeat)
+            email, confirmed = scan_spelled_email(split_turns(transcript))
+            assert (email == "john@gmail.com" and confirmed) if confirm_last else not confirmed
+
+            legacy = "skipped"
+            if legacy_enabled[confirm_last]:
+                elapsed = time_call(lambda: LEGACY_SPELLBACK.search(transcript), 1)
+                legacy = f"{elapsed * 1000:.1f}"
+                legacy_enabled[confirm_last] = elapsed < LEGACY_BUDGET
+
+            print(f"{turns:>7} {str(confirm_last):>9} {kb:>8.1f} {legacy:>11} "
+                  f"{scan * 1000:>9.2f} {scan * 1e6 / kb:>11.1f}")
+        turns *= 2
+
+
+if __name__ == "__main__":
+    main()
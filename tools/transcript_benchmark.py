@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: transcript fetching and formatting on long calls
+Formats 1k-10k message transcripts with the old `chat_text +=` loop and the
+single-join formatter, and walks a paginated fake /calls/{id}/messages
+endpoint to check that every page is read (the old fetcher stopped after the
+first page).
+
+Usage:
+    python tools/transcript_benchmark.py [--page-size 200]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ultravox_transcript import CallMessage, iter_call_messages, format_messages
+
+SIZES = [1000, 2000, 5000, 10000]
+REPEAT = 5
+
+
+def legacy_format_chat(json_data):
+    """The formatter previously in functions.py"""
+    roles = {
+        "MESSAGE_ROLE_USER": "User",
+        "MESSAGE_ROLE_AGENT": "Agent"
+    }
+
+    chat_text = ""
+    for message in json_data.get("results", []):
+        role = roles.get(message["role"], "Unknown")
+        text = message.get("text", "[No response]")
+        medium = "(Voice)" if message.get("medium") == "MESSAGE_MEDIUM_VOICE" else "(Text)"
+        chat_text += f"{role} {medium}: {text}\n"
+
+    return chat_text
+
+
+def fake_messages(count):
+    roles = ["MESSAGE_ROLE_AGENT", "MESSAGE_ROLE_USER"]
+    return [
+        {
+            "role": roles[i % 2],
+            "text": f"Message number {i} with a typical sentence length for a phone conversation turn.",
+            "medium": "MESSAGE_MEDIUM_VOICE",
+            "callStageMessageIndex": i,
+        }
+        for i in range(count)
+    ]
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakePagedClient:
+    """Serves a message list with cursor pagination like /calls/{id}/messages"""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.requests = 0
+
+    async def get(self, url, params=None):
+        self.requests += 1
+        base, _, query = url.partition("?")
+        if params is None:
+            params = dict(item.split("=") for item in query.split("&"))
+        start = int(params.get("cursor", 0))
+        size = int(params["pageSize"])
+        end = start + size
+        return FakeResponse({
+            "results": self.messages[start:end],
+            "next": f"{base}?cursor={end}&pageSize={size}" if end < len(self.messages) else None,
+            "total": len(self.messages),
+        })
+
+
+def best_of(func):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def fetch_all(messages, page_size):
+    client = FakePagedClient(messages)
+    fetched = [message async for message in iter_call_messages("fake://calls/1/messages", client, page_size)]
+    return fetched, client.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcript fetch/format benchmark")
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'+= ms':>8} {'join ms':>8} {'from raw ms':>12} {'same':>5} "
+          f"{'pages':>6} {'fetched':>8} {'first page only':>16}")
+    for count in SIZES:
+        raw = {"results": fake_messages(count)}
+        records = [CallMessage.from_api(message) for message in raw["results"]]
+
+        legacy = best_of(lambda: legacy_format_chat(raw))
+        joined = best_of(lambda: format_messages(records))
+        from_raw = best_of(lambda: format_messages(CallMessage.from_api(m) for m in raw["results"]))
+        same = legacy_format_chat(raw) == format_messages(records)
+
+        fetched, pages = asyncio.run(fetch_all(raw["results"], args.page_size))
+        assert len(fetched) == count
+
+        print(f"{count:>9} {legacy * 1000:>8.2f} {joined * 1000:>8.2f} {from_raw * 1000:>12.2f} {str(same):>5} "
+              f"{pages:>6} {len(fetched):>8} {min(count, args.page_size):>16}")
+
+
+if __name__ == "__main__":
+    main()
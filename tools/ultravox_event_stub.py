@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Ultravox webhooks
+Posts signed call events to a running instance of main.py so the event-driven
+post-call pipeline can be exercised without a real Ultravox account.
+
+Usage:
+    python tools/ultravox_event_stub.py <call_id>
+    python tools/ultravox_event_stub.py <call_id> --event call.started --url http://localhost:8000/api/ultravox/events
+"""
+
+import os
+import sys
+import hmac
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def build_event(call_id, event="call.ended", end_reason="hangup"):
+    """Build a payload shaped like an Ultravox webhook delivery"""
+    now = datetime.now(timezone.utc).isoformat()
+    call = {"callId": call_id, "created": now, "joined": now}
+    if event == "call.ended":
+        call["ended"] = now
+        call["endReason"] = end_reason
+    return {"event": event, "call": call}
+
+
+def sign(body, timestamp, secret):
+    """Same HMAC scheme call_events.verify_ultravox_signature expects"""
+    return hmac.new(secret.encode(), body + timestamp.encode(), hashlib.sha256).hexdigest()
+
+
+def post_event(url, call_id, event="call.ended", secret=None):
+    """Post one event and return the server response"""
+    body = json.dumps(build_event(call_id, event)).encode()
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        timestamp = datetime.now(timezone.utc).isoformat()
+        headers["X-Ultravox-Webhook-Timestamp"] = timestamp
+        headers["X-Ultravox-Webhook-Signature"] = sign(body, timestamp, secret)
+    return httpx.post(url, content=body, headers=headers, timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post a fake Ultravox webhook event")
+    parser.add_argument("call_id", help="Ultravox call ID the event refers to")
+    parser.add_argument("--event", default="call.ended", help="Event name (default: call.ended)")
+    parser.add_argument("--url", default="http://localhost:8000/api/ultravox/events")
+    parser.add_argument("--secret", default=os.getenv("ULTRAVOX_WEBHOOK_SECRET"),
+                        help="Webhook secret (default: ULTRAVOX_WEBHOOK_SECRET from .env)")
+    args = parser.parse_args()
+
+    try:
+        response = post_event(args.url, args.call_id, args.event, args.secret)
+    except httpx.HTTPError as e:
+        print(f"❌ Could not reach {args.url}: {e}")
+        return 1
+
+    print(f"📨 {args.event} for {args.call_id} → {response.status_code} {response.text}")
+    return 0 if response.is_success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Token-budgeted transcript compaction
+Before a transcript goes into the extraction prompt, scripted boilerplate
+from ultravox_prompt.py (greeting, language and department menus, inactivity
+and closing lines, knowledge-base answers) is dropped. If the call is still
+over EXTRACTION_TOKEN_BUDGET, the turns that carry extracted fields are kept
+and the rest of the budget goes to a bounded window of the conversation
+after routing, which is what the summary is written from. Anchors alone never
+exceed the budget either: the latest confirmations are kept first.
+
+Token counts use tiktoken once `preload_tokenizer()` has loaded the encoding
+(at app startup, in a thread, since tiktoken may download it); until then,
+or when it cannot be loaded, they are estimated as chars/4.
+"""
+
+import os
+import re
+import asyncio
+from dotenv import load_dotenv
+
+from fast_extraction import (
+    iter_turns_with_medium,
+    NAME_CONFIRM,
+    SPELL_BACK,
+    SPELL_CHECK,
+    ORG_CONFIRM,
+    ORG_INDEPENDENT,
+    PURPOSE_CONFIRM,
+    DELIVERY_QUESTION,
+    DELIVERY_CONFIRM,
+    DEPARTMENT_OPENINGS,
+)
+
+load_dotenv()
+
+EXTRACTION_COMPACTION = os.getenv("EXTRACTION_COMPACTION", "true").lower() == "true"
+EXTRACTION_TOKEN_BUDGET = int(os.getenv("EXTRACTION_TOKEN_BUDGET", "2500"))
+# Non-field turns kept after the department opening for the summary
+EXTRACTION_SUMMARY_WINDOW = int(os.getenv("EXTRACTION_SUMMARY_WINDOW", "16"))
+# Longest single turn kept verbatim (tokens); longer turns are cut
+EXTRACTION_MAX_TURN_TOKENS = int(os.getenv("EXTRACTION_MAX_TURN_TOKENS", "200"))
+TOKENIZER_MODEL = os.getenv("EXTRACTION_MODEL", "gpt-4o-mini")
+
+# Scripted agent lines from ultravox_prompt.py that never carry caller data
+BOILERPLATE = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r"thank you for calling Faith Agency",
+        r"gracias por llamar a Faith Agency",
+        r"choose from the following options",
+        r"I didn(?:'|’)t catch that",
+        r"I still haven(?:'|’)t heard from you",
+        r"get back to you within 24 hours",
+        r"Have a blessed day",
+        r"Is there anything else I can help you with",
+        r"here(?:'|’)s what I found",
+        r"I don(?:'|’)t have that information in my system",
+        r"Should I proceed to end the call",
+    )
+]
+LANGUAGE_MENU = re.compile(r"which language would you like|en qu[eé] idioma", re.IGNORECASE)
+# Agent turns that hold (or ask for) an extracted field
+FIELD_PATTERNS = [
+    NAME_CONFIRM, SPELL_BACK, SPELL_CHECK, ORG_CONFIRM, ORG_INDEPENDENT,
+    PURPOSE_CONFIRM, DELIVERY_QUESTION, DELIVERY_CONFIRM,
+] + [pattern for _, pattern in DEPARTMENT_OPENINGS]
+FIELD_QUESTIONS = re.compile(
+    r"full name|email|purpose|organization|company|agency(?:'|’)s name|outlet|interest area|"
+    r"describe the issue|device|representing|client",
+    re.IGNORECASE,
+)
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character estimate
+    tiktoken = None
+
+# Set by load_tokenizer(); None means counts are chars/4 estimates
+_encoding = None
+
+
+def load_tokenizer():
+    """
+    Load the tiktoken encoding for the extraction model (blocking: may download it)
+
+    Returns:
+        bool: True if exact token counts are available
+    """
+    global _encoding
+    if _encoding is not None:
+        return True
+    if tiktoken is None:
+        return False
+    try:
+        try:
+            _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding unavailable, estimating tokens as chars/4: {e}")
+        return False
+    return True
+
+
+async def preload_tokenizer():
+    """`load_tokenizer` without blocking the event loop (called from the app lifespan)"""
+    return await asyncio.to_thread(load_tokenizer)
+
+
+def tokenizer_available():
+    return _encoding is not None
+
+
+def count_tokens(text):
+    """Tokens in text for the extraction model (≈ chars/4 until the encoding is loaded)"""
+    if _encoding is None:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text))
+
+
+def _truncate(text, max_tokens):
+    if _encoding is None:
+        return text if len(text) <= max_tokens * 4 else text[:max_tokens * 4] + " …"
+    tokens = _encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding.decode(tokens[:max_tokens]) + " …"
+
+
+def _is_field_turn(text):
+    return any(pattern.search(text) for pattern in FIELD_PATTERNS) or bool(FIELD_QUESTIONS.search(text))
+
+
+def _line(role, medium, text):
+    return f"{role} ({medium}): {text}\n"
+
+
+def compact_transcript(transcript, budget=EXTRACTION_TOKEN_BUDGET, summary_window=EXTRACTION_SUMMARY_WINDOW):
+    """
+    Shrink a transcript for the extraction prompt
+
+    Returns:
+        tuple: (compacted transcript, report dict with tokens_before/tokens_after/tokens_saved)
+    """
+    tokens_before = count_tokens(transcript)
+    turns = list(iter_turns_with_medium(transcript))
+
+    # 1) Drop scripted boilerplate, plus the caller's answer to the language menu
+    kept = []
+    skip_reply = False
+    for role, medium, text in turns:
+        if role == "Agent" and LANGUAGE_MENU.search(text) and not _is_field_turn(text):
+            skip_reply = True
+            continue
+        if role == "Agent" and any(pattern.search(text) for pattern in BOILERPLATE) and not _is_field_turn(text):
+            skip_reply = False
+            continue
+        if role == "User" and skip_reply:
+            skip_reply = False
+            continue
+        skip_reply = False
+        kept.append((role, medium, text))
+
+    lines = [_line(role, medium, _truncate(text, EXTRACTION_MAX_TURN_TOKENS)) for role, medium, text in kept]
+    costs = [count_tokens(line) for line in lines]
+
+    # 2) Over budget: field turns (and the caller's replies to them) first, then the summary window
+    if sum(costs) > budget:
+        confirmations, questions = [], []
+        routed_at = None
+        for index, (role, _, text) in enumerate(kept):
+            if role != "Agent":
+                continue
+            if _is_field_turn(text):
+                group = [index]
+                if index + 1 < len(kept) and kept[index + 1][0] == "User":
+                    group.append(index + 1)
+                if any(pattern.search(text) for pattern in FIELD_PATTERNS):
+                    confirmations.append(group)
+                else:
+                    questions.append(group)
+            if routed_at is None and any(pattern.search(text) for _, pattern in DEPARTMENT_OPENINGS):
+                routed_at = index
+
+        # The last confirmation of a field wins, so the latest anchors are kept when they don't all fit
+        selected = set()
+        used = 0
+        for group in confirmations[::-1] + questions[::-1]:
+            cost = sum(costs[index] for index in group if index not in selected)
+            if used + cost > budget:
+                continue
+            selected.update(group)
+            used += cost
+        window = [index for index in range((routed_at or 0), len(kept)) if index not in selected][:summary_window]
+        for index in window:
+            if used + costs[index] > budget:
+                break
+            selected.add(index)
+            used += costs[index]
+        lines = [line for index, line in enumerate(lines) if index in selected]
+
+    compacted = "".join(lines)
+    tokens_after = count_tokens(compacted)
+    report = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "turns_before": len(turns),
+        "turns_after": len(lines),
+        "exact": tokenizer_available(),
+    }
+    return compacted, report
+
+
+class CompactionMetrics:
+    """Prompt tokens saved by compaction across calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def record(self, report):
+        self.calls += 1
+        self.tokens_before += report["tokens_before"]
+        self.tokens_after += report["tokens_after"]
+
+    def snapshot(self):
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "enabled": EXTRACTION_COMPACTION,
+            "token_budget": EXTRACTION_TOKEN_BUDGET,
+            "exact_tokenizer": tokenizer_available(),
+            "calls": self.calls,
+            "tokens_saved": saved,
+            "avg_tokens_saved": round(saved / self.calls, 1) if self.calls else 0.0,
+            "saved_ratio": round(saved / self.tokens_before, 3) if self.tokens_before else 0.0,
+        }
+
+
+compaction_metrics = CompactionMetrics()
+
+
+def prepare_transcript(transcript, enabled=EXTRACTION_COMPACTION):
+    """Transcript text to embed in the extraction prompt (compacted when enabled)"""
+    if not enabled:
+        return transcript
+    compacted, report = compact_transcript(transcript)
+    compaction_metrics.record(report)
+    print(f"✂️ Transcript compacted: {report['tokens_before']} → {report['tokens_after']} tokens "
+          f"({report['tokens_saved']} saved, {report['turns_before']} → {report['turns_after']} turns)")
+    return compacted
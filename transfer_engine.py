@@ -0,0 +1,332 @@
+"""
+Non-blocking call transfer engine
+Each transfer is a small state machine driven by awaitable waits, so a
+transfer in progress never freezes the event loop for other callers.
+When PUBLIC_BASE_URL is set, management legs report their progress through
+Twilio status callbacks and polling is only a timeout safety net; the
+customer leg's status callback is pointed at the same URL while a transfer
+runs, so a caller hanging up cancels the transfer.
+"""
+
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+
+from twilio_client import twilio_request
+
+load_dotenv()
+
+# Ring time given to management and how long / how often we wait for an answer
+TRANSFER_RING_TIMEOUT = int(os.getenv("TRANSFER_RING_TIMEOUT", "25"))
+TRANSFER_MAX_WAIT = float(os.getenv("TRANSFER_MAX_WAIT", "20"))
+TRANSFER_CHECK_INTERVAL = float(os.getenv("TRANSFER_CHECK_INTERVAL", "4"))
+
+# Transfer states
+DIALING = "dialing"
+RINGING = "ringing"
+BRIDGING = "bridging"
+BRIDGED = "bridged"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ENDED_CALL_STATUSES = ["busy", "no-answer", "failed", "canceled", "completed"]
+
+# Public base URL of this server; enables Twilio status callbacks for management legs
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+TRANSFER_STATUS_CALLBACK_URL = f"{PUBLIC_BASE_URL}/api/transfer/status" if PUBLIC_BASE_URL else None
+TRANSFER_STATUS_CALLBACK_EVENTS = ["initiated", "ringing", "answered", "completed"]
+
+# Customer Call SID -> TransferSession currently running for that call
+active_transfers = {}
+
+# Management Call SID -> future resolved by the status callback
+_status_waiters = {}
+# Outcomes that arrived before their waiter was registered
+_early_statuses = {}
+MAX_EARLY_STATUSES = 500
+
+
+def conference_twiml(conference_name, end_on_exit, announce=None):
+    """TwiML that drops a call leg into the transfer conference"""
+    say = f"<Say>{announce}</Say>" if announce else ""
+    return f'''
+    <Response>
+        {say}
+        <Dial>
+            <Conference waitUrl="" startConferenceOnEnter="true" endConferenceOnExit="{'true' if end_on_exit else 'false'}">
+                {conference_name}
+            </Conference>
+        </Dial>
+    </Response>
+    '''
+
+
+def status_callback_kwargs():
+    """Extra calls.create arguments that make Twilio report the leg's progress"""
+    if not TRANSFER_STATUS_CALLBACK_URL:
+        return {}
+    return {
+        "status_callback": TRANSFER_STATUS_CALLBACK_URL,
+        "status_callback_event": TRANSFER_STATUS_CALLBACK_EVENTS,
+        "status_callback_method": "POST",
+    }
+
+
+def notify_call_status(call_sid, call_status):
+    """
+    Feed a Twilio status callback into the transfer engine
+
+    Args:
+        call_sid (str): CallSid from the callback
+        call_status (str): CallStatus from the callback
+
+    Returns:
+        bool: True if a waiting transfer was woken up or cancelled
+    """
+    # Customer leg ended while a transfer was still ringing management
+    if call_sid in active_transfers and call_status in ENDED_CALL_STATUSES:
+        return cancel_transfer(call_sid, f"customer call is {call_status}")
+
+    if call_status != "in-progress" and call_status not in ENDED_CALL_STATUSES:
+        return False
+
+    waiter = _status_waiters.get(call_sid)
+    if waiter is None:
+        if len(_early_statuses) >= MAX_EARLY_STATUSES:
+            _early_statuses.pop(next(iter(_early_statuses)))
+        _early_statuses[call_sid] = call_status
+        return False
+    if not waiter.done():
+        waiter.set_result(call_status)
+        return True
+    return False
+
+
+async def wait_for_call_status(call_sid, timeout):
+    """
+    Wait for a management leg to be answered or to end
+
+    Returns:
+        str: "in-progress" or a final call status, None on timeout
+    """
+    if call_sid in _early_statuses:
+        return _early_statuses.pop(call_sid)
+
+    waiter = asyncio.get_running_loop().create_future()
+    _status_waiters[call_sid] = waiter
+    started = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(waiter, timeout=timeout)
+        print(f"📨 Status callback for {call_sid}: {status} after {time.perf_counter() - started:.2f}s")
+        return status
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        _status_waiters.pop(call_sid, None)
+
+
+class TransferSession:
+    """Rings management and bridges the customer into a conference once answered"""
+
+    def __init__(self, twilio_client, call_sid, destination_number, from_number,
+                 max_wait=TRANSFER_MAX_WAIT, check_interval=TRANSFER_CHECK_INTERVAL):
+        self.twilio_client = twilio_client
+        self.call_sid = call_sid
+        self.destination_number = destination_number
+        self.from_number = from_number
+        self.max_wait = max_wait
+        self.check_interval = check_interval
+        self.management_call_sid = None
+        self.state = DIALING
+        self.started_at = time.time()
+        self._cancelled = asyncio.Event()
+
+    def cancel(self, reason="customer hung up"):
+        """Stop waiting for management (e.g. the customer hung up)"""
+        if self.state in (DIALING, RINGING):
+            print(f"🛑 Cancelling transfer for {self.call_sid}: {reason}")
+            self._cancelled.set()
+
+    async def _wait(self, seconds):
+        """Sleep without blocking the loop; returns True if cancelled meanwhile"""
+        try:
+            await asyncio.wait_for(self._cancelled.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _call_status(self, sid):
+        call = await twilio_request("calls.fetch", self.twilio_client.calls(sid).fetch_async)
+        return call.status
+
+    async def _watch_customer_leg(self):
+        """
+        Point the customer leg's status callback at /api/transfer/status
+
+        Twilio then reports the customer hanging up (the "completed" event)
+        while management is still ringing, so the transfer is cancelled
+        without depending on the phone number's own status callback setting.
+        """
+        try:
+            await twilio_request(
+                "calls.update",
+                self.twilio_client.calls(self.call_sid).update_async,
+                status_callback=TRANSFER_STATUS_CALLBACK_URL,
+                status_callback_method="POST",
+            )
+        except Exception as e:
+            print(f"⚠️ Could not set status callback on customer call {self.call_sid}: {e}")
+
+    async def _hang_up_management(self):
+        if not self.management_call_sid:
+            return
+        try:
+            await twilio_request(
+                "calls.update",
+                self.twilio_client.calls(self.management_call_sid).update_async,
+                status='completed',
+            )
+        except Exception:
+            pass
+
+    async def _bridge(self):
+        """Move both legs into the same conference"""
+        self.state = BRIDGING
+        conference_name = f"transfer-{self.call_sid[-8:]}"
+
+        print(f"🔗 Bridging customer call {self.call_sid} to conference {conference_name}")
+        await twilio_request(
+            "calls.update",
+            self.twilio_client.calls(self.call_sid).update_async,
+            twiml=conference_twiml(conference_name, True, "One moment please, connecting you now."),
+        )
+
+        print(f"🔗 Bridging management call {self.management_call_sid} to conference {conference_name}")
+        await twilio_request(
+            "calls.update",
+            self.twilio_client.calls(self.management_call_sid).update_async,
+            twiml=conference_twiml(conference_name, False),
+        )
+
+        self.state = BRIDGED
+        print(f"✅ Both calls bridged in conference: {conference_name}")
+
+    async def _poll_outcome(self):
+        """Polling mode (no public callback URL): check both legs every interval"""
+        checks = max(1, int(self.max_wait // self.check_interval))
+        for i in range(checks):
+            if await self._wait(self.check_interval):
+                return None
+
+            print(f"⏰ Checking management call status (attempt {i+1}/{checks})...")
+            call_status, customer_status = await asyncio.gather(
+                self._call_status(self.management_call_sid),
+                self._call_status(self.call_sid),
+            )
+            print(f"📊 Management call status: {call_status}")
+
+            if customer_status in ENDED_CALL_STATUSES:
+                self.cancel(f"customer call is {customer_status}")
+                return None
+            if call_status == "in-progress" or call_status in ENDED_CALL_STATUSES:
+                return call_status
+        return "no-answer"
+
+    async def _callback_outcome(self):
+        """Status-callback mode: wake on the answered/ended callback, poll once on timeout"""
+        waiter = asyncio.create_task(wait_for_call_status(self.management_call_sid, self.max_wait))
+        cancelled = asyncio.create_task(self._cancelled.wait())
+        try:
+            await asyncio.wait({waiter, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancelled.cancel()
+        if self._cancelled.is_set():
+            waiter.cancel()
+            return None
+
+        status = waiter.result()
+        if status is not None:
+            return status
+
+        # Safety net: the callback may have been lost on the way
+        print("⏰ No status callback before timeout - checking management call once")
+        status = await self._call_status(self.management_call_sid)
+        return status if status == "in-progress" else "no-answer"
+
+    async def run(self):
+        """
+        Drive the transfer to completion
+
+        Returns:
+            dict: {"status": "success" | "failed", "message": ...} as expected
+            by the Ultravox transferCall tool
+        """
+        active_transfers[self.call_sid] = self
+        try:
+            print(f"⚡ Quick transfer check to {self.destination_number}...")
+            dial = twilio_request(
+                "calls.create",
+                self.twilio_client.calls.create_async,
+                to=self.destination_number,
+                from_=self.from_number,
+                timeout=TRANSFER_RING_TIMEOUT,
+                url="http://demo.twilio.com/docs/voice.xml",  # Simple holding pattern
+                **status_callback_kwargs(),
+            )
+            if TRANSFER_STATUS_CALLBACK_URL:
+                # Callback mode never polls the customer leg; have Twilio report its hang-up instead
+                management_call, _ = await asyncio.gather(dial, self._watch_customer_leg())
+            else:
+                management_call = await dial
+            self.management_call_sid = management_call.sid
+            self.state = RINGING
+            print(f"📞 Created management call: {self.management_call_sid}")
+
+            if TRANSFER_STATUS_CALLBACK_URL:
+                call_status = await self._callback_outcome()
+            else:
+                call_status = await self._poll_outcome()
+
+            if call_status == "in-progress":
+                try:
+                    await self._bridge()
+                    return {"status": "success", "message": "Connecting you to management now"}
+                except Exception as bridge_error:
+                    print(f"❌ Bridge error: {bridge_error}")
+                    self.state = FAILED
+                    await self._hang_up_management()
+                    return {"status": "failed", "message": "Transfer failed - technical error"}
+
+            if call_status in ENDED_CALL_STATUSES:
+                print(f"❌ Management not available: {call_status}")
+
+            await self._hang_up_management()
+            if self._cancelled.is_set():
+                self.state = CANCELLED
+                return {"status": "failed", "message": "Transfer cancelled - caller disconnected"}
+
+            self.state = FAILED
+            return {"status": "failed", "message": "Management is currently unavailable"}
+
+        except asyncio.CancelledError:
+            self.state = CANCELLED
+            await self._hang_up_management()
+            raise
+        except Exception as e:
+            self.state = FAILED
+            await self._hang_up_management()
+            print(f"❌ Quick transfer error: {e}")
+            return {"status": "failed", "message": f"Transfer error: {str(e)}"}
+        finally:
+            if active_transfers.get(self.call_sid) is self:
+                del active_transfers[self.call_sid]
+
+
+def cancel_transfer(call_sid, reason="customer hung up"):
+    """Cancel the transfer running for a customer call, if any"""
+    session = active_transfers.get(call_sid)
+    if session is None:
+        return False
+    session.cancel(reason)
+    return True
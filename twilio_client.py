@@ -0,0 +1,103 @@
+"""
+Shared async Twilio REST client
+One twilio Client backed by twilio's pooled aiohttp transport, owned by the
+FastAPI app, with per-operation latency metrics.
+"""
+
+import os
+import time
+from twilio.rest import Client
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TWILIO_HTTP_TIMEOUT = float(os.getenv("TWILIO_HTTP_TIMEOUT", "10"))
+
+
+class TwilioMetrics:
+    """Latency and error counters per Twilio operation (e.g. calls.create)"""
+
+    def __init__(self):
+        self.operations = {}
+
+    def record(self, operation, elapsed, failed=False):
+        stats = self.operations.setdefault(
+            operation, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        elapsed_ms = elapsed * 1000
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if failed:
+            stats["errors"] += 1
+
+    def snapshot(self):
+        return {
+            operation: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+            }
+            for operation, stats in self.operations.items()
+        }
+
+
+twilio_metrics = TwilioMetrics()
+
+
+async def twilio_request(operation, func, *args, **kwargs):
+    """
+    Await one async Twilio operation and record its latency
+
+    Args:
+        operation (str): Metric name, e.g. "calls.fetch"
+        func: Async Twilio method, e.g. client.calls(sid).fetch_async
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        return await func(*args, **kwargs)
+    except Exception:
+        failed = True
+        raise
+    finally:
+        twilio_metrics.record(operation, time.perf_counter() - start, failed)
+
+
+def create_twilio_client():
+    """
+    Build a Twilio client on the pooled async HTTP transport.
+    Must be called from a running event loop (the aiohttp session binds to it).
+    """
+    http_client = AsyncTwilioHttpClient(pool_connections=True, timeout=TWILIO_HTTP_TIMEOUT)
+    return Client(
+        os.getenv("TWILIO_ACCOUNT_SID"),
+        os.getenv("TWILIO_AUTH_TOKEN"),
+        http_client=http_client,
+    )
+
+
+async def close_twilio_client(client):
+    """Close the client's aiohttp session"""
+    if client is not None and client.http_client is not None:
+        await client.http_client.close()
+
+
+# Process-wide client installed by the FastAPI lifespan in main.py
+_twilio_client = None
+
+
+def set_twilio_client(client):
+    """Install (or clear with None) the shared client"""
+    global _twilio_client
+    _twilio_client = client
+
+
+def get_twilio_client():
+    """Return the shared client, creating it on first use outside the app"""
+    global _twilio_client
+    if _twilio_client is None:
+        _twilio_client = create_twilio_client()
+    return _twilio_client
@@ -1,14 +1,14 @@
 # Download the helper library from https://www.twilio.com/docs/python/install
 import os
-from twilio.rest import Client
 from dotenv import load_dotenv
+from twilio_client import get_twilio_client, twilio_request
 
 # Load environment variables from .env file
 load_dotenv()
 
-def send_sms(to_number, message_body,from_number):
+async def send_sms(to_number, message_body,from_number):
     """
-    Send SMS message using Twilio API
+    Send SMS message using the shared async Twilio client
     
     Args:
         to_number (str): The recipient's phone number in E.164 format (e.g., +1XXXXXXXXXX)
@@ -27,9 +27,11 @@ def send_sms(to_number, message_body,from_number):
             print("Error: Twilio credentials not found in environment variables")
             return None
             
-        client = Client(account_sid, auth_token)
+        client = get_twilio_client()
         
-        message = client.messages.create(
+        message = await twilio_request(
+            "messages.create",
+            client.messages.create_async,
             body=message_body,
             from_=from_number,
             to=to_number,
@@ -47,4 +49,4 @@ def send_sms(to_number, message_body,from_number):
 #     # Test the function
 #     recipient = "+18639468602"  # Replace with test number
 #     test_message = "Thanks for checking out Conversa—your system for turning more leads into funded deals.\nClick below to schedule an appointment and see how Conversa can work for you.\n\nhttps://calendly.com/dromel/30min"
-#     send_sms(recipient, test_message)
\ No newline at end of file
+#     asyncio.run(send_sms(recipient, test_message, os.getenv("TWILIO_PHONE_NUMBER")))
\ No newline at end of file
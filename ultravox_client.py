@@ -0,0 +1,170 @@
+"""
+Shared HTTP client for Ultravox API traffic
+One pooled, keep-alive httpx.AsyncClient per process, owned by the FastAPI app
+"""
+
+import os
+import time
+import importlib.util
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ULTRAVOX_API_KEY = os.getenv("ULTRAVOX_API_KEY")
+
+# Pool and timeout tuning (override through .env)
+ULTRAVOX_MAX_CONNECTIONS = int(os.getenv("ULTRAVOX_MAX_CONNECTIONS", "100"))
+ULTRAVOX_MAX_KEEPALIVE = int(os.getenv("ULTRAVOX_MAX_KEEPALIVE", "20"))
+ULTRAVOX_KEEPALIVE_EXPIRY = float(os.getenv("ULTRAVOX_KEEPALIVE_EXPIRY", "30"))
+ULTRAVOX_CONNECT_TIMEOUT = float(os.getenv("ULTRAVOX_CONNECT_TIMEOUT", "5"))
+ULTRAVOX_READ_TIMEOUT = float(os.getenv("ULTRAVOX_READ_TIMEOUT", "15"))
+ULTRAVOX_WRITE_TIMEOUT = float(os.getenv("ULTRAVOX_WRITE_TIMEOUT", "10"))
+ULTRAVOX_POOL_TIMEOUT = float(os.getenv("ULTRAVOX_POOL_TIMEOUT", "5"))
+
+
+class PoolMetrics:
+    """Counters describing how busy the Ultravox connection pool is"""
+
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.failed_requests = 0
+        self.pool_timeouts = 0
+        self.total_latency = 0.0
+
+    def request_started(self):
+        self.in_flight += 1
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self, elapsed, failed=False):
+        self.in_flight -= 1
+        self.total_latency += elapsed
+        if failed:
+            self.failed_requests += 1
+
+    def snapshot(self, transport=None):
+        """Return the current counters as a plain dict"""
+        open_connections = idle_connections = 0
+        if transport is not None:
+            connections = transport.connections()
+            open_connections = len(connections)
+            idle_connections = sum(1 for conn in connections if conn.is_idle())
+
+        completed = self.total_requests - self.in_flight
+        return {
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": round(self.in_flight / self.max_connections, 3) if self.max_connections else 0.0,
+            "open_connections": open_connections,
+            "idle_connections": idle_connections,
+            "total_requests": self.total_requests,
+            "failed_requests": self.failed_requests,
+            "pool_timeouts": self.pool_timeouts,
+            "avg_latency_ms": round(self.total_latency / completed * 1000, 2) if completed else 0.0,
+        }
+
+
+class MeteredTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that records in-flight requests and pool timeouts"""
+
+    def __init__(self, metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    def connections(self):
+        """Connections currently held by the underlying httpcore pool"""
+        return list(self._pool.connections)
+
+    async def handle_async_request(self, request):
+        self.metrics.request_started()
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.metrics.pool_timeouts += 1
+            failed = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.metrics.request_finished(time.perf_counter() - start, failed)
+
+
+def http2_available():
+    """HTTP/2 needs the optional h2 package (httpx[http2])"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_ultravox_client():
+    """
+    Build the pooled Ultravox client
+
+    Returns:
+        httpx.AsyncClient: keep-alive client with tuned limits, timeouts and
+        a MeteredTransport. Use it as an async context manager so the pool is
+        closed on shutdown.
+    """
+    limits = httpx.Limits(
+        max_connections=ULTRAVOX_MAX_CONNECTIONS,
+        max_keepalive_connections=ULTRAVOX_MAX_KEEPALIVE,
+        keepalive_expiry=ULTRAVOX_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=ULTRAVOX_CONNECT_TIMEOUT,
+        read=ULTRAVOX_READ_TIMEOUT,
+        write=ULTRAVOX_WRITE_TIMEOUT,
+        pool=ULTRAVOX_POOL_TIMEOUT,
+    )
+    use_http2 = http2_available()
+    if not use_http2:
+        print("⚠️ h2 package not installed - Ultravox client falling back to HTTP/1.1")
+
+    transport = MeteredTransport(
+        PoolMetrics(ULTRAVOX_MAX_CONNECTIONS),
+        http2=use_http2,
+        limits=limits,
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=timeout,
+        headers={"X-API-Key": ULTRAVOX_API_KEY or ""},
+    )
+
+
+# Process-wide client installed by the FastAPI lifespan in main.py
+_ultravox_client = None
+
+
+def set_ultravox_client(client):
+    """Install (or clear with None) the shared client"""
+    global _ultravox_client
+    _ultravox_client = client
+
+
+def get_ultravox_client():
+    """
+    Return the shared client. Scripts that run outside the FastAPI app get a
+    lazily created client so the helpers in functions.py still work.
+    """
+    global _ultravox_client
+    if _ultravox_client is None or _ultravox_client.is_closed:
+        _ultravox_client = create_ultravox_client()
+    return _ultravox_client
+
+
+def get_pool_metrics(client=None):
+    """Pool saturation metrics for the shared (or given) client"""
+    client = client or _ultravox_client
+    if client is None:
+        return {}
+    transport = client._transport
+    if not isinstance(transport, MeteredTransport):
+        return {}
+    return transport.metrics.snapshot(transport)
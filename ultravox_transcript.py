@@ -0,0 +1,84 @@
+"""
+Ultravox call transcripts
+Typed message records, a paginated fetcher that follows the `next` cursor of
+/calls/{id}/messages to the last page, and the transcript formatter used for
+extraction.
+"""
+
+import os
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+
+from ultravox_client import get_ultravox_client
+
+load_dotenv()
+
+ULTRAVOX_MESSAGES_PAGE_SIZE = int(os.getenv("ULTRAVOX_MESSAGES_PAGE_SIZE", "200"))
+
+ROLE_LABELS = {
+    "MESSAGE_ROLE_USER": "User",
+    "MESSAGE_ROLE_AGENT": "Agent",
+}
+
+
+class CallMessage(NamedTuple):
+    """One message of a call transcript"""
+
+    role: str
+    text: Optional[str]
+    medium: Optional[str]
+    call_stage_message_index: Optional[int] = None
+
+    @classmethod
+    def from_api(cls, message):
+        get = message.get
+        return cls(get("role", ""), get("text", "[No response]"), get("medium"), get("callStageMessageIndex"))
+
+    @property
+    def label(self):
+        return ROLE_LABELS.get(self.role, "Unknown")
+
+    def line(self):
+        medium = "(Voice)" if self.medium == "MESSAGE_MEDIUM_VOICE" else "(Text)"
+        return f"{self.label} {medium}: {self.text}\n"
+
+
+async def fetch_message_page(url, params=None, client=None):
+    """
+    Fetch one page of call messages
+
+    Returns:
+        tuple: (list of CallMessage, next page URL or None)
+    """
+    client = client or get_ultravox_client()
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    page = response.json()
+    return [CallMessage.from_api(message) for message in page.get("results", [])], page.get("next")
+
+
+async def iter_call_messages(messages_url, client=None, page_size=ULTRAVOX_MESSAGES_PAGE_SIZE):
+    """
+    Yield every message of a call, page by page
+
+    Args:
+        messages_url (str): /calls/{id}/messages endpoint
+        client (httpx.AsyncClient): Ultravox client, defaults to the shared one
+        page_size (int): Messages per page request
+    """
+    url, params = messages_url, {"pageSize": page_size}
+    while url:
+        messages, url = await fetch_message_page(url, params, client)
+        # The next URL already carries the cursor and page size
+        params = None
+        for message in messages:
+            yield message
+
+
+def format_messages(messages):
+    """Transcript text, one "Role (Medium): text" line per message, built in a single join"""
+    labels = ROLE_LABELS
+    return "".join([
+        f"{labels.get(role, 'Unknown')} {'(Voice)' if medium == 'MESSAGE_MEDIUM_VOICE' else '(Text)'}: {text}\n"
+        for role, text, medium, _ in messages
+    ])